@@ -0,0 +1,36 @@
+# gunicorn.conf.py
+# Picked up automatically when gunicorn is started from the project root:
+#     gunicorn -w 4 -b 0.0.0.0:8030 wsgi:app
+import os
+
+# Sync workers by default. Notification streams (/notifications/stream) stay
+# open for minutes while mostly idle and need gevent workers, where each one
+# is a greenlet; run a separate instance for that path with
+#     GUNICORN_WORKER_CLASS=gevent NOTIFICATION_STREAM_ENABLED=true gunicorn -b 0.0.0.0:8031 wsgi:app
+# and NOTIFICATION_STREAM_ENABLED=true on this one. Keep the rest of the app
+# on sync workers: gevent turns the image variant and upload thread pools
+# into greenlets that Pillow and hashing block, and the variant process pool
+# has not been verified under its monkey patching.
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'sync')
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '1000'))
+
+
+def post_fork(server, worker):
+    """Make psycopg2 yield to other greenlets while it waits for PostgreSQL."""
+    if worker_class == 'gevent':
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+
+
+
+def post_worker_init(worker):
+    """Check and create the product buckets once per worker, before it serves requests."""
+    from routes.minio_client import ensure_product_buckets
+
+    app = worker.wsgi
+    with app.app_context():
+        try:
+            ensure_product_buckets()
+        except Exception:
+            # Uploads retry the check lazily; MinIO being down must not stop the worker.
+            app.logger.exception("MinIO bucket bootstrap failed")
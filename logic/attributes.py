@@ -0,0 +1,333 @@
+import time
+import threading
+from datetime import datetime
+from sqlalchemy import func
+from sqlalchemy.orm import selectinload
+from models.models_definitions import db, Product, ProductAttribute
+
+PRICE_BAND_ATTRIBUTE = 'price band'
+
+# Upper bound (exclusive) and label of each price band; None means unbounded.
+PRICE_BANDS = (
+    (5, 'under 5 €'),
+    (10, '5 – 10 €'),
+    (25, '10 – 25 €'),
+    (50, '25 – 50 €'),
+    (None, '50 € and more'),
+)
+
+
+def price_band(price):
+    """
+    Return the price band label for a price.
+
+    Args:
+        price (float): Product price.
+
+    Returns:
+        str: Label of the matching band.
+    """
+    for upper, label in PRICE_BANDS:
+        if upper is None or price < upper:
+            return label
+
+
+def parse_attributes(text):
+    """
+    Parse "name: value" lines from the product form into attribute pairs.
+
+    Names are lower-cased; blank, malformed and reserved (derived) lines are
+    ignored.
+
+    Args:
+        text (str or None): Raw textarea content.
+
+    Returns:
+        list[tuple[str, str]]: Unique (name, value) pairs in input order.
+    """
+    pairs = []
+    for line in (text or '').splitlines():
+        name, separator, value = line.partition(':')
+        name = ' '.join(name.split()).lower()[:50]
+        value = ' '.join(value.split())[:100]
+        if not separator or not name or not value or name == PRICE_BAND_ATTRIBUTE:
+            continue
+        if (name, value) not in pairs:
+            pairs.append((name, value))
+    return pairs
+
+
+def format_attributes(product):
+    """
+    Render a product's editable attributes back into "name: value" lines.
+
+    Args:
+        product (Product): Product being edited.
+
+    Returns:
+        str: Textarea content.
+    """
+    return '\n'.join(
+        f"{attribute.name}: {attribute.value}"
+        for attribute in sorted(product.attributes, key=lambda a: (a.name, a.value))
+        if attribute.name != PRICE_BAND_ATTRIBUTE
+    )
+
+
+def set_product_attributes(product, pairs, touch=True):
+    """
+    Replace a product's attributes and refresh its derived price band.
+
+    Bumps updated_at when anything changed, so cached pages and ETags that
+    include the product are invalidated.
+
+    Args:
+        product (Product): Product to update (may be pending, not yet flushed).
+        pairs (list[tuple[str, str]]): Attributes from parse_attributes().
+        touch (bool): Bump updated_at on changes; backfills pass False so
+            they do not reorder the catalog.
+    """
+    desired = set(pairs)
+    if product.price is not None:
+        desired.add((PRICE_BAND_ATTRIBUTE, price_band(product.price)))
+
+    current = {(attribute.name, attribute.value): attribute for attribute in product.attributes}
+    changed = False
+
+    for key, attribute in current.items():
+        if key not in desired:
+            product.attributes.remove(attribute)
+            changed = True
+    for name, value in sorted(desired - current.keys()):
+        product.attributes.append(ProductAttribute(name=name, value=value))
+        changed = True
+
+    if changed and touch and product.id is not None:
+        product.updated_at = datetime.utcnow()
+
+
+def backfill_price_bands(batch_size=500):
+    """
+    Give every product its derived price band attribute, in batches.
+
+    Products saved before attributes existed (or through a path that did
+    not set them) are missing from the facet counts until they have one.
+    Products are visited by id, so the backfill can be re-run safely; their
+    editable attributes are kept and updated_at is left alone.
+
+    Args:
+        batch_size (int): Products loaded and committed per batch.
+
+    Returns:
+        int: Number of products whose attributes changed.
+    """
+    updated = 0
+    last_id = 0
+    while True:
+        products = Product.query.options(selectinload(Product.attributes)).filter(
+            Product.id > last_id
+        ).order_by(Product.id).limit(batch_size).all()
+        if not products:
+            return updated
+        for product in products:
+            pairs = [
+                (attribute.name, attribute.value)
+                for attribute in product.attributes
+                if attribute.name != PRICE_BAND_ATTRIBUTE
+            ]
+            before = {(attribute.name, attribute.value) for attribute in product.attributes}
+            set_product_attributes(product, pairs, touch=False)
+            if {(attribute.name, attribute.value) for attribute in product.attributes} != before:
+                updated += 1
+        last_id = products[-1].id
+        db.session.commit()
+        db.session.expunge_all()
+
+
+def parse_facet_args(values):
+    """
+    Turn repeated "name:value" query arguments into a filter mapping.
+
+    Args:
+        values (list[str]): Values of the "f" query argument.
+
+    Returns:
+        dict[str, list[str]]: Selected values per attribute name.
+    """
+    filters = {}
+    for raw in values:
+        name, separator, value = raw.partition(':')
+        if separator and name and value and value not in filters.get(name, []):
+            filters.setdefault(name, []).append(value)
+    return filters
+
+
+def facet_args(filters):
+    """Inverse of parse_facet_args: mapping back to "name:value" strings."""
+    return [f"{name}:{value}" for name, values in filters.items() for value in values]
+
+
+def apply_facet_filters(query, filters):
+    """
+    Restrict a product query to products matching the selected facets.
+
+    Values of the same attribute are OR-ed, different attributes are AND-ed.
+    Each attribute becomes one IN (subquery) served by the
+    (name, value, product_id) index.
+
+    Args:
+        query (Query): Product query.
+        filters (dict[str, list[str]]): Selected values per attribute name.
+
+    Returns:
+        Query: Filtered query.
+    """
+    for name, values in filters.items():
+        matching = db.select(ProductAttribute.product_id).where(
+            ProductAttribute.name == name,
+            ProductAttribute.value.in_(values)
+        )
+        query = query.filter(Product.id.in_(matching))
+    return query
+
+
+def facet_rows(filters, only=None, exclude=()):
+    """
+    Count approved products per attribute value within a facet selection.
+
+    Args:
+        filters (dict[str, list[str]]): Selected values the products must match.
+        only (str, optional): Count the values of this attribute only.
+        exclude (Iterable[str]): Attribute names whose values are not counted.
+
+    Returns:
+        list[tuple[str, str, int]]: (name, value, count) rows by name and value.
+    """
+    query = db.session.query(
+        ProductAttribute.name, ProductAttribute.value, func.count(ProductAttribute.product_id)
+    ).join(Product, Product.id == ProductAttribute.product_id).filter(
+        Product.is_approved.is_(True)
+    )
+    query = apply_facet_filters(query, filters)
+    if only is not None:
+        query = query.filter(ProductAttribute.name == only)
+    exclude = list(exclude)
+    if exclude:
+        query = query.filter(ProductAttribute.name.notin_(exclude))
+    return query.group_by(ProductAttribute.name, ProductAttribute.value).order_by(
+        ProductAttribute.name, ProductAttribute.value
+    ).all()
+
+
+def group_facets(rows):
+    """Group (name, value, count) rows, sorted by name, into one entry per attribute."""
+    facets = []
+    for name, value, count in rows:
+        if not facets or facets[-1]['name'] != name:
+            facets.append({'name': name, 'values': []})
+        facets[-1]['values'].append((value, count))
+    return facets
+
+
+class FacetCounts:
+    """
+    Per-worker cache of approved product counts per attribute value.
+
+    The counts are computed with one GROUP BY over product_attributes and
+    reused until a product write invalidates them (or max_age seconds pass,
+    so writes handled by other workers are picked up). Only the unfiltered
+    catalog is cached; see selection_facets for the rest.
+    """
+
+    def __init__(self, max_age=300):
+        self.max_age = max_age
+        self._facets = None
+        self._computed_at = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """
+        Return the cached facet counts, computing them if needed.
+
+        Returns:
+            list[dict]: One entry per attribute name with its (value, count) pairs.
+        """
+        with self._lock:
+            if self._facets is not None and time.monotonic() - self._computed_at <= self.max_age:
+                return self._facets
+
+        facets = group_facets(facet_rows({}))
+
+        with self._lock:
+            self._facets = facets
+            self._computed_at = time.monotonic()
+        return facets
+
+    def invalidate(self):
+        with self._lock:
+            self._facets = None
+
+
+facet_counts = FacetCounts()
+
+
+def selection_facets(filters):
+    """
+    Facet counts within the current selection.
+
+    Values of an attribute are counted under every filter except the one on
+    that attribute, since selecting another of its values widens the result
+    (values of one attribute are OR-ed). Values that would return nothing
+    are left out. Costs one GROUP BY plus one per filtered attribute.
+
+    Args:
+        filters (dict[str, list[str]]): Currently selected values.
+
+    Returns:
+        list[dict]: One entry per attribute name with its (value, count) pairs.
+    """
+    if not filters:
+        return facet_counts.get()
+
+    rows = facet_rows(filters, exclude=filters.keys())
+    for name, selected in filters.items():
+        others = {key: values for key, values in filters.items() if key != name}
+        counted = facet_rows(others, only=name)
+        # Selected values stay listed, so they can be cleared.
+        found = {value for _, value, _ in counted}
+        rows += counted + [(name, value, 0) for value in selected if value not in found]
+    return group_facets(sorted(rows, key=lambda row: (row[0], row[1])))
+
+
+def build_facets(filters):
+    """
+    Combine the facet counts of the current selection with its state for templates.
+
+    Args:
+        filters (dict[str, list[str]]): Currently selected values.
+
+    Returns:
+        list[dict]: Facets whose values carry count, selected flag and the
+        filter arguments that toggle that value.
+    """
+    facets = []
+    for facet in selection_facets(filters):
+        name = facet['name']
+        values = []
+        for value, count in facet['values']:
+            selected = value in filters.get(name, [])
+            toggled = {key: list(vals) for key, vals in filters.items()}
+            if selected:
+                toggled[name].remove(value)
+                if not toggled[name]:
+                    del toggled[name]
+            else:
+                toggled.setdefault(name, []).append(value)
+            values.append({
+                'value': value,
+                'count': count,
+                'selected': selected,
+                'args': facet_args(toggled),
+            })
+        facets.append({'name': name, 'values': values})
+    return facets
@@ -0,0 +1,43 @@
+from sqlalchemy.orm import load_only
+from models.models_definitions import Product
+
+# Columns rendered by the listing templates (product cards and product tables).
+# description and specs are unbounded rich text and are only needed on the
+# detail and edit pages, so listings leave them deferred.
+CARD_COLUMNS = (
+    Product.id,
+    Product.name,
+    Product.price,
+    Product.product_code,
+    Product.merchant_id,
+    Product.is_approved,
+    Product.main_image_url,
+    Product.thumbnail_url,
+    Product.main_image_srcset,
+    Product.main_image_avif_srcset,
+    Product.main_image_width,
+    Product.main_image_height,
+    Product.main_image_color,
+    Product.main_image_placeholder,
+    Product.images_version,
+    Product.updated_at,
+)
+
+
+def card_query(query=None):
+    """
+    Restrict a product query to the lean "card" projection used by listings.
+
+    Accessing a deferred column (e.g. description) on a resulting object still
+    works, but costs one extra query per row, so templates rendered from this
+    query must stick to CARD_COLUMNS.
+
+    Args:
+        query (Query, optional): Base product query. Defaults to Product.query.
+
+    Returns:
+        Query: Query loading only CARD_COLUMNS.
+    """
+    if query is None:
+        query = Product.query
+    return query.options(load_only(*CARD_COLUMNS))
@@ -1,5 +1,6 @@
 from functools import wraps
 from flask import render_template
+from werkzeug.exceptions import HTTPException
 from logic.error_utils import log_error_to_db
 
 def log_exceptions(default_template="errors/500.html"):
@@ -8,6 +9,9 @@ def log_exceptions(default_template="errors/500.html"):
         def wrapper(*args, **kwargs):
             try:
                 return f(*args, **kwargs)
+            except HTTPException:
+                # abort(403/404/410) is an answer, not an error.
+                raise
             except Exception as e:
                 log_error_to_db(e)
                 return render_template(default_template, error_message=str(e)), 500
@@ -0,0 +1,109 @@
+import threading
+from collections import OrderedDict, defaultdict
+from markupsafe import Markup
+
+
+class FragmentCache:
+    """
+    Per-process LRU cache for rendered HTML fragments of a product.
+
+    Keys are (kind, product_id, updated_at, images_version, locale, epoch)
+    so a stale fragment is never served after the product row or its
+    images change; epoch covers
+    content that expires on its own, such as presigned image URLs. Write paths also call
+    invalidate_product() explicitly, because some changes (e.g. images) do
+    not touch the product row.
+
+    Attributes:
+        max_entries (int): Maximum number of fragments kept in memory.
+        hits (int): Number of lookups served from the cache.
+        misses (int): Number of lookups that had to render.
+    """
+
+    def __init__(self, max_entries=5000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._keys_by_product = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def render(self, kind, product, locale, render_fn, epoch=0):
+        """
+        Return the cached fragment for a product, rendering it on a miss.
+
+        Args:
+            kind (str): Fragment name, e.g. 'card' or 'detail'.
+            product (Product): Product being rendered.
+            locale (str): Active locale.
+            render_fn (callable): Renders the fragment when it is not cached.
+            epoch (int): Time window the fragment is valid for (0 if forever).
+
+        Returns:
+            Markup: Rendered HTML fragment.
+        """
+        updated_at = product.updated_at.isoformat() if product.updated_at else ''
+        key = (kind, product.id, updated_at, product.images_version, locale, epoch)
+
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return html
+            self.misses += 1
+
+        html = Markup(render_fn())
+
+        with self._lock:
+            self._entries[key] = html
+            self._keys_by_product[product.id].add(key)
+            while len(self._entries) > self.max_entries:
+                old_key, _ = self._entries.popitem(last=False)
+                self._discard_product_key(old_key)
+
+        return html
+
+    def invalidate_product(self, product_id):
+        """
+        Drop every cached fragment of a product, in all locales.
+
+        Args:
+            product_id (int): ID of the product that changed.
+        """
+        with self._lock:
+            for key in self._keys_by_product.pop(product_id, set()):
+                self._entries.pop(key, None)
+
+    def clear(self):
+        """Drop all cached fragments."""
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_product.clear()
+
+    def stats(self):
+        """
+        Return hit/miss counters for monitoring.
+
+        Returns:
+            dict: Entry count, hits, misses and hit ratio.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def _discard_product_key(self, key):
+        product_keys = self._keys_by_product.get(key[1])
+        if product_keys is not None:
+            product_keys.discard(key)
+            if not product_keys:
+                del self._keys_by_product[key[1]]
+
+
+fragment_cache = FragmentCache()
@@ -0,0 +1,370 @@
+import json
+import time
+import hashlib
+import threading
+import urllib.request
+from datetime import timezone
+from collections import OrderedDict, defaultdict
+from functools import wraps
+from flask import current_app, request, session, make_response, g
+from flask_babel import get_locale
+from flask_login import current_user
+from sqlalchemy.exc import IntegrityError
+from models.models_definitions import db, PageVersion
+
+CATALOG_TAG = 'catalog'
+
+# Every product detail page, purged when related products are recomputed.
+RELATED_TAG = 'related-products'
+
+# Headers replayed from a cached response; everything else is rebuilt per request.
+STORED_HEADERS = ('Content-Type', 'Cache-Control', 'Vary', 'Surrogate-Key', 'Cache-Tag', 'X-Next-Cursor')
+
+_purge_hooks = []
+
+
+def product_tag(product_id):
+    """Return the surrogate key used for every page showing a product."""
+    return f"product-{product_id}"
+
+
+def is_anonymous_request():
+    """
+    Check whether the current request can be answered from a shared cache.
+
+    Returns:
+        bool: True for GET/HEAD requests from anonymous visitors without
+        pending flash messages.
+    """
+    return (
+        request.method in ('GET', 'HEAD')
+        and not current_user.is_authenticated
+        and '_flashes' not in session
+    )
+
+
+def has_session_cookie():
+    """True when the request carries the session or remember-me cookie."""
+    return any(
+        name in request.cookies
+        for name in (current_app.config['SESSION_COOKIE_NAME'], current_app.config.get('REMEMBER_COOKIE_NAME', 'remember_token'))
+    )
+
+
+def shared_cache_control():
+    """
+    Cache-Control for anonymous pages: public with a CDN s-maxage.
+
+    Cloudflare ignores Vary: Cookie, so a response to a request that carries
+    a session cookie is marked private and never stored by the CDN; the CDN
+    itself must bypass the cache for such requests (see README).
+
+    Returns:
+        str: Cache-Control header value.
+    """
+    if has_session_cookie():
+        return 'private, max-age={}'.format(current_app.config['PAGE_CACHE_TTL'])
+    return 'public, max-age={}, s-maxage={}'.format(
+        current_app.config['PAGE_CACHE_TTL'], current_app.config['PAGE_CACHE_CDN_TTL']
+    )
+
+
+class PageCache:
+    """
+    Per-process cache of full responses for anonymous visitors.
+
+    Entries expire after a TTL and are tagged with surrogate keys so a
+    product write can purge every page that shows that product.
+    """
+
+    def __init__(self, max_entries=2000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._keys_by_tag = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry['expires_at'] < time.monotonic():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key, response, tags, ttl):
+        entry = {
+            'expires_at': time.monotonic() + ttl,
+            'status': response.status_code,
+            'body': response.get_data(),
+            'headers': [(name, response.headers[name]) for name in STORED_HEADERS if name in response.headers],
+            'tags': tuple(tags),
+        }
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = entry
+            for tag in entry['tags']:
+                self._keys_by_tag[tag].add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def purge(self, tags):
+        """
+        Drop every cached page tagged with any of the given surrogate keys.
+
+        Args:
+            tags (iterable[str]): Surrogate keys to purge.
+
+        Returns:
+            int: Number of pages removed.
+        """
+        removed = 0
+        with self._lock:
+            for tag in tags:
+                for key in list(self._keys_by_tag.get(tag, ())):
+                    self._remove(key)
+                    removed += 1
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_tag.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry['tags']:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+
+page_cache = PageCache()
+
+
+def cache_anonymous_page(tags_fn):
+    """
+    Serve a view from the page cache for anonymous visitors.
+
+    Anonymous 200 responses are stored per URL and locale, marked public with
+    a short browser max-age and a longer CDN s-maxage, and tagged with
+    surrogate keys (Surrogate-Key / Cache-Tag) from tags_fn. Responses for
+    logged-in users are marked private and never stored; anonymous requests
+    with a session cookie share the local cache but are sent as private.
+
+    Args:
+        tags_fn (callable): Receives the view arguments and returns the
+            surrogate keys for the page.
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if not is_anonymous_request():
+                response = make_response(f(*args, **kwargs))
+                response.headers['Cache-Control'] = 'private, no-cache'
+                return response
+
+            # conditional_get (applied outside) stores the page version. After
+            # a write in another worker, whose purge never reaches this cache,
+            # the new version misses instead of serving the old body.
+            key = (request.full_path, str(get_locale()), g.get('page_version'))
+            entry = page_cache.get(key)
+            if entry is not None:
+                response = current_app.response_class(entry['body'], status=entry['status'])
+                response.headers.update(entry['headers'])
+                response.headers['Cache-Control'] = shared_cache_control()
+                response.headers['X-Cache'] = 'HIT'
+                return response
+
+            response = make_response(f(*args, **kwargs))
+            if response.status_code != 200 or session.modified:
+                return response
+
+            tags = list(tags_fn(*args, **kwargs))
+            response.headers['Cache-Control'] = 'public, max-age={}, s-maxage={}'.format(
+                current_app.config['PAGE_CACHE_TTL'], current_app.config['PAGE_CACHE_CDN_TTL']
+            )
+            response.vary.update(('Accept-Language', 'Cookie'))
+            response.headers['Surrogate-Key'] = ' '.join(tags)
+            response.headers['Cache-Tag'] = ','.join(tags)
+            page_cache.set(key, response, tags, current_app.config['PAGE_CACHE_TTL'])
+            response.headers['Cache-Control'] = shared_cache_control()
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
+
+
+def conditional_get(validators_fn):
+    """
+    Answer anonymous GETs with 304 Not Modified when the client copy is current.
+
+    validators_fn runs before the view and must be cheap (a single indexed
+    query). It returns (version, last_modified) for the resource, or None
+    when the resource cannot be validated (e.g. it does not exist). The weak
+    ETag combines the version with the URL and locale, matching the
+    Vary: Accept-Language, Cookie of the cached page. Logged-in users see
+    personalised pages and are always served a full response. Apply it
+    outside cache_anonymous_page: the version also keys the page cache, so
+    a cached body always matches the ETag it is sent with.
+
+    Args:
+        validators_fn (callable): Receives the view arguments and returns a
+            (version, last_modified) tuple or None.
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if not is_anonymous_request():
+                return f(*args, **kwargs)
+
+            validators = validators_fn(*args, **kwargs)
+            if validators is None:
+                return f(*args, **kwargs)
+
+            version, last_modified = validators
+            g.page_version = version
+            if last_modified is not None:
+                last_modified = last_modified.replace(microsecond=0, tzinfo=timezone.utc)
+            etag = hashlib.sha1(
+                f"{request.full_path}|{get_locale()}|{version}".encode('utf-8')
+            ).hexdigest()
+
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains_weak(etag)
+            elif request.if_modified_since and last_modified is not None:
+                not_modified = last_modified <= request.if_modified_since
+            else:
+                not_modified = False
+
+            if not_modified:
+                response = current_app.response_class(status=304)
+                response.headers['Cache-Control'] = shared_cache_control()
+                response.vary.update(('Accept-Language', 'Cookie'))
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag, weak=True)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            return response
+        return wrapper
+    return decorator
+
+
+def page_version_query(name):
+    """Scalar subquery of a PageVersion counter, 0 before its first bump; for validators."""
+    return db.func.coalesce(
+        db.session.query(PageVersion.version).filter(PageVersion.name == name).scalar_subquery(), 0
+    )
+
+
+def bump_page_version(name):
+    """
+    Increment a PageVersion counter and commit it.
+
+    Call after committing the change the pages show, like purge_tags.
+
+    Args:
+        name (str): Page family, e.g. CATALOG_TAG.
+    """
+    updated = PageVersion.query.filter_by(name=name).update(
+        {PageVersion.version: PageVersion.version + 1}, synchronize_session=False
+    )
+    if not updated:
+        try:
+            with db.session.begin_nested():
+                db.session.add(PageVersion(name=name, version=1))
+        except IntegrityError:
+            # Created by a concurrent bump first.
+            PageVersion.query.filter_by(name=name).update(
+                {PageVersion.version: PageVersion.version + 1}, synchronize_session=False
+            )
+    db.session.commit()
+
+
+def register_purge_hook(hook):
+    """
+    Register a callable notified with surrogate keys whenever pages are purged.
+
+    Args:
+        hook (callable): Receives (tags, config) and purges downstream caches.
+    """
+    _purge_hooks.append(hook)
+
+
+def purge_tags(tags, wait=False):
+    """
+    Purge pages by surrogate key from the local cache and every purge hook.
+
+    Hooks run in a background thread so a slow CDN API never delays the
+    write request that triggered the purge.
+
+    Args:
+        tags (iterable[str]): Surrogate keys to purge.
+        wait (bool): Run the hooks before returning, for scripts that exit
+            right after purging.
+    """
+    tags = list(tags)
+    page_cache.purge(tags)
+    if not _purge_hooks:
+        return
+
+    config = dict(current_app.config)
+    logger = current_app.logger
+
+    def run_hooks():
+        for hook in _purge_hooks:
+            try:
+                hook(tags, config)
+            except Exception:
+                logger.exception("CDN purge hook %r failed", hook)
+
+    if wait:
+        run_hooks()
+    else:
+        threading.Thread(target=run_hooks, daemon=True).start()
+
+
+def http_purge_hook(tags, config):
+    """
+    POST {"tags": [...]} to CDN_PURGE_URL (Cloudflare's purge_cache format).
+
+    Does nothing when CDN_PURGE_URL is not configured.
+    """
+    url = config.get('CDN_PURGE_URL')
+    if not url:
+        return
+
+    headers = {'Content-Type': 'application/json'}
+    if config.get('CDN_PURGE_TOKEN'):
+        headers['Authorization'] = f"Bearer {config['CDN_PURGE_TOKEN']}"
+
+    purge_request = urllib.request.Request(
+        url, data=json.dumps({'tags': tags}).encode('utf-8'), headers=headers, method='POST'
+    )
+    with urllib.request.urlopen(purge_request, timeout=5) as response:
+        response.read()
+
+
+register_purge_hook(http_purge_hook)
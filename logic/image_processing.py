@@ -0,0 +1,173 @@
+import io
+import base64
+from PIL import Image, ImageFilter, ImageOps, UnidentifiedImageError, features
+
+# Listing cards are at most ~400 CSS px wide, the detail carousel ~1000.
+VARIANT_WIDTHS = (320, 640, 1024)
+
+# Pillow encoder settings per variant format: (PIL format name, save options).
+VARIANT_ENCODERS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'avif': ('AVIF', {'quality': 60, 'speed': 6}),
+}
+
+# Longest side of the inline blur placeholder; keeps the data URI well under 1 KB.
+PLACEHOLDER_SIZE = 16
+
+# EXIF orientations that rotate the image by 90 or 270 degrees.
+TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+EXIF_ORIENTATION = 0x0112
+
+
+def read_dimensions(stream):
+    """
+    Read the displayed size of an image from its header, without decoding pixels.
+
+    Pillow only parses the header on open, which for JPEG includes the EXIF
+    block, so rotated photos report their upright size.
+
+    Args:
+        stream: Seekable file-like object positioned at the start of the image.
+
+    Returns:
+        tuple[int, int]: (width, height) after EXIF rotation.
+
+    Raises:
+        ValueError: If the header cannot be parsed.
+    """
+    try:
+        with Image.open(stream) as image:
+            width, height = image.size
+            if image.getexif().get(EXIF_ORIENTATION) in TRANSPOSED_ORIENTATIONS:
+                width, height = height, width
+    except (UnidentifiedImageError, OSError, SyntaxError) as e:
+        raise ValueError(f"Unreadable image header: {e}")
+    return width, height
+
+
+def dominant_color(image):
+    """
+    Return the most common colour of an image as "#rrggbb".
+
+    Args:
+        image (Image.Image): Decoded RGB or RGBA image.
+
+    Returns:
+        str: Hex colour.
+    """
+    sample = image.convert('RGB').resize((64, 64), Image.BILINEAR).quantize(colors=5)
+    _, index = max(sample.getcolors())
+    red, green, blue = sample.getpalette()[index * 3:index * 3 + 3]
+    return f"#{red:02x}{green:02x}{blue:02x}"
+
+
+def blur_placeholder(image):
+    """
+    Encode a tiny blurred preview of an image as an inline data URI.
+
+    Args:
+        image (Image.Image): Decoded RGB or RGBA image.
+
+    Returns:
+        str: "data:image/webp;base64,..." URI.
+    """
+    preview = image.copy()
+    preview.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE), Image.BILINEAR)
+    preview = preview.filter(ImageFilter.GaussianBlur(1))
+    buffer = io.BytesIO()
+    preview.save(buffer, 'WEBP', quality=40)
+    return 'data:image/webp;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+def supported_formats(requested):
+    """
+    Filter variant formats down to the ones this Pillow build can encode.
+
+    Args:
+        requested (Iterable[str]): Format names, e.g. ("webp", "avif").
+
+    Returns:
+        tuple[str]: Supported formats, in the requested order.
+    """
+    return tuple(
+        image_format for image_format in requested
+        if image_format in VARIANT_ENCODERS and features.check(image_format)
+    )
+
+
+def target_widths(original_width, widths=VARIANT_WIDTHS):
+    """
+    Pick the variant widths for an image without upscaling it.
+
+    Args:
+        original_width (int): Width of the original image.
+        widths (Iterable[int]): Candidate widths.
+
+    Returns:
+        list[int]: Widths narrower than the original, or the original width
+        alone when the image is smaller than every candidate.
+    """
+    selected = [width for width in sorted(widths) if width < original_width]
+    return selected or [original_width]
+
+
+def render_variants(data, widths=VARIANT_WIDTHS, formats=('webp',)):
+    """
+    Resize an image to the given widths and encode each size in each format.
+
+    The image is decoded once, and the same pass also yields the metadata
+    that needs pixels: the dominant colour and the blur placeholder.
+    Pure function of its arguments so it can run in a separate process.
+
+    Args:
+        data (bytes): Encoded original image.
+        widths (Iterable[int]): Candidate widths (see target_widths).
+        formats (Iterable[str]): Keys of VARIANT_ENCODERS.
+
+    Returns:
+        dict: "width" and "height" of the original (after EXIF rotation),
+        "dominant_color", "blur_placeholder" and "variants", a list of dicts
+        with width, height, format and data (bytes).
+    """
+    with Image.open(io.BytesIO(data)) as original:
+        original_width, original_height = original.size
+        if original.getexif().get(EXIF_ORIENTATION) in TRANSPOSED_ORIENTATIONS:
+            original_width, original_height = original_height, original_width
+        # Let the JPEG decoder downscale by a power of two while decoding. A
+        # square request keeps both sides large enough whatever the EXIF rotation.
+        largest = max(widths)
+        original.draft('RGB', (largest, largest))
+
+        image = ImageOps.exif_transpose(original)
+        has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    # Sizes come from the header: draft() may have decoded at a reduced scale.
+    metadata = {
+        'width': original_width,
+        'height': original_height,
+        'dominant_color': dominant_color(image),
+        'blur_placeholder': blur_placeholder(image),
+    }
+
+    selected = target_widths(image.width, widths)
+    variants = []
+    for width in sorted(selected, reverse=True):
+        height = max(1, round(image.height * width / image.width))
+        if (width, height) != image.size:
+            # Resize from the previous (larger) step; each step is at most ~3x.
+            image = image.resize((width, height), Image.LANCZOS)
+
+        for image_format in formats:
+            pil_format, options = VARIANT_ENCODERS[image_format]
+            buffer = io.BytesIO()
+            image.save(buffer, pil_format, **options)
+            variants.append({
+                'width': width,
+                'height': height,
+                'format': image_format,
+                'data': buffer.getvalue(),
+            })
+
+    metadata['variants'] = sorted(variants, key=lambda variant: (variant['format'], variant['width']))
+    return metadata
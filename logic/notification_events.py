@@ -0,0 +1,190 @@
+import os
+import json
+import time
+import queue
+import select
+import threading
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models.models_definitions import db
+
+# PostgreSQL channel new notifications are announced on.
+CHANNEL = 'notifications'
+
+# NOTIFY payloads must stay below 8000 bytes; longer notifications are sent
+# as ids only and the stream loads the row.
+MAX_PAYLOAD_BYTES = 7500
+
+# Events queued per stream before it is considered too slow and resynced.
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+# Put on every subscription when events may have been lost (listener reconnect).
+RESYNC = {'resync': True}
+
+# Open streams and LISTEN threads per worker process: {pid: ...}.
+_subscribers = {}
+_listeners = {}
+_lock = threading.Lock()
+
+
+class Subscription:
+    """One open stream: a queue of event dicts, plus a flag set when events were dropped."""
+
+    def __init__(self):
+        self.events = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.missed = False
+
+    def put(self, data):
+        try:
+            self.events.put_nowait(data)
+        except queue.Full:
+            self.missed = True
+
+
+def event_data(notification):
+    """
+    Serialize a notification for the event stream.
+
+    Args:
+        notification (Notification): A flushed notification.
+
+    Returns:
+        dict: JSON-ready fields of the notification.
+    """
+    return {
+        'id': notification.id,
+        'role': notification.role,
+        'user_id': notification.user_id,
+        'type': notification.type,
+        'message': notification.message,
+        'product_id': notification.product_id,
+        'order_id': notification.order_id,
+        'created_at': notification.created_at.isoformat() if notification.created_at else None,
+    }
+
+
+def uses_listen():
+    """True when events travel through PostgreSQL LISTEN/NOTIFY rather than in-process."""
+    return db.engine.dialect.name == 'postgresql'
+
+
+def announce(notification):
+    """
+    Announce a new notification to the open streams once it is committed.
+
+    On PostgreSQL it is a pg_notify() in the current transaction, so every
+    worker hears about it on commit and never about a rolled back row. Other
+    databases (SQLite in development and tests) only reach the streams of
+    this process, after the session commits.
+
+    Args:
+        notification (Notification): A flushed notification.
+    """
+    data = event_data(notification)
+    if not uses_listen():
+        db.session.info.setdefault('notification_events', []).append(data)
+        return
+
+    payload = json.dumps(data)
+    if len(payload.encode('utf-8')) > MAX_PAYLOAD_BYTES:
+        payload = json.dumps({key: data[key] for key in ('id', 'role', 'user_id')})
+    db.session.execute(
+        db.text("SELECT pg_notify(:channel, :payload)"),
+        {'channel': CHANNEL, 'payload': payload}
+    )
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_committed(session):
+    for data in session.info.pop('notification_events', []):
+        publish(data)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _drop_rolled_back(session, previous_transaction):
+    session.info.pop('notification_events', None)
+
+
+def publish(data):
+    """Hand an event dict to every open stream of this process."""
+    with _lock:
+        subscribers = list(_subscribers.get(os.getpid(), ()))
+    for subscription in subscribers:
+        subscription.put(data)
+
+
+def subscribe(app):
+    """
+    Register a new stream, starting this worker's LISTEN thread if needed.
+
+    Args:
+        app (Flask): The application, used by the listener for its engine.
+
+    Returns:
+        Subscription: Events for the stream; pass it to unsubscribe when done.
+    """
+    subscription = Subscription()
+    with _lock:
+        _subscribers.setdefault(os.getpid(), set()).add(subscription)
+    if uses_listen():
+        _ensure_listener(app)
+    return subscription
+
+
+def unsubscribe(subscription):
+    with _lock:
+        _subscribers.get(os.getpid(), set()).discard(subscription)
+
+
+def _ensure_listener(app):
+    pid = os.getpid()
+    with _lock:
+        listener = _listeners.get(pid)
+        if listener is not None and listener.is_alive():
+            return
+        listener = threading.Thread(target=_listen, args=(app,), name='notification-listener', daemon=True)
+        _listeners[pid] = listener
+    listener.start()
+
+
+def _listen(app):
+    """
+    Hold one LISTEN connection per worker and fan its events out to the streams.
+
+    The connection is detached from the pool. After it drops, the listener
+    reconnects with backoff and tells every stream to resync from the
+    database, since events sent in between were lost.
+    """
+    backoff = 1
+    reconnect = False
+    while True:
+        connection = None
+        try:
+            with app.app_context():
+                raw = db.engine.raw_connection()
+            raw.detach()
+            connection = raw.driver_connection
+            connection.autocommit = True
+            connection.cursor().execute(f"LISTEN {CHANNEL}")
+            if reconnect:
+                publish(RESYNC)
+            backoff = 1
+
+            while True:
+                if select.select([connection], [], [], 60) == ([], [], []):
+                    continue
+                connection.poll()
+                while connection.notifies:
+                    note = connection.notifies.pop(0)
+                    publish(json.loads(note.payload))
+        except Exception:
+            app.logger.exception("Notification listener lost its connection; retrying in %ss", backoff)
+        finally:
+            if connection is not None:
+                try:
+                    connection.close()
+                except Exception:
+                    pass
+        reconnect = True
+        time.sleep(backoff)
+        backoff = min(backoff * 2, 30)
@@ -1,5 +1,5 @@
 from models.models_definitions import db, Notification
-from logic.notification_service import create_notification
+from logic.notification_service import create_notification, invalidate_unread_count
 
 def hide_old_notifications(product_id, role, type):
     """
@@ -17,6 +17,7 @@ def hide_old_notifications(product_id, role, type):
         is_visible=True
     ).update({'is_visible': False})
     db.session.commit()
+    invalidate_unread_count(role)
 
 def push_next_notification(user_id, role, message, type, product_id):
     """
@@ -1,4 +1,15 @@
-from models.models_definitions import db, Notification
+import time
+import threading
+from datetime import datetime
+from flask import current_app, g, has_app_context
+from sqlalchemy.dialects import postgresql, sqlite
+from models.models_definitions import db, Notification, NotificationReceipt, NotificationWatermark
+from logic.pagination import keyset_paginate
+from logic.notification_events import announce
+
+# Unread counts per (role, user_id) in this worker: {key: (count, expires_at)}.
+_unread_counts = {}
+_unread_lock = threading.Lock()
 
 def create_notification(user_id, role, message, type="info", product_id=None, order_id=None, is_visible=True):
     """
@@ -25,9 +36,14 @@ def create_notification(user_id, role, message, type="info", product_id=None, or
         is_visible=is_visible
     )
 
-    # Add the notification to the session and commit to save it
+    # Add the notification to the session and commit to save it; open
+    # notification streams receive it when the transaction commits
     db.session.add(notification)
+    if is_visible:
+        db.session.flush()
+        announce(notification)
     db.session.commit()
+    invalidate_unread_count(role, user_id)
 
 def get_user_notifications(role, user_id=None):
     """
@@ -52,3 +68,320 @@ def get_user_notifications(role, user_id=None):
 
     # Order notifications by the creation date, most recent first
     return query.order_by(Notification.created_at.desc()).all()
+
+
+def notification_page(role, user_id=None, visible=True, after=None, before=None, page_size=20):
+    """
+    Load one keyset page of a user's notifications, newest first.
+
+    The user's own and the global notifications are two ranges of the
+    ix_notifications_inbox index; they are merged with UNION ALL so each
+    range is read in index order and only as far as the page needs. Only
+    (id, created_at) is read from the index, then the page rows are loaded
+    by primary key. Global notifications the user hid are in the archive.
+
+    Args:
+        role (str): 'admin', 'merchant', 'customer', 'visitor'
+        user_id (int or None): The user, or None for global notifications only
+        visible (bool): True for the inbox, False for the archive
+        after (str, optional): Cursor of the last row of the previous page
+        before (str, optional): Cursor of the first row of the next page
+        page_size (int): Number of notifications per page
+
+    Returns:
+        KeysetPage: Notifications for the page plus next/previous cursors.
+    """
+    notification_keys = notification_keys_subquery(role, user_id, visible)
+    page = keyset_paginate(
+        db.session.query(notification_keys.c.id, notification_keys.c.created_at),
+        notification_keys.c.created_at,
+        notification_keys.c.id,
+        after=after,
+        before=before,
+        page_size=page_size
+    )
+
+    ids = [row.id for row in page.items]
+    notifications = {n.id: n for n in Notification.query.filter(Notification.id.in_(ids))} if ids else {}
+    return page._replace(items=[notifications[i] for i in ids if i in notifications])
+
+
+def notification_keys_subquery(role, user_id=None, visible=True):
+    """
+    Return (id, created_at) of the notifications a user sees, as a subquery.
+
+    Args:
+        role (str): 'admin', 'merchant', 'customer', 'visitor'
+        user_id (int or None): The user, or None for global notifications only
+        visible (bool): True for the inbox, False for the archive
+
+    Returns:
+        Subquery: UNION ALL of the global and (with a user_id) user ranges.
+    """
+    def keys(*conditions):
+        return db.session.query(
+            Notification.id.label('id'), Notification.created_at.label('created_at')
+        ).filter(Notification.role == role, *conditions)
+
+    broadcast = Notification.user_id.is_(None)
+    if not user_id:
+        return keys(Notification.is_visible == visible, broadcast).subquery('notification_keys')
+
+    hidden = _receipt_exists(user_id, NotificationReceipt.hidden_at.isnot(None))
+    own = keys(Notification.is_visible == visible, Notification.user_id == user_id)
+    if visible:
+        query = keys(Notification.is_visible == True, broadcast, ~hidden).union_all(own)
+    else:
+        query = keys(Notification.is_visible == False, broadcast).union_all(
+            own, keys(Notification.is_visible == True, broadcast, hidden)
+        )
+    return query.subquery('notification_keys')
+
+
+def unread_count_query(role, user_id=None):
+    """
+    Return the COUNT(*) query behind count_unread.
+
+    It is answered from ix_notifications_unread_v2: rows past the user's read
+    watermark, minus global notifications the user has a receipt for.
+    """
+    query = _visible_to(
+        db.session.query(db.func.count()).select_from(Notification), role, user_id
+    ).filter(db.not_(Notification.is_read), Notification.is_visible)
+    if user_id:
+        query = query.filter(Notification.id > _watermark(role, user_id), ~_receipt_exists(user_id))
+    return query
+
+
+def _watermark(role, user_id):
+    """Scalar subquery of the user's read watermark, 0 when never set."""
+    return db.func.coalesce(
+        db.session.query(NotificationWatermark.read_up_to_id).filter(
+            NotificationWatermark.user_id == user_id, NotificationWatermark.role == role
+        ).scalar_subquery(),
+        0
+    )
+
+
+def _receipt_exists(user_id, *conditions):
+    """EXISTS clause for a receipt of the user on the outer notification row."""
+    return db.session.query(NotificationReceipt.notification_id).filter(
+        NotificationReceipt.notification_id == Notification.id,
+        NotificationReceipt.user_id == user_id,
+        *conditions
+    ).exists()
+
+
+def notifications_since(role, user_id=None, after_id=0, limit=100):
+    """
+    Return visible notifications of a user newer than an id, oldest first.
+
+    Used by the notification stream to replay what a client missed.
+
+    Args:
+        role (str): 'admin', 'merchant', 'customer', 'visitor'
+        user_id (int or None): The user, or None for global notifications only
+        after_id (int): Last notification id the client has
+        limit (int): Maximum number of notifications
+
+    Returns:
+        list[Notification]: Up to limit notifications, by ascending id.
+    """
+    return _visible_to(Notification.query, role, user_id).filter(
+        Notification.is_visible, Notification.id > after_id
+    ).order_by(Notification.id).limit(limit).all()
+
+
+def latest_notification_id():
+    """Return the highest notification id, 0 when there are none."""
+    return db.session.query(db.func.max(Notification.id)).scalar() or 0
+
+
+def _visible_to(query, role, user_id):
+    """Restrict a notification query to what a user of a role can see."""
+    query = query.filter(Notification.role == role)
+    if user_id:
+        return query.filter((Notification.user_id == user_id) | (Notification.user_id.is_(None)))
+    return query.filter(Notification.user_id.is_(None))
+
+
+def count_unread(role, user_id=None):
+    """
+    Return the number of unread, visible notifications of a user.
+
+    A single COUNT served by the ix_notifications_unread_v2 partial index. The
+    result is kept for the rest of the request (templates and fragments may
+    ask several times) and shared by the worker for NOTIFICATION_COUNT_TTL
+    seconds (default 15); writes through this module invalidate it at once.
+
+    Args:
+        role (str): 'admin', 'merchant', 'customer', 'visitor'
+        user_id (int or None): The user, or None for global notifications only
+
+    Returns:
+        int: Number of unread notifications
+    """
+    key = (role, user_id or None)
+    request_counts = g.setdefault('unread_counts', {})
+    if key in request_counts:
+        return request_counts[key]
+
+    now = time.monotonic()
+    with _unread_lock:
+        cached = _unread_counts.get(key)
+    if cached is not None and cached[1] > now:
+        count = cached[0]
+    else:
+        count = unread_count_query(role, user_id).scalar()
+        ttl = float(current_app.config.get('NOTIFICATION_COUNT_TTL', 15))
+        with _unread_lock:
+            _unread_counts[key] = (count, now + ttl)
+
+    request_counts[key] = count
+    return count
+
+
+def invalidate_unread_count(role=None, user_id=None):
+    """
+    Drop cached unread counts after notifications change.
+
+    Global notifications (user_id None) count for every user of the role,
+    so they clear the whole role; role None clears everything.
+
+    Args:
+        role (str or None): Role of the changed notifications
+        user_id (int or None): Their target user, or None for global ones
+    """
+    with _unread_lock:
+        for key in list(_unread_counts):
+            if role is None or (key[0] == role and (user_id is None or key[1] == user_id)):
+                del _unread_counts[key]
+    if has_app_context():
+        g.pop('unread_counts', None)
+
+
+def unread_ids(notifications, role, user_id=None):
+    """
+    Return the ids of the given notifications the user has not read yet.
+
+    Args:
+        notifications (list[Notification]): Notifications shown to the user
+        role (str): The user's role
+        user_id (int or None): The user, or None for anonymous visitors
+
+    Returns:
+        set[int]: Ids of the unread notifications
+    """
+    unread = {n.id for n in notifications if not n.is_read}
+    if not user_id or not unread:
+        return unread
+
+    watermark = db.session.query(NotificationWatermark.read_up_to_id).filter_by(
+        user_id=user_id, role=role
+    ).scalar() or 0
+    read = {
+        notification_id for (notification_id,) in db.session.query(NotificationReceipt.notification_id).filter(
+            NotificationReceipt.user_id == user_id,
+            NotificationReceipt.notification_id.in_(unread),
+            NotificationReceipt.read_at.isnot(None)
+        )
+    }
+    return {i for i in unread if i > watermark and i not in read}
+
+
+def _receipt(notification, user_id):
+    """Return the user's receipt for a global notification, creating it if needed."""
+    receipt = db.session.get(NotificationReceipt, (notification.id, user_id))
+    if receipt is None:
+        receipt = NotificationReceipt(notification_id=notification.id, user_id=user_id)
+        db.session.add(receipt)
+    return receipt
+
+
+def mark_read(notification, user_id=None):
+    """
+    Mark a notification as read for a user.
+
+    The user's own notifications are updated in place; global ones get a
+    receipt, so other readers are not affected. Anonymous visitors cannot
+    keep read state of global notifications.
+
+    Args:
+        notification (Notification): The notification the user opened
+        user_id (int or None): The reader
+    """
+    if notification.user_id is not None:
+        notification.is_read = True
+    elif user_id:
+        receipt = _receipt(notification, user_id)
+        receipt.read_at = receipt.read_at or datetime.utcnow()
+    else:
+        return
+    db.session.commit()
+    invalidate_unread_count(notification.role, notification.user_id or user_id)
+
+
+def set_hidden(notification, user_id=None, hidden=True):
+    """
+    Hide a notification from a user's inbox, or restore it.
+
+    Like mark_read, global notifications are hidden per user with a
+    receipt, and anonymous visitors cannot change them. Restoring a global
+    notification that was archived for everyone (see hide_old_notifications)
+    makes it visible again for everyone.
+
+    Args:
+        notification (Notification): The notification to hide or restore
+        user_id (int or None): The reader
+        hidden (bool): True to hide, False to restore
+    """
+    if notification.user_id is not None:
+        notification.is_visible = not hidden
+    elif not user_id:
+        return
+    else:
+        receipt = db.session.get(NotificationReceipt, (notification.id, user_id))
+        if hidden:
+            receipt = receipt or _receipt(notification, user_id)
+            receipt.hidden_at = datetime.utcnow()
+        elif receipt is not None and receipt.hidden_at is not None:
+            # A receipt means "read or hidden"; drop it when neither is left.
+            if receipt.read_at is None:
+                db.session.delete(receipt)
+            else:
+                receipt.hidden_at = None
+        else:
+            notification.is_visible = True
+    db.session.commit()
+    invalidate_unread_count(notification.role, notification.user_id or user_id)
+
+
+def mark_all_read(role, user_id):
+    """
+    Mark every notification of a user as read with one set-based statement.
+
+    Upserts the user's watermark to the newest notification id of the role;
+    neither the user's rows nor the global ones are touched.
+
+    Args:
+        role (str): The user's role
+        user_id (int): The reader
+    """
+    latest = db.session.query(
+        db.literal(user_id), db.literal(role),
+        db.func.coalesce(db.func.max(Notification.id), 0), db.literal(datetime.utcnow())
+    ).filter(Notification.role == role)
+
+    dialect = postgresql if db.session.get_bind().dialect.name == 'postgresql' else sqlite
+    statement = dialect.insert(NotificationWatermark).from_select(
+        ['user_id', 'role', 'read_up_to_id', 'updated_at'], latest
+    )
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=['user_id', 'role'],
+        set_={
+            'read_up_to_id': statement.excluded.read_up_to_id,
+            'updated_at': statement.excluded.updated_at
+        }
+    ))
+    db.session.commit()
+    invalidate_unread_count(role, user_id)
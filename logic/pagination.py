@@ -0,0 +1,97 @@
+import base64
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import tuple_
+
+KeysetPage = namedtuple('KeysetPage', ['items', 'next_cursor', 'prev_cursor'])
+
+
+def encode_cursor(sort_value, row_id):
+    """
+    Encode a (timestamp, id) pair into an opaque, URL-safe cursor.
+
+    Args:
+        sort_value (datetime): Value of the sort column for the row.
+        row_id (int): Primary key of the row.
+
+    Returns:
+        str: URL-safe cursor string.
+    """
+    raw = f"{sort_value.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor produced by encode_cursor.
+
+    Args:
+        cursor (str): Cursor string from the query string.
+
+    Returns:
+        tuple or None: (datetime, int) pair, or None if the cursor is missing or invalid.
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8')
+        sort_raw, id_raw = raw.rsplit('|', 1)
+        return datetime.fromisoformat(sort_raw), int(id_raw)
+    except (ValueError, UnicodeError):
+        return None
+
+
+def keyset_paginate(query, sort_column, id_column, after=None, before=None, page_size=24):
+    """
+    Paginate a query newest-first on (sort_column, id_column) using keyset cursors.
+
+    Unlike OFFSET pagination, every page is an index range scan of at most
+    page_size + 1 rows, so the cost does not grow with the table size. The
+    cursor is compared as a row value, (sort, id) < (:sort, :id), which the
+    database uses as the start of the index range rather than as a filter.
+
+    Args:
+        query (Query): Base SQLAlchemy query (filters already applied).
+        sort_column (Column): Timestamp column used as the primary sort key.
+        id_column (Column): Unique column used as the tie breaker.
+        after (str, optional): Cursor of the last row of the previous page.
+        before (str, optional): Cursor of the first row of the next page.
+        page_size (int): Number of rows per page.
+
+    Returns:
+        KeysetPage: Rows for the page plus cursors for the adjacent pages.
+    """
+    after_key = decode_cursor(after)
+    before_key = decode_cursor(before)
+
+    if before_key and not after_key:
+        sort_value, row_id = before_key
+        rows = query.filter(
+            tuple_(sort_column, id_column) > tuple_(sort_value, row_id)
+        ).order_by(sort_column.asc(), id_column.asc()).limit(page_size + 1).all()
+
+        has_prev = len(rows) > page_size
+        items = list(reversed(rows[:page_size]))
+        return KeysetPage(
+            items=items,
+            next_cursor=_row_cursor(items[-1], sort_column, id_column) if items else None,
+            prev_cursor=_row_cursor(items[0], sort_column, id_column) if has_prev else None
+        )
+
+    if after_key:
+        sort_value, row_id = after_key
+        query = query.filter(tuple_(sort_column, id_column) < tuple_(sort_value, row_id))
+
+    rows = query.order_by(sort_column.desc(), id_column.desc()).limit(page_size + 1).all()
+    has_next = len(rows) > page_size
+    items = rows[:page_size]
+    return KeysetPage(
+        items=items,
+        next_cursor=_row_cursor(items[-1], sort_column, id_column) if has_next else None,
+        prev_cursor=_row_cursor(items[0], sort_column, id_column) if after_key and items else None
+    )
+
+
+def _row_cursor(row, sort_column, id_column):
+    return encode_cursor(getattr(row, sort_column.key), getattr(row, id_column.key))
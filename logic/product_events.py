@@ -0,0 +1,33 @@
+from flask import current_app
+from models.models_definitions import db
+from logic.fragment_cache import fragment_cache
+from logic.http_cache import purge_tags, product_tag, bump_page_version, CATALOG_TAG
+from logic.search import index_product
+from logic.suggest_index import suggest_index
+from logic.attributes import facet_counts
+from logic.recommendations import remove_recommendations
+
+
+def product_changed(product_id):
+    """
+    Invalidate everything derived from a product after it was written.
+
+    Call this after committing any change to a product or its images
+    (edit, approval, deletion, image upload/removal, main image switch).
+    The write is already committed, so a failing search index update is
+    logged rather than raised; rebuild_search_index repairs the index.
+
+    Args:
+        product_id (int): ID of the product that changed.
+    """
+    fragment_cache.invalidate_product(product_id)
+    bump_page_version(CATALOG_TAG)
+    purge_tags([product_tag(product_id), CATALOG_TAG])
+    try:
+        index_product(product_id)
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception("Search indexing failed for product %s", product_id)
+    suggest_index.refresh_product(product_id)
+    facet_counts.invalidate()
+    remove_recommendations(product_id)
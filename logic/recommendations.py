@@ -0,0 +1,197 @@
+import re
+import math
+from collections import Counter
+import numpy as np
+from scipy import sparse
+from models.models_definitions import db, Product, ProductRecommendation
+from logic.catalog import card_query
+from logic.search import html_to_text
+from logic.http_cache import purge_tags, RELATED_TAG
+
+TOKEN_PATTERN = re.compile(r'\w\w+', re.UNICODE)
+
+
+def tokenize(text):
+    """Split text into lower-case word tokens of at least two characters."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def build_tfidf(documents, max_features=1024, min_df=2):
+    """
+    Build an L2-normalized TF-IDF matrix for a list of documents.
+
+    The vocabulary is limited to the max_features terms with the highest
+    document frequency (terms in fewer than min_df documents cannot link two
+    products and are dropped). IDF uses the smoothed form
+    log((1 + n) / (1 + df)) + 1.
+
+    Args:
+        documents (list[str]): One text per product.
+        max_features (int): Maximum vocabulary size (matrix width).
+        min_df (int): Minimum document frequency of a term.
+
+    The matrix is kept in CSR form: a product description only uses a few
+    dozen of the vocabulary terms, so a dense matrix would be almost all zeros
+    (about 400 MB at 100k products and 1024 features).
+
+    Returns:
+        scipy.sparse.csr_matrix: float32 matrix of shape
+        (len(documents), vocabulary size).
+    """
+    tokenized = [Counter(tokenize(document)) for document in documents]
+    document_frequency = Counter()
+    for counts in tokenized:
+        document_frequency.update(counts.keys())
+
+    terms = [term for term, df in document_frequency.most_common(max_features) if df >= min_df]
+    vocabulary = {term: column for column, term in enumerate(terms)}
+
+    rows, columns, values = [], [], []
+    for row, counts in enumerate(tokenized):
+        for term, count in counts.items():
+            column = vocabulary.get(term)
+            if column is not None:
+                rows.append(row)
+                columns.append(column)
+                values.append(count)
+
+    n = len(documents)
+    idf = np.array(
+        [math.log((1 + n) / (1 + document_frequency[term])) + 1 for term in terms],
+        dtype=np.float32
+    )
+    data = np.asarray(values, dtype=np.float32) * idf[np.asarray(columns, dtype=np.int64)]
+    matrix = sparse.csr_matrix(
+        (data, (rows, columns)), shape=(n, len(vocabulary)), dtype=np.float32
+    )
+
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1), dtype=np.float32).ravel())
+    norms[norms == 0] = 1
+    return sparse.csr_matrix(sparse.diags(1 / norms) @ matrix, dtype=np.float32)
+
+
+def top_k_neighbours(matrix, k=6, batch_size=512):
+    """
+    Find the k most similar rows for every row by cosine similarity.
+
+    Rows are L2-normalized, so cosine similarity is a dot product. Similarities
+    are computed one batch of rows at a time as a sparse product; only that
+    batch_size x n block is made dense, for the top-k selection.
+
+    Args:
+        matrix (scipy.sparse.csr_matrix): Normalized TF-IDF matrix (n x features).
+        k (int): Number of neighbours per row.
+        batch_size (int): Rows per matrix product.
+
+    Returns:
+        tuple[numpy.ndarray, numpy.ndarray]: (indices, scores), both n x k,
+        ordered by descending similarity.
+    """
+    n = matrix.shape[0]
+    k = min(k, n - 1)
+    indices = np.zeros((n, max(k, 0)), dtype=np.int64)
+    scores = np.zeros((n, max(k, 0)), dtype=np.float32)
+    if k <= 0:
+        return indices, scores
+
+    transposed = matrix.T.tocsr()
+    for start in range(0, n, batch_size):
+        stop = min(start + batch_size, n)
+        similarities = (matrix[start:stop] @ transposed).toarray()
+        similarities[np.arange(stop - start), np.arange(start, stop)] = -1.0
+
+        candidates = np.argpartition(similarities, -k, axis=1)[:, -k:]
+        candidate_scores = np.take_along_axis(similarities, candidates, axis=1)
+        order = np.argsort(-candidate_scores, axis=1)
+
+        indices[start:stop] = np.take_along_axis(candidates, order, axis=1)
+        scores[start:stop] = np.take_along_axis(candidate_scores, order, axis=1)
+
+    return indices, scores
+
+
+def rebuild_recommendations(k=6, max_features=1024, batch_size=512):
+    """
+    Recompute related products for every approved product.
+
+    Args:
+        k (int): Recommendations stored per product.
+        max_features (int): TF-IDF vocabulary size.
+        batch_size (int): Rows per similarity batch.
+
+    Product detail pages are purged afterwards (RELATED_TAG), since their
+    related-products block changes.
+
+    Returns:
+        int: Number of recommendation rows written.
+    """
+    products = db.session.query(
+        Product.id, Product.name, Product.description, Product.specs
+    ).filter(Product.is_approved.is_(True)).order_by(Product.id).all()
+
+    ids = [product.id for product in products]
+    documents = [
+        # The name is repeated to weigh it above long descriptions.
+        f"{product.name} {product.name} {html_to_text(product.description)} {html_to_text(product.specs)}"
+        for product in products
+    ]
+
+    rows = []
+    if len(ids) > 1:
+        matrix = build_tfidf(documents, max_features=max_features)
+        indices, scores = top_k_neighbours(matrix, k=k, batch_size=batch_size)
+        for row, product_id in enumerate(ids):
+            rank = 0
+            for column, score in zip(indices[row], scores[row]):
+                if score <= 0:
+                    break
+                rank += 1
+                rows.append({
+                    'product_id': product_id,
+                    'related_product_id': ids[column],
+                    'rank': rank,
+                    'score': float(score),
+                })
+
+    db.session.execute(db.delete(ProductRecommendation))
+    if rows:
+        db.session.execute(db.insert(ProductRecommendation), rows)
+    db.session.commit()
+    purge_tags([RELATED_TAG], wait=True)
+    return len(rows)
+
+
+def get_related_products(product_id, limit=6):
+    """
+    Return precomputed related products for the detail page.
+
+    Args:
+        product_id (int): Product being viewed.
+        limit (int): Maximum number of products.
+
+    Returns:
+        list[Product]: Approved related products in rank order (card columns only).
+    """
+    return card_query().join(
+        ProductRecommendation, ProductRecommendation.related_product_id == Product.id
+    ).filter(
+        ProductRecommendation.product_id == product_id,
+        Product.is_approved.is_(True)
+    ).order_by(ProductRecommendation.rank).limit(limit).all()
+
+
+def remove_recommendations(product_id):
+    """
+    Drop recommendations from and to a product that is gone or unapproved.
+
+    Args:
+        product_id (int): ID of the product that changed.
+    """
+    product = db.session.get(Product, product_id)
+    if product is not None and product.is_approved:
+        return
+    db.session.execute(db.delete(ProductRecommendation).where(
+        (ProductRecommendation.product_id == product_id)
+        | (ProductRecommendation.related_product_id == product_id)
+    ))
+    db.session.commit()
@@ -0,0 +1,171 @@
+import re
+import html
+from collections import namedtuple
+import bleach
+from sqlalchemy import DDL, event, text
+from models.models_definitions import db, Product
+from logic.catalog import card_query
+
+SearchPage = namedtuple('SearchPage', ['items', 'page', 'has_next'])
+
+# PostgreSQL text search configuration per interface locale. The product text
+# is stored once per configuration so each locale gets its own stemming.
+SEARCH_CONFIGS = {
+    'en': 'english',
+    'de': 'german',
+    'ar': 'arabic',
+}
+DEFAULT_CONFIG = 'english'
+
+POSTGRES_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS product_search (
+        product_id INTEGER NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+        config REGCONFIG NOT NULL,
+        document TSVECTOR NOT NULL,
+        PRIMARY KEY (product_id, config)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_product_search_document ON product_search USING GIN (document)",
+)
+
+SQLITE_SCHEMA = (
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS product_search USING fts5(
+        product_id UNINDEXED, name, body,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+)
+
+# Create/drop the search table together with the products table, so
+# db.create_all() and db.drop_all() keep working as before.
+for _statement in POSTGRES_SCHEMA:
+    event.listen(Product.__table__, 'after_create', DDL(_statement).execute_if(dialect='postgresql'))
+for _statement in SQLITE_SCHEMA:
+    event.listen(Product.__table__, 'after_create', DDL(_statement).execute_if(dialect='sqlite'))
+event.listen(Product.__table__, 'before_drop', DDL("DROP TABLE IF EXISTS product_search"))
+
+
+def ensure_search_schema():
+    """Create the search table and index on an existing database if missing."""
+    statements = POSTGRES_SCHEMA if _is_postgres() else SQLITE_SCHEMA
+    with db.engine.begin() as connection:
+        for statement in statements:
+            connection.execute(text(statement))
+
+
+def html_to_text(value):
+    """
+    Convert sanitized rich text into plain text for indexing.
+
+    Args:
+        value (str or None): HTML produced by sanitize_rich_text.
+
+    Returns:
+        str: Plain text with tags removed and entities decoded.
+    """
+    return html.unescape(bleach.clean(value or '', tags=[], strip=True))
+
+
+def index_product(product_id):
+    """
+    Update the search index for one product after it was written.
+
+    Approved products are (re)indexed; missing or unapproved products are
+    removed from the index.
+
+    Args:
+        product_id (int): ID of the product that changed.
+    """
+    product = db.session.get(Product, product_id)
+    db.session.execute(text("DELETE FROM product_search WHERE product_id = :id"), {'id': product_id})
+
+    if product is not None and product.is_approved:
+        params = {
+            'id': product.id,
+            'name': f"{product.name} {product.product_code}",
+            'body': f"{html_to_text(product.description)} {html_to_text(product.specs)}",
+        }
+        if _is_postgres():
+            for config in SEARCH_CONFIGS.values():
+                db.session.execute(text(
+                    "INSERT INTO product_search (product_id, config, document) "
+                    "VALUES (:id, CAST(:config AS regconfig), "
+                    "setweight(to_tsvector(CAST(:config AS regconfig), :name), 'A') || "
+                    "setweight(to_tsvector(CAST(:config AS regconfig), :body), 'B'))"
+                ), {**params, 'config': config})
+        else:
+            db.session.execute(text(
+                "INSERT INTO product_search (product_id, name, body) VALUES (:id, :name, :body)"
+            ), params)
+
+    db.session.commit()
+
+
+def rebuild_search_index():
+    """
+    Index every approved product from scratch.
+
+    Returns:
+        int: Number of products indexed.
+    """
+    ensure_search_schema()
+    db.session.execute(text("DELETE FROM product_search"))
+    db.session.commit()
+
+    ids = [row[0] for row in db.session.query(Product.id).filter(Product.is_approved.is_(True))]
+    for product_id in ids:
+        index_product(product_id)
+    return len(ids)
+
+
+def search_products(query, locale=None, page=1, per_page=24):
+    """
+    Run a ranked full-text search over approved products.
+
+    Args:
+        query (str): Search terms as typed by the user.
+        locale (str, optional): Interface locale ('en', 'de', 'ar').
+        page (int): 1-based page number.
+        per_page (int): Results per page.
+
+    Returns:
+        SearchPage: Matching products (with their rank) for the page.
+    """
+    page = max(page, 1)
+    terms = re.findall(r'\w+', query or '')
+    if not terms:
+        return SearchPage(items=[], page=page, has_next=False)
+
+    params = {'limit': per_page + 1, 'offset': (page - 1) * per_page}
+    if _is_postgres():
+        params.update(config=SEARCH_CONFIGS.get(locale, DEFAULT_CONFIG), query=' '.join(terms))
+        rows = db.session.execute(text(
+            "SELECT s.product_id, ts_rank_cd(s.document, q) AS rank "
+            "FROM product_search s, websearch_to_tsquery(CAST(:config AS regconfig), :query) q "
+            "WHERE s.config = CAST(:config AS regconfig) AND s.document @@ q "
+            "ORDER BY rank DESC, s.product_id DESC LIMIT :limit OFFSET :offset"
+        ), params).all()
+    else:
+        # Every term must match, as a prefix so partial words still hit.
+        params['query'] = ' '.join(f'"{term}"*' for term in terms)
+        rows = db.session.execute(text(
+            "SELECT product_id, -bm25(product_search, 0.0, 10.0, 1.0) AS rank "
+            "FROM product_search WHERE product_search MATCH :query "
+            "ORDER BY rank DESC, product_id DESC LIMIT :limit OFFSET :offset"
+        ), params).all()
+
+    has_next = len(rows) > per_page
+    ranks = {int(row[0]): float(row[1]) for row in rows[:per_page]}
+    products = card_query().filter(
+        Product.id.in_(ranks), Product.is_approved.is_(True)
+    ).all() if ranks else []
+    by_id = {product.id: product for product in products}
+
+    items = [(by_id[product_id], rank) for product_id, rank in ranks.items() if product_id in by_id]
+    return SearchPage(items=items, page=page, has_next=has_next)
+
+
+def _is_postgres():
+    return db.engine.dialect.name == 'postgresql'
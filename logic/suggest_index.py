@@ -0,0 +1,130 @@
+import time
+import bisect
+import threading
+import unicodedata
+from models.models_definitions import db, Product
+
+
+def normalize(value):
+    """
+    Normalize text for prefix matching: case-folded, without diacritics.
+
+    Args:
+        value (str): Raw text.
+
+    Returns:
+        str: Normalized text.
+    """
+    decomposed = unicodedata.normalize('NFKD', value or '')
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return stripped.casefold().strip()
+
+
+def product_keys(product_id, name, product_code):
+    """Return the sorted-array entries for a product: full name, each word and the code."""
+    normalized_name = normalize(name)
+    keys = {normalized_name, normalize(product_code)}
+    keys.update(normalized_name.split())
+    return [(key, product_id) for key in keys if key]
+
+
+class SuggestIndex:
+    """
+    Per-worker prefix index over approved product names and codes.
+
+    Entries are (normalized_key, product_id) tuples kept in a sorted list, so
+    a prefix lookup is one bisect plus a short forward scan, with no database
+    round trip. The worker that handles a product write updates the index
+    incrementally; every worker also rebuilds it from the database after
+    max_age seconds so changes made in other workers converge.
+    """
+
+    def __init__(self, max_age=300):
+        self.max_age = max_age
+        self._keys = []
+        self._products = {}
+        self._built_at = None
+        self._lock = threading.Lock()
+
+    def ensure_built(self):
+        """Build the index on first use and whenever it is older than max_age."""
+        if self._built_at is None or time.monotonic() - self._built_at > self.max_age:
+            self.rebuild()
+
+    def rebuild(self):
+        """Reload every approved product from the database."""
+        rows = db.session.query(Product.id, Product.name, Product.product_code).filter(
+            Product.is_approved.is_(True)
+        ).all()
+
+        keys = []
+        products = {}
+        for product_id, name, product_code in rows:
+            keys.extend(product_keys(product_id, name, product_code))
+            products[product_id] = (name, product_code)
+        keys.sort()
+
+        with self._lock:
+            self._keys = keys
+            self._products = products
+            self._built_at = time.monotonic()
+
+    def refresh_product(self, product_id):
+        """
+        Apply a single product write to an already built index.
+
+        Args:
+            product_id (int): ID of the product that changed.
+        """
+        if self._built_at is None:
+            return
+
+        product = db.session.get(Product, product_id)
+        with self._lock:
+            self._remove(product_id)
+            if product is not None and product.is_approved:
+                for key in product_keys(product.id, product.name, product.product_code):
+                    bisect.insort(self._keys, key)
+                self._products[product.id] = (product.name, product.product_code)
+
+    def suggest(self, prefix, limit=10):
+        """
+        Return products whose name, a word of the name, or code starts with prefix.
+
+        Args:
+            prefix (str): Text typed so far.
+            limit (int): Maximum number of suggestions.
+
+        Returns:
+            list[dict]: Suggestions with id, name and product_code.
+        """
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        results = []
+        seen = set()
+        with self._lock:
+            position = bisect.bisect_left(self._keys, (prefix,))
+            while position < len(self._keys) and len(results) < limit:
+                key, product_id = self._keys[position]
+                if not key.startswith(prefix):
+                    break
+                if product_id not in seen:
+                    seen.add(product_id)
+                    name, product_code = self._products[product_id]
+                    results.append({'id': product_id, 'name': name, 'product_code': product_code})
+                position += 1
+        return results
+
+    def _remove(self, product_id):
+        product = self._products.pop(product_id, None)
+        if product is None:
+            return
+        for key in product_keys(product_id, *product):
+            position = bisect.bisect_left(self._keys, key)
+            if position < len(self._keys) and self._keys[position] == key:
+                del self._keys[position]
+
+
+suggest_index = SuggestIndex()
@@ -2,6 +2,7 @@ from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
+from sqlalchemy.orm.attributes import flag_modified
 
 db = SQLAlchemy()
 
@@ -18,10 +19,24 @@ class Product(db.Model):
         product_code (str): Unique code identifying the product.
         merchant_id (int): Foreign key to the User (merchant).
         is_approved (bool): Approval status of the product.
+        main_image_url (str): Denormalized URL of the main image, for listing pages.
+        thumbnail_url (str): Denormalized URL of the main image thumbnail.
+        main_image_srcset (str): Denormalized WebP srcset of the main image.
+        main_image_avif_srcset (str): Denormalized AVIF srcset of the main image.
+        main_image_width (int): Denormalized pixel width of the main image.
+        main_image_height (int): Denormalized pixel height of the main image.
+        main_image_color (str): Denormalized dominant colour of the main image.
+        main_image_placeholder (str): Denormalized blur placeholder of the main image.
+        images_version (int): Incremented whenever the denormalized image columns
+            change, so cached pages and fragments see background image work
+            that leaves updated_at alone.
         updated_at (datetime): Last update timestamp.
     """
 
     __tablename__ = 'products'
+    __table_args__ = (
+        db.Index('ix_products_approved_updated', 'is_approved', 'updated_at', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -31,7 +46,16 @@ class Product(db.Model):
     product_code = db.Column(db.String(30), unique=True, nullable=False)
     merchant_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
     is_approved = db.Column(db.Boolean, default=False)  # Set default approval as False
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    main_image_url = db.Column(db.String(255), nullable=True)
+    thumbnail_url = db.Column(db.String(255), nullable=True)
+    main_image_srcset = db.Column(db.Text, nullable=True)
+    main_image_avif_srcset = db.Column(db.Text, nullable=True)
+    main_image_width = db.Column(db.Integer, nullable=True)
+    main_image_height = db.Column(db.Integer, nullable=True)
+    main_image_color = db.Column(db.String(7), nullable=True)
+    main_image_placeholder = db.Column(db.Text, nullable=True)
+    images_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
     def __repr__(self):
@@ -43,6 +67,41 @@ class Product(db.Model):
         if self.merchant_id:
             self.product_code = f"USR{self.merchant_id:06d}-PRO{sequence:03d}"
 
+    def refresh_main_image(self, touch=True):
+        """Copy the current main image URL onto the product for listing pages.
+
+        Must be called after any change to the product's images (upload,
+        delete, main image switch). Pending changes are flushed by the query.
+        Always bumps images_version. Also bumps updated_at unless touch is
+        False: background jobs (variant generation) must not move the product
+        in the catalog order, which is keyed on updated_at.
+        """
+        main_image = ProductImage.query.filter_by(
+            product_id=self.id, is_main=True
+        ).order_by(ProductImage.id).first()
+
+        self.main_image_url = main_image.image_url if main_image else None
+        self.thumbnail_url = self.main_image_url
+        self.main_image_srcset = None
+        self.main_image_avif_srcset = None
+        self.main_image_width = main_image.width if main_image else None
+        self.main_image_height = main_image.height if main_image else None
+        self.main_image_color = main_image.dominant_color if main_image else None
+        self.main_image_placeholder = main_image.blur_placeholder if main_image else None
+
+        if main_image and main_image.variants:
+            webp = main_image.variants_for('webp')
+            if webp:
+                self.thumbnail_url = webp[0].url
+            self.main_image_srcset = main_image.srcset('webp')
+            self.main_image_avif_srcset = main_image.srcset('avif')
+        self.images_version = (self.images_version or 0) + 1
+        if touch:
+            self.updated_at = datetime.utcnow()
+        else:
+            # Keep the current value out of the onupdate default.
+            flag_modified(self, 'updated_at')
+
 
 class User(db.Model, UserMixin):
     """Database model for users.
@@ -105,9 +164,27 @@ class Notification(db.Model):
         is_read (bool): Status of whether the notification has been read.
         is_visible (bool): Status of whether the notification is visible.
         created_at (datetime): Timestamp of when the notification was created.
+
+    For global notifications (user_id None) is_read and is_visible are shared
+    by every reader; each user's own read/hide state of them is kept in
+    NotificationReceipt and NotificationWatermark.
     """
 
     __tablename__ = 'notifications'
+    __table_args__ = (
+        # Inbox and archive pages: equality on role/is_visible/user_id, then
+        # newest-first keyset order. Covers the key lookup of every page.
+        db.Index('ix_notifications_inbox', 'role', 'is_visible', 'user_id', 'created_at', 'id'),
+        # Partial index for the unread badge; only unread, visible rows are
+        # indexed, with the id for the per-user read watermark. Renamed from
+        # ix_notifications_unread when the id was added, so existing
+        # databases get the new definition (see schema_utils.RETIRED_INDEXES).
+        db.Index(
+            'ix_notifications_unread_v2', 'role', 'user_id', 'id',
+            postgresql_where=db.text('NOT is_read AND is_visible'),
+            sqlite_where=db.text('is_read = 0 AND is_visible = 1')
+        ),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
@@ -125,6 +202,60 @@ class Notification(db.Model):
         return f"<Notification {self.id} to {self.role} ({self.type})>"
 
 
+class NotificationReceipt(db.Model):
+    """Database model for one user's state of a global notification.
+
+    A broadcast stays a single Notification row; a receipt is only written
+    when a reader reads or hides it one by one, so a broadcast costs one row
+    plus at most one small row per reader.
+
+    Attributes:
+        notification_id (int): Global notification, part of the primary key.
+        user_id (int): Reader, part of the primary key.
+        read_at (datetime): When the user read it, or None.
+        hidden_at (datetime): When the user hid it, or None.
+    """
+
+    __tablename__ = 'notification_receipts'
+    __table_args__ = (
+        db.Index('ix_notification_receipts_user', 'user_id', 'notification_id'),
+    )
+
+    notification_id = db.Column(
+        db.Integer, db.ForeignKey('notifications.id', ondelete='CASCADE'), primary_key=True
+    )
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    read_at = db.Column(db.DateTime, nullable=True)
+    hidden_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<NotificationReceipt {self.notification_id} by {self.user_id}>"
+
+
+class NotificationWatermark(db.Model):
+    """Database model for a user's "mark all as read" position.
+
+    Every notification of the role with an id up to read_up_to_id counts as
+    read for the user, so marking everything read is one upsert of this row.
+
+    Attributes:
+        user_id (int): Reader, part of the primary key.
+        role (str): Role whose notifications were read, part of the primary key.
+        read_up_to_id (int): Highest notification id read.
+        updated_at (datetime): When the user last marked everything read.
+    """
+
+    __tablename__ = 'notification_watermarks'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    role = db.Column(db.String(20), primary_key=True)
+    read_up_to_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<NotificationWatermark {self.user_id} ({self.role}) <= {self.read_up_to_id}>"
+
+
 class ProductImage(db.Model):
     """Database model for multiple images per product.
 
@@ -133,6 +264,13 @@ class ProductImage(db.Model):
         product_id (int): Foreign key to the associated product.
         image_url (str): URL of the image.
         is_main (bool): Indicates if this is the main image.
+        width (int): Pixel width, after EXIF rotation.
+        height (int): Pixel height, after EXIF rotation.
+        byte_size (int): Size of the original file.
+        content_hash (str): SHA-256 hex digest of the original file.
+        dominant_color (str): Dominant colour as "#rrggbb".
+        blur_placeholder (str): Tiny blurred preview as a data URI.
+        blob_id (int): Content-addressed stored object, shared by identical uploads.
         created_at (datetime): Timestamp of image upload.
     """
 
@@ -142,13 +280,247 @@ class ProductImage(db.Model):
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
     image_url = db.Column(db.String(255), nullable=False)
     is_main = db.Column(db.Boolean, default=False)
+    width = db.Column(db.Integer, nullable=True)
+    height = db.Column(db.Integer, nullable=True)
+    byte_size = db.Column(db.Integer, nullable=True)
+    content_hash = db.Column(db.String(64), nullable=True, index=True)
+    dominant_color = db.Column(db.String(7), nullable=True)
+    blur_placeholder = db.Column(db.Text, nullable=True)
+    blob_id = db.Column(db.Integer, db.ForeignKey('image_blobs.id'), nullable=True, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     product = db.relationship('Product', backref='images')
+    blob = db.relationship('ImageBlob', backref='images')
 
     def __repr__(self):
         return f"<ProductImage product_id={self.product_id} is_main={self.is_main}>"
 
+    def variants_for(self, image_format):
+        """Return the resized variants in the given format, narrowest first."""
+        return sorted(
+            (variant for variant in self.variants if variant.format == image_format),
+            key=lambda variant: variant.width
+        )
+
+    def srcset(self, image_format):
+        """Build an HTML srcset from the variants in the given format, or None if there are none."""
+        variants = self.variants_for(image_format)
+        if not variants:
+            return None
+        return ', '.join(f"{variant.url} {variant.width}w" for variant in variants)
+
+
+class ProductImageVariant(db.Model):
+    """Resized and re-encoded copy of a product image, generated in the background.
+
+    Attributes:
+        id (int): Primary key.
+        image_id (int): Foreign key to the original product image.
+        width (int): Width of the variant in pixels.
+        height (int): Height of the variant in pixels.
+        format (str): Encoding of the variant (webp or avif).
+        object_key (str): Key of the variant in the original image's bucket.
+        url (str): Public URL of the variant.
+        byte_size (int): Size of the encoded variant.
+        created_at (datetime): Timestamp of the last generation.
+    """
+
+    __tablename__ = 'product_image_variants'
+    __table_args__ = (
+        db.UniqueConstraint('image_id', 'width', 'format', name='uq_product_image_variant'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    image_id = db.Column(
+        db.Integer, db.ForeignKey('product_images.id', ondelete='CASCADE'), nullable=False, index=True
+    )
+    width = db.Column(db.Integer, nullable=False)
+    height = db.Column(db.Integer, nullable=False)
+    format = db.Column(db.String(10), nullable=False)
+    object_key = db.Column(db.String(255), nullable=False)
+    url = db.Column(db.String(255), nullable=False)
+    byte_size = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    image = db.relationship(
+        'ProductImage',
+        backref=db.backref('variants', cascade='all, delete-orphan', passive_deletes=True)
+    )
+
+    def __repr__(self):
+        return f"<ProductImageVariant image_id={self.image_id} {self.width}w {self.format}>"
+
+
+class ImageBlob(db.Model):
+    """Content-addressed image object in MinIO, shared by every identical upload.
+
+    Attributes:
+        id (int): Primary key.
+        bucket (str): Bucket holding the object.
+        object_key (str): Key derived from the content hash.
+        content_hash (str): SHA-256 hex digest of the content.
+        byte_size (int): Size of the object.
+        content_type (str): MIME type of the object.
+        ref_count (int): Number of product images referencing the object.
+        released_at (datetime): When the last reference was dropped; the orphan
+            sweeper removes the blob once it has been unreferenced long enough.
+        created_at (datetime): Timestamp of the first upload.
+    """
+
+    __tablename__ = 'image_blobs'
+    __table_args__ = (
+        db.UniqueConstraint('bucket', 'content_hash', name='uq_image_blobs_bucket_hash'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    bucket = db.Column(db.String(63), nullable=False)
+    object_key = db.Column(db.String(255), nullable=False)
+    content_hash = db.Column(db.String(64), nullable=False)
+    byte_size = db.Column(db.Integer, nullable=False)
+    content_type = db.Column(db.String(50), nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    released_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<ImageBlob {self.content_hash[:12]} refs={self.ref_count}>"
+
+
+class ResumableUpload(db.Model):
+    """Product image sent in chunks, each stored as a part of a MinIO multipart upload.
+
+    Attributes:
+        id (int): Primary key.
+        token (str): Opaque identifier handed to the client.
+        product_id (int): Product the image is for.
+        user_id (int): User who started the upload; only they may continue it.
+        bucket (str): Target bucket.
+        object_key (str): Key of the finished object.
+        upload_id (str): MinIO multipart upload ID.
+        filename (str): Sanitized client filename.
+        content_type (str): Declared MIME type.
+        total_size (int): Size of the whole file in bytes.
+        chunk_size (int): Size of every chunk but the last.
+        image_id (int): Image created on completion, None until then.
+        created_at (datetime): Timestamp of the first request.
+        expires_at (datetime): After this the multipart upload is aborted.
+    """
+
+    __tablename__ = 'resumable_uploads'
+
+    id = db.Column(db.Integer, primary_key=True)
+    token = db.Column(db.String(32), nullable=False, unique=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='SET NULL'), nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    bucket = db.Column(db.String(63), nullable=False)
+    object_key = db.Column(db.String(255), nullable=False)
+    upload_id = db.Column(db.String(255), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    content_type = db.Column(db.String(50), nullable=False)
+    total_size = db.Column(db.BigInteger, nullable=False)
+    chunk_size = db.Column(db.Integer, nullable=False)
+    image_id = db.Column(db.Integer, db.ForeignKey('product_images.id', ondelete='SET NULL'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    @property
+    def chunk_count(self):
+        """Number of chunks the file is split into."""
+        return max(1, -(-self.total_size // self.chunk_size))
+
+    def chunk_length(self, index):
+        """Expected size of the chunk at a 0-based index."""
+        if index < self.chunk_count - 1:
+            return self.chunk_size
+        return self.total_size - self.chunk_size * (self.chunk_count - 1)
+
+    def __repr__(self):
+        return f"<ResumableUpload {self.token} product_id={self.product_id}>"
+
+
+class ProductAttribute(db.Model):
+    """Database model for structured product attributes used for faceted filtering.
+
+    Attributes:
+        id (int): Primary key.
+        product_id (int): Foreign key to the associated product.
+        name (str): Normalized attribute name (e.g. "packaging").
+        value (str): Attribute value (e.g. "glass jar").
+    """
+
+    __tablename__ = 'product_attributes'
+    __table_args__ = (
+        db.UniqueConstraint('product_id', 'name', 'value', name='uq_product_attributes_product_name_value'),
+        db.Index('ix_product_attributes_name_value_product', 'name', 'value', 'product_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='CASCADE'), nullable=False)
+    name = db.Column(db.String(50), nullable=False)
+    value = db.Column(db.String(100), nullable=False)
+
+    product = db.relationship(
+        'Product',
+        backref=db.backref('attributes', cascade='all, delete-orphan', lazy=True)
+    )
+
+    def __repr__(self):
+        return f"<ProductAttribute {self.name}={self.value}>"
+
+
+class ProductRecommendation(db.Model):
+    """Database model for precomputed "related products" of a product.
+
+    Rows are rebuilt by the offline recommendation job and read by the
+    product detail page with a single (product_id, rank) index lookup.
+
+    Attributes:
+        id (int): Primary key.
+        product_id (int): Product the recommendation is shown on.
+        related_product_id (int): Recommended product.
+        rank (int): Position in the list, starting at 1.
+        score (float): Cosine similarity between the two products.
+    """
+
+    __tablename__ = 'product_recommendations'
+    __table_args__ = (
+        db.UniqueConstraint('product_id', 'rank', name='uq_product_recommendations_product_rank'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='CASCADE'), nullable=False)
+    related_product_id = db.Column(
+        db.Integer, db.ForeignKey('products.id', ondelete='CASCADE'), nullable=False, index=True
+    )
+    rank = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Float, nullable=False)
+
+    def __repr__(self):
+        return f"<ProductRecommendation {self.product_id} -> {self.related_product_id} ({self.rank})>"
+
+
+class PageVersion(db.Model):
+    """Version counter of a family of cached pages, shared by every worker.
+
+    Bumped whenever something the pages show changes without changing the
+    timestamps their validators read (e.g. a product leaving the catalog),
+    so ETags change in every worker at once.
+
+    Attributes:
+        name (str): Page family, e.g. the "catalog" surrogate key.
+        version (int): Incremented on every change.
+        updated_at (datetime): Timestamp of the last bump.
+    """
+
+    __tablename__ = 'page_versions'
+
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<PageVersion {self.name}={self.version}>"
+
 
 class NutritionalAnalysis(db.Model):
     __tablename__ = 'nutritional_analyses'
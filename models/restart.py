@@ -3,9 +3,10 @@ restart.py
 
 Script to manage database table creation for the Flask application.
 
-This script provides two options for interacting with the database:
+This script provides three options for interacting with the database:
 1. Drop all tables and recreate them (WARNING: This deletes all existing data).
 2. Create only the tables that do not already exist (Safe operation).
+3. Create missing tables, columns and indexes (Safe operation).
 
 Note:
     - This script must not be executed in a production environment.
@@ -24,6 +25,7 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from myapp import app
 from models.models_definitions import db
+from models.schema_utils import upgrade_schema
 
 # Set up logging for the script
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -46,7 +48,8 @@ def prompt_user_choice() -> str:
     print("Please choose one of the following options:")
     print("1. Drop all tables and recreate them (This will erase all existing data!)")
     print("2. Create tables only if they do not already exist (Safe option)")
-    choice = input("Enter your choice (1 or 2): ").strip()
+    print("3. Add missing tables, columns and indexes (Safe option)")
+    choice = input("Enter your choice (1, 2 or 3): ").strip()
     return choice
 
 def handle_database_operations(choice: str):
@@ -60,6 +63,11 @@ def handle_database_operations(choice: str):
             elif choice == "2":
                 db.create_all()  # Create only missing tables
                 logging.info("Missing tables have been created successfully.")
+            elif choice == "3":
+                changes = upgrade_schema()
+                for table_name, columns in changes.items():
+                    logging.info("Added columns to %s: %s", table_name, ", ".join(columns))
+                logging.info("Schema upgrade completed successfully.")
             else:
                 logging.warning("Invalid choice. No action was performed.")
     except Exception as e:
@@ -73,7 +81,7 @@ def main():
         sys.exit(1)
 
     choice = prompt_user_choice()
-    if choice in ["1", "2"]:
+    if choice in ["1", "2", "3"]:
         handle_database_operations(choice)
     else:
         logging.error("Invalid choice. No action was performed.")
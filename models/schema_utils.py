@@ -0,0 +1,101 @@
+"""
+schema_utils.py
+
+Helpers to bring an existing database up to date with the model definitions.
+
+db.create_all() only creates missing tables; it never touches tables that
+already exist. upgrade_schema() additionally adds missing columns and
+indexes so new model fields can be deployed without dropping data.
+"""
+
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn
+
+from models.models_definitions import db
+
+# Indexes replaced under a new name, dropped once their successor exists.
+RETIRED_INDEXES = ('ix_notifications_unread',)
+
+
+def add_missing_columns(connection, table):
+    """Add columns defined on the model but missing from the database table.
+
+    Args:
+        connection (Connection): Open SQLAlchemy connection.
+        table (Table): Table metadata to compare against the database.
+
+    Returns:
+        list[str]: Names of the columns that were added.
+    """
+    existing = {column['name'] for column in inspect(connection).get_columns(table.name)}
+    added = []
+
+    for column in table.columns:
+        if column.name in existing:
+            continue
+        column_ddl = str(CreateColumn(column).compile(dialect=connection.dialect))
+        if not column.nullable and column.server_default is None:
+            # Existing rows have no value yet; backfill_required_columns fills
+            # them and adds the constraint afterwards.
+            column_ddl = column_ddl.replace(' NOT NULL', '')
+        connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column_ddl}'))
+        added.append(column.name)
+
+    return added
+
+
+def backfill_required_columns(connection):
+    """Fill NULLs left by older versions in columns that are now NOT NULL.
+
+    products.updated_at is the keyset pagination sort key and part of the
+    cursor, so it must never be NULL. PostgreSQL also gets the constraint;
+    SQLite cannot alter columns and relies on the model default.
+
+    Args:
+        connection (Connection): Open SQLAlchemy connection.
+    """
+    connection.execute(text('UPDATE products SET updated_at = CURRENT_TIMESTAMP WHERE updated_at IS NULL'))
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text('ALTER TABLE products ALTER COLUMN updated_at SET NOT NULL'))
+
+
+def drop_retired_indexes(connection):
+    """Drop indexes listed in RETIRED_INDEXES that are still in the database.
+
+    Args:
+        connection (Connection): Open SQLAlchemy connection.
+    """
+    for name in RETIRED_INDEXES:
+        connection.execute(text(f'DROP INDEX IF EXISTS {name}'))
+
+
+def upgrade_schema():
+    """Create missing tables, columns and indexes for all models.
+
+    Also creates the product search table, which is not a model and is
+    otherwise only created together with a new products table, and gives
+    products saved before attributes existed their price band.
+
+    Returns:
+        dict: Mapping of table name to the list of columns that were added.
+    """
+    db.create_all()
+    changes = {}
+
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            added = add_missing_columns(connection, table)
+            if added:
+                changes[table.name] = added
+            for index in table.indexes:
+                index.create(bind=connection, checkfirst=True)
+        backfill_required_columns(connection)
+        drop_retired_indexes(connection)
+
+    from logic.search import ensure_search_schema
+    ensure_search_schema()
+
+    from logic.attributes import backfill_price_bands
+    backfill_price_bands()
+
+    return changes
@@ -6,6 +6,7 @@ from dotenv import load_dotenv
 from flask_babel import Babel
 from flask_login import LoginManager
 from sqlalchemy import inspect
+from sqlalchemy.exc import SQLAlchemyError
 
 from models.models_definitions import db, User, ErrorLog
 from routes import register_routes, register_error_handlers
@@ -25,7 +26,27 @@ def create_app():
     app.config['PROPAGATE_EXCEPTIONS'] = True
     app.config['UPLOAD_FOLDER'] = os.path.join('/tmp', 'uploads')
     app.config['MAX_CONTENT_LENGTH'] = 2 * 1024 * 1024
+    app.config['MAX_IMAGE_UPLOAD_BYTES'] = int(os.getenv('MAX_IMAGE_UPLOAD_BYTES', str(2 * 1024 * 1024)))
+    app.config['MAX_DIRECT_UPLOAD_BYTES'] = int(os.getenv('MAX_DIRECT_UPLOAD_BYTES', str(20 * 1024 * 1024)))
+    app.config['DIRECT_UPLOAD_EXPIRY'] = int(os.getenv('DIRECT_UPLOAD_EXPIRY', '600'))
+    app.config['RESUMABLE_UPLOAD_EXPIRY'] = int(os.getenv('RESUMABLE_UPLOAD_EXPIRY', str(24 * 3600)))
+    app.config['IMAGE_VARIANT_PROCESSES'] = int(os.getenv('IMAGE_VARIANT_PROCESSES', '2'))
+    app.config['IMAGE_VARIANT_FORMATS'] = os.getenv('IMAGE_VARIANT_FORMATS', 'webp,avif')
+    app.config['IMAGE_DELIVERY'] = os.getenv('IMAGE_DELIVERY', 'direct')
+    app.config['IMAGE_URL_EXPIRY'] = int(os.getenv('IMAGE_URL_EXPIRY', '3600'))
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'fallback-secret')
+    app.config['CATALOG_PAGE_SIZE'] = int(os.getenv('CATALOG_PAGE_SIZE', '24'))
+    app.config['PAGE_CACHE_TTL'] = int(os.getenv('PAGE_CACHE_TTL', '60'))
+    app.config['PAGE_CACHE_CDN_TTL'] = int(os.getenv('PAGE_CACHE_CDN_TTL', '300'))
+    app.config['NOTIFICATION_PAGE_SIZE'] = int(os.getenv('NOTIFICATION_PAGE_SIZE', '20'))
+    app.config['NOTIFICATION_COUNT_TTL'] = float(os.getenv('NOTIFICATION_COUNT_TTL', '15'))
+    # Only on when /notifications/stream is served by async (gevent) workers;
+    # on sync workers every open stream would hold a worker.
+    app.config['NOTIFICATION_STREAM_ENABLED'] = os.getenv('NOTIFICATION_STREAM_ENABLED', 'false').lower() == 'true'
+    app.config['NOTIFICATION_STREAM_HEARTBEAT'] = float(os.getenv('NOTIFICATION_STREAM_HEARTBEAT', '15'))
+    app.config['NOTIFICATION_STREAM_MAX_AGE'] = float(os.getenv('NOTIFICATION_STREAM_MAX_AGE', '300'))
+    app.config['CDN_PURGE_URL'] = os.getenv('CDN_PURGE_URL')
+    app.config['CDN_PURGE_TOKEN'] = os.getenv('CDN_PURGE_TOKEN')
 
 
     for key, value in os.environ.items():
@@ -101,11 +122,15 @@ def inject_globals():
 
 @app.context_processor
 def inject_unread_notifications():
-    from logic.notification_service import get_user_notifications
-    role = session.get('role', 'visitor')
-    user_id = session.get('user_id')
-    notifications = get_user_notifications(role, user_id)
-    unread_count = sum(1 for n in notifications if not n.is_read)
+    from logic.notification_service import count_unread
+    from routes.auth_utils import current_identity
+    role, user_id = current_identity()
+    try:
+        unread_count = count_unread(role, user_id)
+    except SQLAlchemyError:
+        # Error pages must still render when the database is the problem.
+        db.session.rollback()
+        unread_count = 0
     return dict(unread_count=unread_count)
 
 
@@ -9,6 +9,8 @@ from werkzeug.routing import BuildError
 from routes.test_errors import test_errors_bp
 from routes.product_images_view import product_images_bp
 from routes.product_ai import product_ai_bp
+from routes.search_view import search_bp
+from routes.media_view import media_bp
 # from routes.minio_client import minio_client, MINIO_BUCKET, MINIO_BASE_URL
 from logic.error_utils import log_error_to_db
 
@@ -37,6 +39,8 @@ def register_routes(app):
     app.register_blueprint(test_errors_bp)  # Test routes for error handling (useful in dev mode)
     app.register_blueprint(product_images_bp)
     app.register_blueprint(product_ai_bp)
+    app.register_blueprint(search_bp)  # Product search page and JSON API
+    app.register_blueprint(media_bp)  # Image delivery proxy (/media/<bucket>/<key>)
 
 
 
@@ -1,12 +1,14 @@
 import os
-import uuid
 from flask import (
     Blueprint, render_template, request, redirect,
-    url_for, current_app, flash, abort
+    url_for, current_app, flash, abort, jsonify
 )
-from werkzeug.utils import secure_filename
 
-from routes.minio_client import get_minio_client, get_minio_bucket, get_minio_base_url
+from routes.minio_client import get_minio_bucket, build_image_url, get_pool_stats
+from routes.minio_uploads import (
+    upload_images, discard_uploads, image_metadata, release_images, remove_released_objects, UploadRejected
+)
+from routes.image_variants import schedule_variants
 from models.models_definitions import Product, db
 from routes.auth_utils import login_required, admin_only
 from flask_login import current_user
@@ -15,6 +17,11 @@ from logic.notification_flow import advance_notification
 from logic.validation_utils import validate_form
 from routes.minio_admin_tools import create_bucket_if_not_exists, delete_bucket
 from logic.decorators import log_exceptions
+from logic.catalog import card_query
+from logic.attributes import parse_attributes, set_product_attributes
+from logic.fragment_cache import fragment_cache
+from logic.http_cache import page_cache
+from logic.product_events import product_changed
 
 
 admin_bp = Blueprint('admin', __name__)
@@ -43,7 +50,7 @@ def admin_dashboard():
 @login_required
 @log_exceptions()
 def admin_products():
-    products = Product.query.all()
+    products = card_query().all()
     return render_template('admin/admin_products.html', products=products)
 
 
@@ -60,7 +67,8 @@ def admin_add_product():
             'name': {'type': 'string', 'minlength': 2, 'maxlength': 100, 'required': True},
             'price': {'type': 'float', 'min': 0, 'required': True, 'coerce': coerce_price},
             'description': {'type': 'string', 'required': False},
-            'specs': {'type': 'string', 'required': False}
+            'specs': {'type': 'string', 'required': False},
+            'attributes': {'type': 'string', 'required': False}
         }
 
         data = request.form.to_dict()
@@ -84,43 +92,43 @@ def admin_add_product():
                 merchant_id=current_user.id  # استخدام current_user هنا
             )
             product.generate_code(sequence)
+            set_product_attributes(product, parse_attributes(result.get('attributes')))
             db.session.add(product)
             db.session.flush()
 
-            files = request.files.getlist('images')
-            for index, file in enumerate(files):
-                if file and file.filename:
-                    filename = secure_filename(file.filename)
-                    folder = f"products/admin/{current_user.id}/product_{product.id}"
-                    unique_filename = f"{folder}/{uuid.uuid4().hex}_{filename}"
-
-                    image_data = file.read()
-                    file.stream.seek(0)
-
-                    minio_client = get_minio_client()
-                    MINIO_BUCKET = get_minio_bucket()
-                    MINIO_BASE_URL = get_minio_base_url()
-
-                    minio_client.put_object(
-                        MINIO_BUCKET,
-                        unique_filename,
-                        file.stream,
-                        length=len(image_data),
-                        part_size=10 * 1024 * 1024,
-                        content_type=file.content_type
-                    )
+            folder = f"products/admin/{current_user.id}/product_{product.id}"
+            stored_images = upload_images(
+                request.files.getlist('images'), folder, bucket=get_minio_bucket()
+            )
 
-                    image_url = MINIO_BASE_URL + unique_filename
+            try:
+                product_images = []
+                for index, stored in enumerate(stored_images):
                     product_image = ProductImage(
                         product_id=product.id,
-                        image_url=image_url,
-                        is_main=(index == 0)
+                        image_url=build_image_url(stored.bucket, stored.object_key),
+                        is_main=(index == 0),
+                        **image_metadata(stored)
                     )
                     db.session.add(product_image)
+                    product_images.append(product_image)
 
-            db.session.commit()
+                product.refresh_main_image()
+                db.session.commit()
+            except Exception:
+                discard_uploads(stored_images)
+                raise
+
+            schedule_variants([product_image.id for product_image in product_images])
             return redirect(url_for('admin.admin_dashboard'))
 
+        except UploadRejected as e:
+            db.session.rollback()
+            return render_template(
+                'admin/add_product.html', errors={'images': [str(e)]},
+                tinymce_api_key=os.getenv('TINYMCE_API_KEY')
+            ), 400
+
         except Exception:
             db.session.rollback()
             current_app.logger.exception("Error adding product")
@@ -146,7 +154,8 @@ def edit_product(product_id):
             'name': {'type': 'string', 'minlength': 2, 'maxlength': 100, 'required': True},
             'price': {'type': 'float', 'min': 0, 'required': True, 'coerce': coerce_price},
             'description': {'type': 'string', 'required': False},
-            'specs': {'type': 'string', 'required': False}
+            'specs': {'type': 'string', 'required': False},
+            'attributes': {'type': 'string', 'required': False}
         }
 
         data = request.form.to_dict()
@@ -161,8 +170,10 @@ def edit_product(product_id):
         product.price = result['price']
         product.description = result.get('description')
         product.specs = result.get('specs')
+        set_product_attributes(product, parse_attributes(result.get('attributes')))
 
         db.session.commit()
+        product_changed(product.id)
         flash("Product updated successfully", "success")
         return redirect(url_for('admin.admin_products'))
 
@@ -175,8 +186,15 @@ def edit_product(product_id):
 @log_exceptions()
 def delete_product(product_id):
     product = Product.query.get_or_404(product_id)
+    # The images go with the product, and the objects they own once that is
+    # committed. Shared blobs only lose a reference; the sweeper removes them.
+    released = release_images(product.images)
+    for image in product.images:
+        db.session.delete(image)
     db.session.delete(product)
     db.session.commit()
+    remove_released_objects(released)
+    product_changed(product_id)
     flash("Product deleted successfully", "success")
     return redirect(url_for('admin.admin_products'))
 
@@ -189,10 +207,19 @@ def approve_product(product_id):
     product = Product.query.get_or_404(product_id)
     product.is_approved = True
     db.session.commit()
+    product_changed(product.id)
     flash("Product approved successfully", "success")
     return redirect(url_for('admin.admin_products'))
 
 
+@admin_bp.route('/cache-stats')
+@admin_only
+@login_required
+@log_exceptions()
+def cache_stats():
+    return jsonify(fragments=fragment_cache.stats(), pages=page_cache.stats())
+
+
 @admin_bp.route('/system-links')
 @admin_only
 @login_required
@@ -209,6 +236,14 @@ def minio_logs():
     return render_template('admin/minio_logs.html')
 
 
+@admin_bp.route('/minio-pool-stats')
+@admin_only
+@login_required
+@log_exceptions()
+def minio_pool_stats():
+    return jsonify(pools=get_pool_stats())
+
+
 @admin_bp.route('/create-minio-bucket', methods=['POST'], endpoint='create_minio_bucket')
 @admin_only
 @login_required
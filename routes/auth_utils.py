@@ -27,3 +27,19 @@ def admin_only(f):
             return render_template("errors/403.html"), 403
         return f(*args, **kwargs)
     return decorated_function
+
+
+def current_identity():
+    """
+    Return the role and id of the logged-in user.
+
+    Login only goes through flask-login, so the session holds no "role" or
+    "user_id" keys; read them from current_user instead.
+
+    Returns:
+        tuple[str, int or None]: (role, user_id), or ('visitor', None) when
+        nobody is logged in.
+    """
+    if not current_user.is_authenticated:
+        return 'visitor', None
+    return current_user.role, current_user.id
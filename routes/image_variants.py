@@ -0,0 +1,196 @@
+import io
+import os
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from flask import current_app
+from models.models_definitions import db, ProductImage, ProductImageVariant
+from routes.minio_client import get_minio_client, parse_object_url
+from logic.image_processing import VARIANT_WIDTHS, render_variants, supported_formats
+from logic.product_events import product_changed
+
+# Per worker process: a process pool for the CPU-bound Pillow work and a
+# small thread pool that downloads originals, waits on it and stores results.
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def variant_key(object_key, width, image_format):
+    """Object key of a variant, derived from the original so regeneration overwrites it."""
+    return f"{object_key}.w{width}.{image_format}"
+
+
+def _get_pools():
+    key = os.getpid()
+    pools = _pools.get(key)
+    if pools is not None:
+        return pools
+
+    with _pools_lock:
+        pools = _pools.get(key)
+        if pools is None:
+            processes = int(current_app.config.get('IMAGE_VARIANT_PROCESSES', 2))
+            pools = (
+                # spawn: forking a multi-threaded worker can deadlock the child.
+                ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn')),
+                ThreadPoolExecutor(max_workers=processes, thread_name_prefix='image-variants')
+            )
+            _pools[key] = pools
+        return pools
+
+
+def _variant_formats():
+    requested = current_app.config.get('IMAGE_VARIANT_FORMATS', 'webp,avif').split(',')
+    return supported_formats(value.strip() for value in requested if value.strip())
+
+
+def _copy_from_shared_blob(image):
+    """
+    Reuse the variants of another image with the same content, if any.
+
+    Variant keys derive from the blob's object key, so images sharing a blob
+    share the variant objects too; only the rows and metadata are copied.
+
+    Returns:
+        bool: True if the image was filled in from a sibling.
+    """
+    if image.blob_id is None:
+        return False
+
+    sibling = ProductImage.query.filter(
+        ProductImage.blob_id == image.blob_id,
+        ProductImage.id != image.id,
+        ProductImage.blur_placeholder.isnot(None)
+    ).order_by(ProductImage.id).first()
+    if sibling is None or not sibling.variants:
+        return False
+
+    for column in ('width', 'height', 'byte_size', 'content_hash', 'dominant_color', 'blur_placeholder'):
+        setattr(image, column, getattr(sibling, column))
+
+    existing = {(variant.width, variant.format): variant for variant in image.variants}
+    for source in sibling.variants:
+        variant = existing.pop((source.width, source.format), None)
+        if variant is None:
+            variant = ProductImageVariant(image=image, width=source.width, format=source.format)
+            db.session.add(variant)
+        variant.height = source.height
+        variant.object_key = source.object_key
+        variant.url = variant_key(image.image_url, source.width, source.format)
+        variant.byte_size = source.byte_size
+    for stale in existing.values():
+        db.session.delete(stale)
+    return True
+
+
+def generate_variants(image_id):
+    """
+    Create or refresh the resized WebP/AVIF variants and metadata of a product image.
+
+    The original is downloaded from MinIO, resized and encoded in the process
+    pool, and each variant is stored next to it under a deterministic key.
+    Running it again overwrites the same objects and rows, so it is safe to
+    retry or to run from the backfill script. The same decode fills in the
+    image's dimensions, byte size, content hash, dominant colour and blur
+    placeholder. Refreshes the product's denormalized image columns afterwards.
+
+    Args:
+        image_id (int): ID of the ProductImage.
+
+    Returns:
+        list[ProductImageVariant]: Current variants of the image (empty if the
+        image is gone or not stored in MinIO).
+    """
+    image = db.session.get(ProductImage, image_id)
+    if image is None:
+        return []
+
+    if _copy_from_shared_blob(image):
+        image.product.refresh_main_image(touch=False)
+        db.session.commit()
+        product_changed(image.product_id)
+        return image.variants
+
+    location = parse_object_url(image.image_url)
+    if location is None:
+        current_app.logger.warning("Image %s is not stored in MinIO, skipping variants", image_id)
+        return []
+    bucket, object_key = location
+
+    client = get_minio_client()
+    response = client.get_object(bucket, object_key)
+    try:
+        original = response.read()
+    finally:
+        response.close()
+        response.release_conn()
+
+    process_pool, _ = _get_pools()
+    rendered = process_pool.submit(render_variants, original, VARIANT_WIDTHS, _variant_formats()).result()
+
+    # Metadata that needs the decoded image, plus anything the upload path
+    # could not capture (e.g. direct uploads to storage).
+    image.width = rendered['width']
+    image.height = rendered['height']
+    image.byte_size = len(original)
+    image.content_hash = image.content_hash or hashlib.sha256(original).hexdigest()
+    image.dominant_color = rendered['dominant_color']
+    image.blur_placeholder = rendered['blur_placeholder']
+
+    existing = {(variant.width, variant.format): variant for variant in image.variants}
+    for item in rendered['variants']:
+        key = variant_key(object_key, item['width'], item['format'])
+        client.put_object(
+            bucket, key, io.BytesIO(item['data']), length=len(item['data']),
+            content_type=f"image/{item['format']}"
+        )
+
+        variant = existing.pop((item['width'], item['format']), None)
+        if variant is None:
+            variant = ProductImageVariant(image=image, width=item['width'], format=item['format'])
+            db.session.add(variant)
+        variant.height = item['height']
+        variant.object_key = key
+        variant.url = variant_key(image.image_url, item['width'], item['format'])
+        variant.byte_size = len(item['data'])
+
+    # Sizes or formats that are no longer generated. Objects of a shared blob
+    # may still be used by its other images and are left to the sweeper.
+    for stale in existing.values():
+        if image.blob_id is None:
+            client.remove_object(bucket, stale.object_key)
+        db.session.delete(stale)
+
+    # Leaves updated_at (and the catalog order) alone; images_version and
+    # product_changed make cached pages pick up the srcset.
+    image.product.refresh_main_image(touch=False)
+    db.session.commit()
+    product_changed(image.product_id)
+
+    return image.variants
+
+
+def schedule_variants(image_ids):
+    """
+    Generate variants for the given images in the background.
+
+    Call after the images are committed. Failures are logged; the images keep
+    being served from their originals until the backfill script is run.
+
+    Args:
+        image_ids (Iterable[int]): IDs of new ProductImage rows.
+    """
+    app = current_app._get_current_object()
+    _, thread_pool = _get_pools()
+
+    def run(image_id):
+        with app.app_context():
+            try:
+                generate_variants(image_id)
+            except Exception:
+                db.session.rollback()
+                app.logger.exception("Failed to generate variants for image %s", image_id)
+
+    for image_id in image_ids:
+        thread_pool.submit(run, image_id)
@@ -0,0 +1,221 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from flask import Blueprint, Response, current_app, request, url_for
+from minio import Minio
+from minio.error import S3Error
+from routes.minio_client import get_minio_client, parse_object_url, product_buckets
+
+media_bp = Blueprint('media', __name__)
+
+# Bytes read from MinIO per write to the client while streaming an object.
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Object keys never change content (content hashes, unique upload keys), so
+# browsers and the CDN may keep them for a year without revalidating.
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Response headers of MinIO passed through to the client.
+PASSTHROUGH_HEADERS = ('Content-Type', 'Content-Length', 'Content-Range', 'ETag', 'Last-Modified')
+
+# Presigned GET URLs per worker process: {(bucket, key): (url, valid_until)}.
+_presigned = OrderedDict()
+_presigned_lock = threading.Lock()
+PRESIGNED_CACHE_SIZE = 10000
+
+_signing_clients = {}
+
+
+def _no_content(status):
+    response = Response(status=status)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+@media_bp.route('/media/<bucket>/<path:object_key>')
+def serve_object(bucket, object_key):
+    """
+    Stream a product image from MinIO with immutable caching headers.
+
+    Range requests are forwarded to MinIO and answered with 206, the ETag
+    and Last-Modified of the object are passed through, and If-None-Match
+    is answered with 304 from a HEAD request. The body is streamed in
+    STREAM_CHUNK_SIZE pieces and never buffered as a whole.
+
+    Only answers when IMAGE_DELIVERY is "proxy": in "presigned" mode the
+    buckets are private and the proxy would make every object public.
+    """
+    if current_app.config.get('IMAGE_DELIVERY', 'direct') != 'proxy':
+        return _no_content(404)
+    if bucket not in product_buckets() or not object_key.startswith('products/') or '..' in object_key:
+        return _no_content(404)
+
+    client = get_minio_client()
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        try:
+            stat = client.stat_object(bucket, object_key)
+        except S3Error as e:
+            if e.code in ('NoSuchKey', 'NoSuchObject', 'NoSuchBucket'):
+                return _no_content(404)
+            raise
+        if f'"{stat.etag}"' in if_none_match or stat.etag in if_none_match or if_none_match.strip() == '*':
+            response = Response(status=304)
+            response.headers['ETag'] = f'"{stat.etag}"'
+            response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+            return response
+
+    request_headers = {}
+    if request.headers.get('Range'):
+        request_headers['Range'] = request.headers['Range']
+    try:
+        upstream = client.get_object(bucket, object_key, request_headers=request_headers)
+    except S3Error as e:
+        if e.code in ('NoSuchKey', 'NoSuchObject', 'NoSuchBucket'):
+            return _no_content(404)
+        if e.code == 'InvalidRange':
+            return _no_content(416)
+        raise
+
+    def generate():
+        try:
+            for chunk in upstream.stream(STREAM_CHUNK_SIZE):
+                yield chunk
+        finally:
+            upstream.close()
+            upstream.release_conn()
+
+    response = Response(generate(), status=upstream.status, direct_passthrough=True)
+    for name in PASSTHROUGH_HEADERS:
+        if upstream.headers.get(name):
+            response.headers[name] = upstream.headers[name]
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+
+def _get_signing_client():
+    """
+    Client used to presign URLs for browsers.
+
+    Signatures cover the host, so when MinIO is reached internally under
+    another name, MINIO_PUBLIC_ENDPOINT names the host browsers use. Signing
+    is local; MINIO_REGION avoids the region lookup request.
+    """
+    endpoint = current_app.config.get('MINIO_PUBLIC_ENDPOINT')
+    if not endpoint:
+        return get_minio_client()
+
+    key = (os.getpid(), endpoint)
+    client = _signing_clients.get(key)
+    if client is None:
+        client = Minio(
+            endpoint,
+            access_key=current_app.config['MINIO_ACCESS_KEY'],
+            secret_key=current_app.config['MINIO_SECRET_KEY'],
+            secure=current_app.config.get('MINIO_PUBLIC_SECURE', 'true').lower() == 'true',
+            region=current_app.config.get('MINIO_REGION', 'us-east-1')
+        )
+        _signing_clients[key] = client
+    return client
+
+
+def url_window():
+    """Length in seconds of one signing window (IMAGE_URL_EXPIRY, default one hour)."""
+    return int(current_app.config.get('IMAGE_URL_EXPIRY', 3600))
+
+
+def url_epoch():
+    """
+    Index of the current signing window, 0 unless URLs are presigned.
+
+    Cached HTML that embeds image URLs includes it in its key, so pages are
+    re-rendered with fresh signatures before the old ones expire.
+    """
+    if current_app.config.get('IMAGE_DELIVERY', 'direct') != 'presigned':
+        return 0
+    return int(time.time()) // url_window()
+
+
+def presigned_image_url(bucket, object_key):
+    """
+    Return a presigned GET URL for an object, signed once per window.
+
+    The signature date is the start of the current window and the URL is
+    valid for two windows, so every worker produces the same URL during a
+    window (and browsers and CDNs can cache it) and it stays valid for at
+    least one window after it was handed out.
+
+    Args:
+        bucket (str): Bucket of the object.
+        object_key (str): Key of the object.
+
+    Returns:
+        str: Presigned URL.
+    """
+    window = url_window()
+    epoch = int(time.time()) // window
+    key = (bucket, object_key)
+
+    with _presigned_lock:
+        cached = _presigned.get(key)
+        if cached is not None and cached[1] == epoch:
+            _presigned.move_to_end(key)
+            return cached[0]
+
+    url = _get_signing_client().presigned_get_object(
+        bucket, object_key,
+        expires=timedelta(seconds=2 * window),
+        request_date=datetime.fromtimestamp(epoch * window, tz=timezone.utc)
+    )
+
+    with _presigned_lock:
+        _presigned[key] = (url, epoch)
+        _presigned.move_to_end(key)
+        while len(_presigned) > PRESIGNED_CACHE_SIZE:
+            _presigned.popitem(last=False)
+    return url
+
+
+@media_bp.app_template_filter('image_src')
+def image_src(url):
+    """
+    Turn a stored image URL into the URL pages should link to.
+
+    IMAGE_DELIVERY selects how images are served: "direct" (default) links
+    the stored MinIO URL, "proxy" goes through serve_object, and
+    "presigned" links presigned GET URLs for private buckets. URLs outside
+    MinIO (static files, legacy hosts) are returned unchanged.
+
+    Args:
+        url (str): Stored image URL, or None.
+
+    Returns:
+        str: Delivery URL, or the input if it is empty or not in MinIO.
+    """
+    mode = current_app.config.get('IMAGE_DELIVERY', 'direct')
+    if not url or mode == 'direct':
+        return url
+
+    location = parse_object_url(url)
+    if location is None:
+        return url
+    bucket, object_key = location
+    if mode == 'proxy':
+        return url_for('media.serve_object', bucket=bucket, object_key=object_key)
+    return presigned_image_url(bucket, object_key)
+
+
+@media_bp.app_template_filter('image_srcset')
+def image_srcset(srcset):
+    """Apply image_src to every URL of an HTML srcset ("url 320w, url 640w")."""
+    if not srcset or current_app.config.get('IMAGE_DELIVERY', 'direct') == 'direct':
+        return srcset
+
+    candidates = []
+    for candidate in srcset.split(', '):
+        url, _, descriptor = candidate.partition(' ')
+        candidates.append(f"{image_src(url)} {descriptor}".strip())
+    return ', '.join(candidates)
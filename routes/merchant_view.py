@@ -1,11 +1,9 @@
 import os
-import uuid
 from functools import wraps
 from flask import (
     Blueprint, render_template, request, redirect,
     url_for, abort, current_app, flash
 )
-from werkzeug.utils import secure_filename
 
 from models.models_definitions import Product, db, User
 from flask_login import login_required, current_user
@@ -15,8 +13,15 @@ from logic.validation_utils import (
     validate_email, validate_password, sanitize_text,
     validate_price, validate_form, coerce_price, sanitize_rich_text
 )
-from routes.minio_client import get_minio_client, get_minio_bucket, get_minio_base_url
+from routes.minio_client import get_minio_bucket, build_image_url
+from routes.minio_uploads import (
+    upload_images, discard_uploads, image_metadata, release_images, remove_released_objects, UploadRejected
+)
+from routes.image_variants import schedule_variants
 from logic.decorators import log_exceptions
+from logic.catalog import card_query
+from logic.attributes import parse_attributes, set_product_attributes
+from logic.product_events import product_changed
 
 
 merchant_bp = Blueprint('merchant', __name__, url_prefix='/merchant')
@@ -61,7 +66,8 @@ def add_product():
             'name': {'type': 'string', 'minlength': 2, 'maxlength': 100, 'required': True},
             'price': {'type': 'float', 'min': 0, 'required': True, 'coerce': coerce_price},
             'description': {'type': 'string', 'required': False},
-            'specs': {'type': 'string', 'required': False}
+            'specs': {'type': 'string', 'required': False},
+            'attributes': {'type': 'string', 'required': False}
         }
 
         is_valid, result = validate_form(data, schema, sanitize_fields=['name'])
@@ -82,44 +88,47 @@ def add_product():
 
         sequence = Product.query.filter_by(merchant_id=current_user.id).count() + 1
         product.generate_code(sequence)
+        set_product_attributes(product, parse_attributes(result.get('attributes')))
 
         from models.models_definitions import ProductImage
 
         db.session.add(product)
         db.session.flush()
 
-        files = request.files.getlist('images')
-        for index, file in enumerate(files):
-            if file and file.filename:
-                filename = secure_filename(file.filename)
-                folder = f"products/merchant/{current_user.id}/product_{product.id}"
-                unique_filename = f"{folder}/{uuid.uuid4().hex}_{filename}"
-
-                image_data = file.read()
-                file.stream.seek(0)
-
-                minio_client = get_minio_client()
-                MINIO_BUCKET = get_minio_bucket()
-                MINIO_BASE_URL = get_minio_base_url()
-
-                minio_client.put_object(
-                    MINIO_BUCKET,
-                    unique_filename,
-                    file.stream,
-                    length=len(image_data),
-                    part_size=10 * 1024 * 1024,
-                    content_type=file.content_type
-                )
-
-                image_url = MINIO_BASE_URL + unique_filename
+        folder = f"products/merchant/{current_user.id}/product_{product.id}"
+        try:
+            stored_images = upload_images(
+                request.files.getlist('images'), folder, bucket=get_minio_bucket()
+            )
+        except UploadRejected as e:
+            db.session.rollback()
+            return render_template(
+                'merchant/add_product.html', errors={'images': [str(e)]}
+            ), 400
+        except Exception:
+            db.session.rollback()
+            raise
+
+        try:
+            images = []
+            for index, stored in enumerate(stored_images):
                 img = ProductImage(
                     product_id=product.id,
-                    image_url=image_url,
-                    is_main=(index == 0)
+                    image_url=build_image_url(stored.bucket, stored.object_key),
+                    is_main=(index == 0),
+                    **image_metadata(stored)
                 )
                 db.session.add(img)
+                images.append(img)
 
-        db.session.commit()
+            product.refresh_main_image()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            discard_uploads(stored_images)
+            raise
+
+        schedule_variants([img.id for img in images])
 
         advance_notification(
             product_id=product.id,
@@ -141,7 +150,7 @@ def add_product():
 @merchant_required
 @log_exceptions()
 def my_products():
-    products = Product.query.filter_by(merchant_id=current_user.id).all()
+    products = card_query().filter_by(merchant_id=current_user.id).all()
     return render_template('merchant/my_products.html', products=products)
 
 
@@ -169,7 +178,8 @@ def edit_product(product_id):
             'name': {'type': 'string', 'minlength': 2, 'maxlength': 100, 'required': True},
             'price': {'type': 'float', 'min': 0, 'required': True, 'coerce': coerce_price},
             'description': {'type': 'string', 'required': False},
-            'specs': {'type': 'string', 'required': False}
+            'specs': {'type': 'string', 'required': False},
+            'attributes': {'type': 'string', 'required': False}
         }
 
         data = request.form.to_dict()
@@ -182,8 +192,10 @@ def edit_product(product_id):
         product.price = result['price']
         product.description = sanitize_rich_text(result.get('description'))
         product.specs = sanitize_rich_text(result.get('specs'))
+        set_product_attributes(product, parse_attributes(result.get('attributes')))
 
         db.session.commit()
+        product_changed(product.id)
         flash("✅ Product updated successfully", "success")
         return redirect(url_for('merchant.my_products'))
 
@@ -200,8 +212,15 @@ def delete_product(product_id):
     if product.merchant_id != current_user.id:
         abort(403)
 
+    # The images go with the product, and the objects they own once that is
+    # committed. Shared blobs only lose a reference; the sweeper removes them.
+    released = release_images(product.images)
+    for image in product.images:
+        db.session.delete(image)
     db.session.delete(product)
     db.session.commit()
+    remove_released_objects(released)
+    product_changed(product_id)
     flash("🗑️ Product deleted successfully", "success")
     return redirect(url_for('merchant.my_products'))
 
@@ -1,5 +1,6 @@
 from minio.error import S3Error
-from routes.minio_client import get_minio_client, get_minio_bucket
+from routes.minio_client import get_minio_client, get_minio_bucket, forget_bucket
+from routes.minio_uploads import remove_objects
 from models.models_definitions import db, AdminLog
 
 def log_admin_action(action, status="success", details=None):
@@ -10,6 +11,7 @@ def log_admin_action(action, status="success", details=None):
 def create_bucket_if_not_exists():
     client = get_minio_client()
     bucket_name = get_minio_bucket()
+    forget_bucket(bucket_name)
 
     try:
         if not client.bucket_exists(bucket_name):
@@ -26,13 +28,14 @@ def delete_bucket(force=False):
     bucket_name = get_minio_bucket()
 
     try:
-        deleted_files = []
+        deleted_files = 0
         if force:
-            for obj in client.list_objects(bucket_name, recursive=True):
-                client.remove_object(bucket_name, obj.object_name)
-                deleted_files.append(obj.object_name)
+            object_keys = [obj.object_name for obj in client.list_objects(bucket_name, recursive=True)]
+            errors = remove_objects(bucket_name, object_keys, client)
+            deleted_files = len(object_keys) - len(errors)
 
         client.remove_bucket(bucket_name)
-        log_admin_action("Delete Bucket", "success", f"Bucket '{bucket_name}' deleted. Files: {len(deleted_files)}")
+        forget_bucket(bucket_name)
+        log_admin_action("Delete Bucket", "success", f"Bucket '{bucket_name}' deleted. Files: {deleted_files}")
     except S3Error as err:
         log_admin_action("Delete Bucket", "error", str(err))
\ No newline at end of file
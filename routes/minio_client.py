@@ -1,24 +1,130 @@
+import os
+import time
+import threading
+import certifi
+import urllib3
 from flask import current_app, session
 from minio import Minio
+from minio.error import S3Error
+
+# One client (and urllib3 connection pool) per worker process and endpoint.
+# Keys include the PID so a client created before a fork is never shared
+# with the child: the first call after the fork builds a fresh pool.
+_clients = {}
+# The PoolManager each client was built with, under the same key, for get_pool_stats.
+_http_clients = {}
+_clients_lock = threading.Lock()
+
+# Buckets known to exist, per worker process: {pid: {bucket: checked_at}}.
+# Entries expire after MINIO_BUCKET_CACHE_TTL seconds so that a bucket
+# deleted from another worker is noticed and created again.
+_known_buckets = {}
+
+
+def _config_int(name, default):
+    return int(current_app.config.get(name, default))
+
+
+def _config_float(name, default):
+    return float(current_app.config.get(name, default))
+
+
+def _build_http_client():
+    """
+    Build the urllib3 pool shared by all MinIO calls of this worker.
+
+    Pool size, timeouts and retries come from MINIO_* settings:
+    MINIO_POOL_MAXSIZE, MINIO_POOL_BLOCK, MINIO_CONNECT_TIMEOUT,
+    MINIO_READ_TIMEOUT, MINIO_MAX_RETRIES and MINIO_RETRY_BACKOFF.
+    Connections are HTTP/1.1 keep-alive and reused across requests.
+
+    Returns:
+        urllib3.PoolManager: Configured connection pool.
+    """
+    return urllib3.PoolManager(
+        maxsize=_config_int("MINIO_POOL_MAXSIZE", 10),
+        block=str(current_app.config.get("MINIO_POOL_BLOCK", "false")).lower() == "true",
+        timeout=urllib3.Timeout(
+            connect=_config_float("MINIO_CONNECT_TIMEOUT", 5),
+            read=_config_float("MINIO_READ_TIMEOUT", 60)
+        ),
+        retries=urllib3.Retry(
+            total=_config_int("MINIO_MAX_RETRIES", 3),
+            backoff_factor=_config_float("MINIO_RETRY_BACKOFF", 0.2),
+            status_forcelist=[500, 502, 503, 504]
+        ),
+        cert_reqs='CERT_REQUIRED',
+        ca_certs=os.environ.get('SSL_CERT_FILE') or certifi.where()
+    )
 
 
 def get_minio_client():
     """
-    Initialize and return a MinIO client using app configuration.
+    Return this worker's pooled MinIO client, creating it on first use.
+
+    The client is thread-safe and shared by all threads of the worker, so
+    callers must not close it.
 
     Returns:
         Minio: Configured MinIO client instance.
     """
+    endpoint = current_app.config["MINIO_ENDPOINT"]
+    access_key = current_app.config["MINIO_ACCESS_KEY"]
+    secure = current_app.config.get("MINIO_SECURE", "false").lower() == "true"
+    key = (os.getpid(), endpoint, access_key, secure)
 
-    print("🔍 SECURE =", current_app.config.get("MINIO_SECURE"))
+    client = _clients.get(key)
+    if client is not None:
+        return client
 
-    return Minio(
-        current_app.config["MINIO_ENDPOINT"],
-        access_key=current_app.config["MINIO_ACCESS_KEY"],
-        secret_key=current_app.config["MINIO_SECRET_KEY"],
-        secure=current_app.config.get("MINIO_SECURE", "false").lower() == "true"
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            http_client = _build_http_client()
+            client = Minio(
+                endpoint,
+                access_key=access_key,
+                secret_key=current_app.config["MINIO_SECRET_KEY"],
+                secure=secure,
+                http_client=http_client
+            )
+            _clients[key] = client
+            _http_clients[key] = http_client
+            current_app.logger.info("Created MinIO client for %s (pid %s)", endpoint, os.getpid())
+        return client
 
-    )
+
+def get_pool_stats():
+    """
+    Return connection pool statistics of this worker's MinIO clients.
+
+    Returns:
+        list[dict]: One entry per host pool with its size, idle connections,
+        connections opened and requests sent.
+    """
+    stats = []
+    with _clients_lock:
+        managers = [(key, manager) for key, manager in _http_clients.items() if key[0] == os.getpid()]
+
+    for (pid, endpoint, _, secure), manager in managers:
+        pools = manager.pools
+        for pool_key in list(pools.keys()):
+            pool = pools.get(pool_key)
+            if pool is None:
+                continue
+            # The pool queue is pre-filled with None placeholders up to maxsize.
+            idle = [conn for conn in list(pool.pool.queue) if conn is not None] if pool.pool else []
+            stats.append({
+                'pid': pid,
+                'endpoint': endpoint,
+                'secure': secure,
+                'host': pool.host,
+                'maxsize': pool.pool.maxsize if pool.pool else 0,
+                'idle_connections': len(idle),
+                'connections_opened': pool.num_connections,
+                'requests': pool.num_requests,
+            })
+    return stats
 
 
 def get_minio_bucket(role=None):
@@ -42,6 +148,70 @@ def get_minio_bucket(role=None):
         return current_app.config.get("MINIO_BUCKET", "client-product")
 
 
+def product_buckets():
+    """
+    Return the names of the admin, merchant and client product buckets.
+
+    Returns:
+        list[str]: Distinct bucket names, sorted.
+    """
+    return sorted({get_minio_bucket(role) for role in ('admin', 'merchant', 'default')})
+
+
+def ensure_bucket(bucket, client=None):
+    """
+    Make sure a bucket exists, creating it if needed.
+
+    MinIO is only asked once per worker process and MINIO_BUCKET_CACHE_TTL
+    seconds (default 300); until then the bucket is assumed to exist, so
+    uploads do not pay an extra round trip.
+
+    Args:
+        bucket (str): Bucket name.
+        client (Minio, optional): MinIO client. Defaults to the worker's pooled client.
+    """
+    known = _known_buckets.setdefault(os.getpid(), {})
+    checked_at = known.get(bucket)
+    if checked_at is not None and time.monotonic() - checked_at < _config_float("MINIO_BUCKET_CACHE_TTL", 300):
+        return
+
+    client = client or get_minio_client()
+    if not client.bucket_exists(bucket):
+        try:
+            client.make_bucket(bucket)
+            current_app.logger.info("Created MinIO bucket %s", bucket)
+        except S3Error as e:
+            # Another worker created it in the meantime.
+            if e.code not in ('BucketAlreadyOwnedByYou', 'BucketAlreadyExists'):
+                raise
+    known[bucket] = time.monotonic()
+
+
+def ensure_product_buckets(client=None):
+    """
+    Check (and create) every product bucket; run once when a worker starts.
+
+    Args:
+        client (Minio, optional): MinIO client. Defaults to the worker's pooled client.
+    """
+    for bucket in product_buckets():
+        ensure_bucket(bucket, client)
+
+
+def forget_bucket(bucket=None):
+    """
+    Drop a bucket (or all buckets) from this worker's existence cache.
+
+    Args:
+        bucket (str, optional): Bucket name. Defaults to every bucket.
+    """
+    known = _known_buckets.get(os.getpid(), {})
+    if bucket is None:
+        known.clear()
+    else:
+        known.pop(bucket, None)
+
+
 def get_minio_base_url():
     """
     Retrieve the base URL for MinIO from the app configuration.
@@ -50,3 +220,49 @@ def get_minio_base_url():
         str: Base URL for MinIO.
     """
     return current_app.config["MINIO_BASE_URL"]
+
+
+def build_image_url(bucket, object_key):
+    """
+    Build the URL stored on ProductImage for an object: base/bucket/key.
+
+    This is the storage location, not necessarily what pages link to; the
+    image_src template filter turns it into the delivery URL.
+
+    Args:
+        bucket (str): Bucket of the object.
+        object_key (str): Key of the object.
+
+    Returns:
+        str: Image URL.
+    """
+    return f"{get_minio_base_url().rstrip('/')}/{bucket}/{object_key}"
+
+
+def parse_object_url(url):
+    """
+    Split a stored image URL into its MinIO bucket and object key.
+
+    Handles both URL shapes found in product_images: base/bucket/key (image
+    manager uploads) and base/key (add-product forms), where the bucket is
+    implied by the role segment of "products/<role>/...".
+
+    Args:
+        url (str): Image URL as stored on ProductImage.
+
+    Returns:
+        tuple or None: (bucket, object_key), or None for URLs outside MinIO.
+    """
+    base = get_minio_base_url().rstrip('/') + '/'
+    if not url or not url.startswith(base):
+        return None
+
+    path = url[len(base):]
+    buckets = set(product_buckets())
+    bucket, _, object_key = path.partition('/')
+    if bucket in buckets and object_key:
+        return bucket, object_key
+
+    parts = path.split('/')
+    role = parts[1] if len(parts) > 2 and parts[0] == 'products' else 'default'
+    return get_minio_bucket(role), path
@@ -0,0 +1,917 @@
+import os
+import uuid
+import hashlib
+import threading
+from collections import Counter, defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from flask import current_app
+from minio.datatypes import Part, PostPolicy
+from minio.deleteobjects import DeleteObject
+from minio.error import S3Error
+from sqlalchemy.exc import IntegrityError
+from models.models_definitions import db, ImageBlob, ResumableUpload
+from werkzeug.utils import secure_filename
+from routes.minio_client import (
+    get_minio_client, get_minio_bucket, get_minio_base_url, parse_object_url, ensure_bucket
+)
+from logic.image_processing import read_dimensions
+
+# S3 multipart parts must be at least 5 MiB and minio-py buffers exactly one
+# part at a time, so this bounds the memory an upload needs in the worker.
+UPLOAD_PART_SIZE = 5 * 1024 * 1024
+
+# Enough leading bytes to recognise every accepted image format.
+SNIFF_BYTES = 16
+
+# Read size when hashing a spooled upload before storing it.
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# The S3 multi-object delete API accepts at most 1000 keys per request.
+REMOVE_BATCH_SIZE = 1000
+
+IMAGE_EXTENSIONS = {'image/png': '.png', 'image/jpeg': '.jpg', 'image/webp': '.webp'}
+IMAGE_CONTENT_TYPES = tuple(IMAGE_EXTENSIONS)
+
+UploadInfo = namedtuple(
+    'UploadInfo',
+    ['filename', 'content_type', 'header', 'length', 'width', 'height', 'content_hash']
+)
+
+# blob_id is set once the object is recorded in image_blobs; reused marks
+# content that was already stored before this upload.
+StoredObject = namedtuple(
+    'StoredObject',
+    ['bucket', 'object_key', 'size', 'content_type', 'width', 'height', 'content_hash', 'blob_id', 'reused']
+)
+
+# One bounded upload pool per worker process (same fork rule as the MinIO clients).
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+class UploadRejected(ValueError):
+    """Raised when an uploaded file is not an accepted image or is too large."""
+
+
+def sniff_image_type(header):
+    """
+    Detect the image type from the first bytes of a file.
+
+    Args:
+        header (bytes): Leading bytes of the file.
+
+    Returns:
+        str or None: MIME type for PNG, JPEG or WebP, otherwise None.
+    """
+    if header.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if header.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+def stream_length(stream):
+    """
+    Return the number of bytes left in a stream without reading it.
+
+    Werkzeug spools uploads into a BytesIO or a temporary file, both of which
+    are seekable, so the length is known without buffering the data again.
+
+    Args:
+        stream: File-like object positioned at the data to measure.
+
+    Returns:
+        int or None: Remaining bytes, or None if the stream cannot seek.
+    """
+    try:
+        position = stream.tell()
+        stream.seek(0, os.SEEK_END)
+        end = stream.tell()
+        stream.seek(position)
+    except (AttributeError, OSError, ValueError):
+        return None
+    return end - position
+
+
+class _LimitedStream:
+    """Replay the sniffed header, then the rest of the stream, up to a byte limit.
+
+    Hashes the data as it passes through, so the content hash costs no extra read.
+    """
+
+    def __init__(self, stream, header, limit):
+        self._stream = stream
+        self._header = header
+        self._limit = limit
+        self._sha256 = hashlib.sha256()
+        self.bytes_read = 0
+
+    @property
+    def content_hash(self):
+        return self._sha256.hexdigest()
+
+    def read(self, size=-1):
+        if self._header:
+            if size is None or size < 0:
+                chunk, self._header = self._header + self._stream.read(), b''
+            else:
+                chunk, self._header = self._header[:size], self._header[size:]
+        else:
+            chunk = self._stream.read(size)
+
+        self.bytes_read += len(chunk)
+        if self.bytes_read > self._limit:
+            raise UploadRejected(f"Image exceeds the {self._limit} byte limit.")
+        self._sha256.update(chunk)
+        return chunk
+
+
+def _hash_stream(stream):
+    sha256 = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(HASH_CHUNK_SIZE), b''):
+        sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def inspect_upload(file_storage, limit):
+    """
+    Validate an uploaded image and read what is known before storing it.
+
+    The type is checked from the magic bytes of the first chunk rather than
+    the client supplied filename or Content-Type, and the size limit is
+    enforced up front when the length is known. For seekable streams (werkzeug
+    spools every upload into a BytesIO or a temporary file) the width and
+    height are read from the image header and the SHA-256 is computed in
+    HASH_CHUNK_SIZE chunks, so a duplicate can be detected before uploading.
+    The stream is left positioned just after the sniffed header.
+
+    Args:
+        file_storage (FileStorage): Uploaded file from request.files.
+        limit (int): Size limit in bytes.
+
+    Returns:
+        UploadInfo: Validation results; length, width, height and content_hash
+        are None/-1 when the stream cannot seek.
+
+    Raises:
+        UploadRejected: If the file is not a PNG, JPEG or WebP image, has an
+        unreadable header or is too large.
+    """
+    filename = secure_filename(file_storage.filename or '') or 'image'
+    stream = file_storage.stream
+
+    header = stream.read(SNIFF_BYTES)
+    content_type = sniff_image_type(header)
+    if content_type is None:
+        raise UploadRejected(f"{filename} is not a PNG, JPEG or WebP image.")
+
+    remaining = stream_length(stream)
+    length = len(header) + remaining if remaining is not None else -1
+    if length > limit:
+        raise UploadRejected(f"{filename} exceeds the {limit} byte limit.")
+
+    width = height = content_hash = None
+    if remaining is not None:
+        body_start = stream.tell()
+        start = body_start - len(header)
+        stream.seek(start)
+        try:
+            width, height = read_dimensions(stream)
+        except ValueError:
+            raise UploadRejected(f"{filename} is not a valid image.")
+        stream.seek(start)
+        content_hash = _hash_stream(stream)
+        stream.seek(body_start)
+
+    return UploadInfo(filename, content_type, header, length, width, height, content_hash)
+
+
+def content_key(folder, content_hash, content_type):
+    """
+    Content-addressed object key for an image.
+
+    Keys stay under "products/<role>/" so both stored URL shapes keep
+    resolving to the role's bucket (see parse_object_url).
+
+    Args:
+        folder (str): Upload folder, e.g. "products/admin/1/product_7".
+        content_hash (str): SHA-256 hex digest of the content.
+        content_type (str): Detected MIME type.
+
+    Returns:
+        str: e.g. "products/admin/blobs/ab/ab12...ef.jpg".
+    """
+    root = '/'.join(folder.split('/')[:2])
+    return f"{root}/blobs/{content_hash[:2]}/{content_hash}{IMAGE_EXTENSIONS[content_type]}"
+
+
+def put_upload(file_storage, info, bucket, object_key, client, limit):
+    """
+    Stream an inspected upload to MinIO under the given key.
+
+    The file is never read into memory as a whole, and the size limit is
+    enforced while streaming when the length was unknown. The SHA-256 is
+    computed on the way through, for streams that could not be hashed up front.
+
+    Args:
+        file_storage (FileStorage): Uploaded file, as left by inspect_upload.
+        info (UploadInfo): Result of inspect_upload.
+        bucket (str): Target bucket.
+        object_key (str): Target key.
+        client (Minio): MinIO client.
+        limit (int): Size limit in bytes.
+
+    Returns:
+        StoredObject: The stored object (blob_id None, reused False).
+    """
+    body = _LimitedStream(file_storage.stream, info.header, limit)
+    client.put_object(
+        bucket,
+        object_key,
+        body,
+        length=info.length,
+        part_size=UPLOAD_PART_SIZE,
+        content_type=info.content_type
+    )
+    return StoredObject(
+        bucket, object_key, body.bytes_read, info.content_type,
+        info.width, info.height, body.content_hash, None, False
+    )
+
+
+def stream_upload(file_storage, folder, bucket=None, client=None, limit=None):
+    """
+    Validate an uploaded image and stream it to MinIO, without touching the database.
+
+    Hashable uploads go to their content-addressed key; others get a unique
+    key in the folder.
+
+    Args:
+        file_storage (FileStorage): Uploaded file from request.files.
+        folder (str): Object key prefix, e.g. "products/admin/1/product_7".
+        bucket (str, optional): Target bucket. Defaults to the session role's bucket.
+        client (Minio, optional): MinIO client. Defaults to the worker's pooled client.
+        limit (int, optional): Size limit in bytes. Defaults to MAX_IMAGE_UPLOAD_BYTES.
+
+    Returns:
+        StoredObject: Bucket, object key, size, detected content type,
+        dimensions and content hash.
+
+    Raises:
+        UploadRejected: If the file is not an accepted image or is too large.
+    """
+    if limit is None:
+        limit = current_app.config['MAX_IMAGE_UPLOAD_BYTES']
+    bucket = bucket or get_minio_bucket()
+    client = client or get_minio_client()
+    ensure_bucket(bucket, client)
+
+    info = inspect_upload(file_storage, limit)
+    if info.content_hash:
+        object_key = content_key(folder, info.content_hash, info.content_type)
+    else:
+        object_key = f"{folder}/{uuid.uuid4().hex}_{info.filename}"
+    return put_upload(file_storage, info, bucket, object_key, client, limit)
+
+
+def image_metadata(stored):
+    """
+    ProductImage column values known once an upload is stored.
+
+    Args:
+        stored (StoredObject): Result of upload_images or verify_uploaded_image.
+
+    Returns:
+        dict: width, height, byte_size, content_hash and blob_id keyword arguments.
+    """
+    return {
+        'width': stored.width,
+        'height': stored.height,
+        'byte_size': stored.size,
+        'content_hash': stored.content_hash,
+        'blob_id': stored.blob_id,
+    }
+
+
+def _get_upload_executor():
+    key = os.getpid()
+    executor = _executors.get(key)
+    if executor is not None:
+        return executor
+
+    with _executors_lock:
+        executor = _executors.get(key)
+        if executor is None:
+            executor = ThreadPoolExecutor(
+                max_workers=int(current_app.config.get('MINIO_UPLOAD_WORKERS', 4)),
+                thread_name_prefix='minio-upload'
+            )
+            _executors[key] = executor
+        return executor
+
+
+def remove_objects(bucket, object_keys, client=None):
+    """
+    Remove objects with the multi-object delete API, REMOVE_BATCH_SIZE keys per request.
+
+    Args:
+        bucket (str): Bucket of the objects.
+        object_keys (Iterable[str]): Keys to remove; may be a generator.
+        client (Minio, optional): MinIO client. Defaults to the worker's pooled client.
+
+    Returns:
+        list[DeleteError]: Objects the server could not remove.
+    """
+    client = client or get_minio_client()
+    errors = []
+    batch = []
+    for object_key in object_keys:
+        batch.append(DeleteObject(object_key))
+        if len(batch) == REMOVE_BATCH_SIZE:
+            # remove_objects is lazy: the request is only sent while iterating.
+            errors.extend(client.remove_objects(bucket, batch))
+            batch = []
+    if batch:
+        errors.extend(client.remove_objects(bucket, batch))
+    return errors
+
+
+def remove_objects_quietly(bucket, object_keys, client=None):
+    """
+    Remove objects, logging failures instead of raising them.
+
+    Args:
+        bucket (str): Bucket of the objects.
+        object_keys (Iterable[str]): Keys to remove.
+        client (Minio, optional): MinIO client. Defaults to the worker's pooled client.
+    """
+    try:
+        errors = remove_objects(bucket, object_keys, client)
+    except Exception:
+        current_app.logger.exception("Failed to remove objects from %s", bucket)
+        return
+    for error in errors:
+        current_app.logger.error("Failed to remove object %s/%s: %s", bucket, error.name, error.message)
+
+
+def discard_uploads(stored_objects, client=None):
+    """
+    Remove objects uploaded by a request that did not complete.
+
+    Only objects under a unique key are removed. Content-addressed keys are
+    left to the orphan sweeper even when this request stored them, since a
+    concurrent request may have stored and registered the same content
+    meanwhile. Failures are logged rather than raised so that cleanup never
+    hides the error that caused it.
+
+    Args:
+        stored_objects (list[StoredObject]): Objects to remove.
+        client (Minio, optional): MinIO client. Defaults to the worker's pooled client.
+    """
+    created = defaultdict(set)
+    for stored in stored_objects:
+        if not stored.reused and stored.content_hash is None:
+            created[stored.bucket].add(stored.object_key)
+    for bucket, object_keys in created.items():
+        remove_objects_quietly(bucket, object_keys, client)
+
+
+def _add_blob_references(bucket, content_hash, count):
+    """Add references to an existing blob, reviving a released one; returns it, or None if there is none."""
+    updated = ImageBlob.query.filter_by(bucket=bucket, content_hash=content_hash).update(
+        {ImageBlob.ref_count: ImageBlob.ref_count + count, ImageBlob.released_at: None},
+        synchronize_session=False
+    )
+    if not updated:
+        return None
+    return ImageBlob.query.filter_by(bucket=bucket, content_hash=content_hash).populate_existing().one()
+
+
+def _register_blob(stored, count):
+    """Record a newly stored object as a blob with count references."""
+    try:
+        with db.session.begin_nested():
+            blob = ImageBlob(
+                bucket=stored.bucket,
+                object_key=stored.object_key,
+                content_hash=stored.content_hash,
+                byte_size=stored.size,
+                content_type=stored.content_type,
+                ref_count=count
+            )
+            db.session.add(blob)
+        return blob
+    except IntegrityError:
+        # A concurrent request stored the same content first.
+        return _add_blob_references(stored.bucket, stored.content_hash, count)
+
+
+def release_blob(blob):
+    """
+    Drop one reference to a blob.
+
+    The row is kept when the last reference goes, only marked as released:
+    the orphan sweeper removes it and its objects after the grace period,
+    unless an upload of the same content has referenced it again. Objects
+    are never removed here, since a concurrent upload may reuse the key.
+
+    Args:
+        blob (ImageBlob): Blob referenced by an image that is being deleted.
+
+    Returns:
+        bool: True if no references are left.
+    """
+    remaining = db.session.execute(
+        db.update(ImageBlob)
+        .where(ImageBlob.id == blob.id)
+        .values(ref_count=ImageBlob.ref_count - 1)
+        .returning(ImageBlob.ref_count)
+    ).scalar()
+    if remaining is not None and remaining > 0:
+        return False
+    db.session.execute(
+        db.update(ImageBlob).where(ImageBlob.id == blob.id).values(released_at=datetime.utcnow())
+    )
+    return True
+
+
+def release_images(images):
+    """
+    Release the stored objects of images that are about to be deleted.
+
+    Images backed by a blob only drop their reference; the blob's object and
+    variants are shared by content and left to the orphan sweeper. Other
+    images (legacy and direct uploads) own their object and variants outright.
+
+    Args:
+        images (Iterable[ProductImage]): Images deleted in the current transaction.
+
+    Returns:
+        dict[str, list[str]]: Object keys per bucket, to pass to
+        remove_released_objects once the deletion is committed.
+    """
+    released = defaultdict(list)
+    for image in images:
+        if image.blob is not None:
+            release_blob(image.blob)
+            continue
+        location = parse_object_url(image.image_url)
+        if location is None:
+            continue
+        bucket, object_key = location
+        released[bucket].append(object_key)
+        released[bucket].extend(variant.object_key for variant in image.variants)
+    return released
+
+
+def remove_released_objects(released, client=None):
+    """
+    Remove the objects collected by release_images, in batches per bucket.
+
+    Call after committing: if the transaction failed the objects are still
+    referenced. Failures are logged; the orphan sweeper catches what is left.
+
+    Args:
+        released (dict[str, list[str]]): Result of release_images.
+        client (Minio, optional): MinIO client. Defaults to the worker's pooled client.
+    """
+    for bucket, object_keys in released.items():
+        current_app.logger.info("Removing %s objects from MinIO bucket %s", len(object_keys), bucket)
+        remove_objects_quietly(bucket, object_keys, client)
+
+
+def _run_all(executor, calls):
+    """Run calls on the executor; return results in order, or the failures."""
+    futures = [executor.submit(*call) for call in calls]
+    wait(futures)
+    results = [future.result() for future in futures if future.exception() is None]
+    errors = [future.exception() for future in futures if future.exception() is not None]
+    return results, errors
+
+
+def upload_images(files, folder, bucket=None, client=None):
+    """
+    Upload several images concurrently and deduplicated, all or nothing.
+
+    Files are validated and hashed on the worker's bounded upload pool
+    (MINIO_UPLOAD_WORKERS threads, default 4). Content already stored in the
+    bucket only gains a reference in image_blobs and is not uploaded again;
+    the remaining files are streamed concurrently to their content-addressed
+    keys, so request latency is roughly the slowest upload. If any upload
+    fails, the first error is raised and the objects this call created are
+    discarded (see discard_uploads). Blob references are added in the caller's transaction, which is
+    expected to be rolled back on error (with discard_uploads).
+
+    Args:
+        files (list[FileStorage]): Uploaded files; empty entries are skipped.
+        folder (str): Object key prefix shared by all files.
+        bucket (str, optional): Target bucket. Defaults to the session role's bucket.
+        client (Minio, optional): MinIO client. Defaults to the worker's pooled client.
+
+    Returns:
+        list[StoredObject]: Stored objects in the same order as the files.
+
+    Raises:
+        UploadRejected: If any file is not an accepted image or is too large.
+    """
+    files = [file for file in files if file and file.filename]
+    if not files:
+        return []
+
+    # Resolve everything that needs the request/app context before handing
+    # the work to threads that have neither.
+    bucket = bucket or get_minio_bucket()
+    client = client or get_minio_client()
+    ensure_bucket(bucket, client)
+    limit = current_app.config['MAX_IMAGE_UPLOAD_BYTES']
+    executor = _get_upload_executor()
+
+    infos, errors = _run_all(executor, [(inspect_upload, file, limit) for file in files])
+    if errors:
+        raise errors[0]
+
+    # Reference content that is already stored; the row update also locks
+    # the blob against a concurrent release until this transaction ends.
+    references = Counter(info.content_hash for info in infos if info.content_hash)
+    blobs = {}
+    for content_hash, count in references.items():
+        blob = _add_blob_references(bucket, content_hash, count)
+        if blob is not None:
+            blobs[content_hash] = blob
+
+    # Upload everything else, identical files within the batch only once.
+    pending = {}
+    for index, (file, info) in enumerate(zip(files, infos)):
+        if info.content_hash in blobs:
+            continue
+        if info.content_hash is None:
+            object_key = f"{folder}/{uuid.uuid4().hex}_{info.filename}"
+            pending[index] = (put_upload, file, info, bucket, object_key, client, limit)
+        elif info.content_hash not in {call[2].content_hash for call in pending.values()}:
+            object_key = content_key(folder, info.content_hash, info.content_type)
+            pending[index] = (put_upload, file, info, bucket, object_key, client, limit)
+
+    uploaded, errors = _run_all(executor, list(pending.values()))
+    if errors:
+        discard_uploads(uploaded, client)
+        raise errors[0]
+
+    stored_by_hash = {}
+    stored_by_index = dict(zip(pending, uploaded))
+    for stored in uploaded:
+        if stored.content_hash in references:
+            blob = _register_blob(stored, references[stored.content_hash])
+            stored_by_hash[stored.content_hash] = stored._replace(blob_id=blob.id)
+
+    results = []
+    for index, info in enumerate(infos):
+        if info.content_hash in blobs:
+            blob = blobs[info.content_hash]
+            results.append(StoredObject(
+                bucket, blob.object_key, blob.byte_size, blob.content_type,
+                info.width, info.height, info.content_hash, blob.id, True
+            ))
+        elif info.content_hash in stored_by_hash:
+            results.append(stored_by_hash[info.content_hash])
+        else:
+            results.append(stored_by_index[index])
+    return results
+
+
+def presign_image_post(folder, filename, content_type, bucket=None, client=None):
+    """
+    Issue a presigned POST policy so the browser uploads an image straight to MinIO.
+
+    The policy only accepts keys under the given folder, the declared image
+    Content-Type and sizes up to MAX_DIRECT_UPLOAD_BYTES, and it expires
+    after DIRECT_UPLOAD_EXPIRY seconds.
+
+    Args:
+        folder (str): Object key prefix the upload is restricted to.
+        filename (str): Client filename, used for the object key.
+        content_type (str): Declared MIME type of the image.
+        bucket (str, optional): Target bucket. Defaults to the session role's bucket.
+        client (Minio, optional): MinIO client. Defaults to the worker's pooled client.
+
+    Returns:
+        dict: "url" to POST to, form "fields" to send before the file, and the "object_key".
+
+    Raises:
+        UploadRejected: If the content type is not an accepted image type.
+    """
+    if content_type not in IMAGE_CONTENT_TYPES:
+        raise UploadRejected(f"{content_type or 'Unknown type'} is not a PNG, JPEG or WebP image.")
+
+    bucket = bucket or get_minio_bucket()
+    client = client or get_minio_client()
+    ensure_bucket(bucket, client)
+    filename = secure_filename(filename or '') or 'image'
+    object_key = f"{folder}/{uuid.uuid4().hex}_{filename}"
+
+    expires = timedelta(seconds=int(current_app.config['DIRECT_UPLOAD_EXPIRY']))
+    policy = PostPolicy(bucket, datetime.utcnow() + expires)
+    policy.add_starts_with_condition('key', f"{folder}/")
+    policy.add_equals_condition('Content-Type', content_type)
+    policy.add_content_length_range_condition(1, current_app.config['MAX_DIRECT_UPLOAD_BYTES'])
+
+    fields = client.presigned_post_policy(policy)
+    fields['key'] = object_key
+    fields['Content-Type'] = content_type
+
+    return {
+        'url': f"{get_minio_base_url().rstrip('/')}/{bucket}",
+        'fields': fields,
+        'object_key': object_key,
+    }
+
+
+def verify_uploaded_image(folder, object_key, bucket=None, client=None):
+    """
+    Check an object uploaded through a presigned POST before it is referenced.
+
+    The key must lie under the caller's folder. A HEAD request must confirm
+    the size limit and an image Content-Type, and the first bytes must match
+    that type. Objects that fail any check are deleted.
+
+    Args:
+        folder (str): Folder the upload was scoped to.
+        object_key (str): Key reported by the browser.
+        bucket (str, optional): Bucket of the object. Defaults to the session role's bucket.
+        client (Minio, optional): MinIO client. Defaults to the worker's pooled client.
+
+    Returns:
+        StoredObject: The verified object.
+
+    Raises:
+        UploadRejected: If the object is missing, outside the folder or not a valid image.
+    """
+    if not object_key or not object_key.startswith(f"{folder}/") or '..' in object_key:
+        raise UploadRejected("Upload does not belong to this product.")
+
+    bucket = bucket or get_minio_bucket()
+    client = client or get_minio_client()
+
+    try:
+        stat = client.stat_object(bucket, object_key)
+    except S3Error as e:
+        if e.code in ('NoSuchKey', 'NoSuchObject'):
+            raise UploadRejected("Uploaded image was not found.")
+        raise
+
+    response = client.get_object(bucket, object_key, offset=0, length=SNIFF_BYTES)
+    try:
+        header = response.read()
+    finally:
+        response.close()
+        response.release_conn()
+
+    limit = current_app.config['MAX_DIRECT_UPLOAD_BYTES']
+    content_type = (stat.content_type or '').split(';')[0].strip()
+    error = None
+    if not stat.size or stat.size > limit:
+        error = f"Image must be between 1 and {limit} bytes."
+    elif content_type not in IMAGE_CONTENT_TYPES or sniff_image_type(header) != content_type:
+        error = "Uploaded file is not a PNG, JPEG or WebP image."
+
+    if error:
+        client.remove_object(bucket, object_key)
+        raise UploadRejected(error)
+
+    # Dimensions and hash need the full object; the variant job fills them in.
+    return StoredObject(bucket, object_key, stat.size, content_type, None, None, None, None, False)
+
+
+# S3 multipart calls of resumable uploads. minio-py only has them as private
+# Minio methods, so they are wrapped here and used nowhere else, and
+# requirements.txt pins minio to the release they were checked against.
+# Check these signatures before raising the pin.
+
+
+def _create_multipart_upload(client, bucket, object_key, content_type):
+    """CreateMultipartUpload; returns the upload id."""
+    return client._create_multipart_upload(bucket, object_key, {'Content-Type': content_type})
+
+
+def _upload_part(client, bucket, object_key, upload_id, part_number, data):
+    """UploadPart (1-based part number); returns the part's ETag."""
+    return client._upload_part(bucket, object_key, data, None, upload_id, part_number)
+
+
+def _list_parts(client, bucket, object_key, upload_id, part_number_marker=None):
+    """ListParts, one page; returns a ListPartsResult (parts, is_truncated, next_part_number_marker)."""
+    return client._list_parts(bucket, object_key, upload_id, part_number_marker=part_number_marker)
+
+
+def _complete_multipart_upload(client, bucket, object_key, upload_id, parts):
+    """CompleteMultipartUpload from a list of Part(part_number, etag)."""
+    return client._complete_multipart_upload(bucket, object_key, upload_id, parts)
+
+
+def _abort_multipart_upload(client, bucket, object_key, upload_id):
+    """AbortMultipartUpload; raises S3Error NoSuchUpload if it is already gone."""
+    client._abort_multipart_upload(bucket, object_key, upload_id)
+
+
+def start_resumable_upload(product_id, user_id, folder, filename, content_type, size, bucket=None, client=None):
+    """
+    Open a MinIO multipart upload for an image the client sends in chunks.
+
+    Every chunk but the last is UPLOAD_PART_SIZE bytes (the S3 minimum part
+    size), so each one is stored as a part as soon as it arrives and a
+    dropped connection only costs the chunk in flight. The caller commits
+    the returned row.
+
+    Args:
+        product_id (int): Product the image is for.
+        user_id (int): User starting the upload.
+        folder (str): Object key prefix, e.g. "products/admin/1/product_7".
+        filename (str): Client filename, used for the object key.
+        content_type (str): Declared MIME type of the image.
+        size (int): Total size of the file in bytes.
+        bucket (str, optional): Target bucket. Defaults to the session role's bucket.
+        client (Minio, optional): MinIO client. Defaults to the worker's pooled client.
+
+    Returns:
+        ResumableUpload: New, uncommitted upload row.
+
+    Raises:
+        UploadRejected: If the type is not accepted or the size is out of range.
+    """
+    if content_type not in IMAGE_CONTENT_TYPES:
+        raise UploadRejected(f"{content_type or 'Unknown type'} is not a PNG, JPEG or WebP image.")
+    limit = current_app.config['MAX_DIRECT_UPLOAD_BYTES']
+    if not isinstance(size, int) or not 0 < size <= limit:
+        raise UploadRejected(f"Image must be between 1 and {limit} bytes.")
+
+    bucket = bucket or get_minio_bucket()
+    client = client or get_minio_client()
+    ensure_bucket(bucket, client)
+    filename = secure_filename(filename or '') or 'image'
+    object_key = f"{folder}/{uuid.uuid4().hex}_{filename}"
+    upload_id = _create_multipart_upload(client, bucket, object_key, content_type)
+
+    expiry = current_app.config.get('RESUMABLE_UPLOAD_EXPIRY', 24 * 3600)
+    upload = ResumableUpload(
+        token=uuid.uuid4().hex,
+        product_id=product_id,
+        user_id=user_id,
+        bucket=bucket,
+        object_key=object_key,
+        upload_id=upload_id,
+        filename=filename,
+        content_type=content_type,
+        total_size=size,
+        chunk_size=UPLOAD_PART_SIZE,
+        expires_at=datetime.utcnow() + timedelta(seconds=int(expiry))
+    )
+    db.session.add(upload)
+    return upload
+
+
+def upload_chunk(upload, index, data, client=None):
+    """
+    Store one chunk of a resumable upload as a multipart part.
+
+    Sending the same chunk again replaces it, so clients can simply retry.
+
+    Args:
+        upload (ResumableUpload): The upload.
+        index (int): 0-based chunk index.
+        data (bytes): Chunk content.
+        client (Minio, optional): MinIO client. Defaults to the worker's pooled client.
+
+    Returns:
+        str: ETag of the stored part.
+
+    Raises:
+        UploadRejected: If the index or length is wrong, or the first chunk
+        does not start like the declared image type.
+    """
+    if not 0 <= index < upload.chunk_count:
+        raise UploadRejected(f"Chunk index must be between 0 and {upload.chunk_count - 1}.")
+    expected = upload.chunk_length(index)
+    if len(data) != expected:
+        raise UploadRejected(f"Chunk {index} must be {expected} bytes, got {len(data)}.")
+    if index == 0 and sniff_image_type(data[:SNIFF_BYTES]) != upload.content_type:
+        raise UploadRejected("File is not a PNG, JPEG or WebP image.")
+
+    client = client or get_minio_client()
+    return _upload_part(client, upload.bucket, upload.object_key, upload.upload_id, index + 1, data)
+
+
+def received_chunks(upload, client=None):
+    """
+    Ask MinIO which chunks of a resumable upload it holds.
+
+    MinIO is the source of truth, so chunks acknowledged by one worker are
+    seen by all of them and nothing is written to the database per chunk.
+
+    Args:
+        upload (ResumableUpload): The upload.
+        client (Minio, optional): MinIO client. Defaults to the worker's pooled client.
+
+    Returns:
+        dict[int, Part]: Stored parts by 0-based chunk index.
+    """
+    client = client or get_minio_client()
+    parts = {}
+    marker = None
+    while True:
+        result = _list_parts(
+            client, upload.bucket, upload.object_key, upload.upload_id, part_number_marker=marker
+        )
+        for part in result.parts:
+            parts[part.part_number - 1] = part
+        if not result.is_truncated:
+            return parts
+        marker = str(result.next_part_number_marker)
+
+
+def complete_resumable_upload(upload, client=None):
+    """
+    Assemble the chunks of a resumable upload into the final object and verify it.
+
+    Args:
+        upload (ResumableUpload): The upload.
+        client (Minio, optional): MinIO client. Defaults to the worker's pooled client.
+
+    Returns:
+        StoredObject: The verified object (see verify_uploaded_image).
+
+    Raises:
+        UploadRejected: If chunks are missing or have the wrong size, or the
+        assembled file is not a valid image.
+    """
+    client = client or get_minio_client()
+    folder = upload.object_key.rsplit('/', 1)[0]
+    try:
+        parts = received_chunks(upload, client)
+    except S3Error as e:
+        if e.code != 'NoSuchUpload':
+            raise
+        # Assembled by an earlier attempt that failed afterwards.
+        return verify_uploaded_image(folder, upload.object_key, bucket=upload.bucket, client=client)
+
+    missing = [index for index in range(upload.chunk_count) if index not in parts]
+    if missing:
+        raise UploadRejected(f"Missing chunks: {', '.join(map(str, missing))}.")
+    wrong = [index for index in range(upload.chunk_count) if parts[index].size != upload.chunk_length(index)]
+    if wrong:
+        raise UploadRejected(f"Chunks with the wrong size: {', '.join(map(str, wrong))}.")
+
+    _complete_multipart_upload(
+        client, upload.bucket, upload.object_key, upload.upload_id,
+        [Part(index + 1, parts[index].etag) for index in range(upload.chunk_count)]
+    )
+    return verify_uploaded_image(folder, upload.object_key, bucket=upload.bucket, client=client)
+
+
+def abort_resumable_upload(upload, client=None):
+    """
+    Abort the multipart upload of a resumable upload, dropping its stored chunks.
+
+    Args:
+        upload (ResumableUpload): The upload.
+        client (Minio, optional): MinIO client. Defaults to the worker's pooled client.
+    """
+    client = client or get_minio_client()
+    try:
+        _abort_multipart_upload(client, upload.bucket, upload.object_key, upload.upload_id)
+    except S3Error as e:
+        # Already completed, aborted or expired by MinIO itself.
+        if e.code != 'NoSuchUpload':
+            raise
+
+
+def expire_resumable_uploads(client=None):
+    """
+    Abort resumable uploads that were abandoned, and forget expired ones.
+
+    Unfinished uploads past their expires_at (RESUMABLE_UPLOAD_EXPIRY
+    seconds after they started, default 24 hours) have their multipart
+    upload aborted. Finished ones are only kept until then so that a
+    retried completion stays idempotent.
+
+    Args:
+        client (Minio, optional): MinIO client. Defaults to the worker's pooled client.
+
+    Returns:
+        int: Number of multipart uploads aborted.
+    """
+    client = client or get_minio_client()
+    aborted = 0
+    expired = ResumableUpload.query.filter(ResumableUpload.expires_at < datetime.utcnow()).all()
+    for upload in expired:
+        if upload.image_id is None:
+            try:
+                abort_resumable_upload(upload, client)
+            except Exception:
+                current_app.logger.exception("Failed to abort resumable upload %s", upload.token)
+                continue
+            aborted += 1
+        db.session.delete(upload)
+    db.session.commit()
+    return aborted
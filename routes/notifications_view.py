@@ -1,9 +1,25 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, abort, current_app
-from models.models_definitions import db, Notification
-from routes.auth_utils import login_required, admin_only
+import json
+import time
+import queue
+from flask import Blueprint, Response, render_template, request, redirect, url_for, flash, abort, current_app
+from models.models_definitions import Notification
+from routes.auth_utils import login_required, admin_only, current_identity
 from logic.decorators import log_exceptions
 
-from logic.notification_service import get_user_notifications
+from logic.notification_service import (
+    notification_page, count_unread, unread_ids, mark_read, mark_all_read, set_hidden,
+    notifications_since, latest_notification_id
+)
+from logic.notification_events import event_data, subscribe, unsubscribe
+
+# Notifications replayed per query when a stream catches up.
+STREAM_REPLAY_BATCH = 100
+
+# Ids below the newest one sent that a stream still watches for. Ids are
+# allocated at insert but rows become visible at commit, so a lower id can
+# commit after a higher one was sent; replays re-read this window and skip
+# the ids already delivered.
+STREAM_REPLAY_LOOKBACK = 1000
 
 admin_settings_bp = Blueprint('admin_settings', __name__, url_prefix='/admin/settings')
 notifications_bp = Blueprint('notifications', __name__)
@@ -25,24 +41,150 @@ def restrict_to_admins():
 @notifications_bp.route('/notifications')
 @log_exceptions()
 def show_notifications():
-    role = session.get('role', 'visitor')
-    user_id = session.get('user_id')
-    notifications = get_user_notifications(role, user_id)
-    unread_count = sum(1 for n in notifications if not n.is_read)
+    role, user_id = current_identity()
+    page = get_notification_page(role, user_id, visible=True)
+    unread_count = count_unread(role, user_id)
     return render_template(
         'shared/notifications.html',
-        notifications=notifications,
+        notifications=page.items,
+        page=page,
+        unread_ids=unread_ids(page.items, role, user_id),
         unread_count=unread_count
     )
 
 
+@notifications_bp.route('/notifications/stream')
+@log_exceptions()
+def notification_stream():
+    """
+    Server-Sent Events stream of new notifications for the current user.
+
+    Each notification is a "notification" event. Notifications do not commit
+    in id order, so the stream remembers the ids it delivered rather than
+    only the highest one, and replays the last STREAM_REPLAY_LOOKBACK ids
+    from the database whenever it may have missed events. A new stream
+    first sends a "seen" event with the ids already committed in that
+    window (the page counted them); the event id is the highest id seen, so
+    a reconnecting browser sends it as Last-Event-ID and the window before
+    it is replayed. The browser drops ids it has already counted.
+
+    Comments are sent every NOTIFICATION_STREAM_HEARTBEAT seconds to keep
+    proxies from closing the connection, and the stream ends after
+    NOTIFICATION_STREAM_MAX_AGE seconds; browsers reconnect on their own. No
+    database connection is held while the stream waits.
+
+    Answers 204, which tells browsers not to reconnect, unless
+    NOTIFICATION_STREAM_ENABLED is set.
+    """
+    if not current_app.config.get('NOTIFICATION_STREAM_ENABLED'):
+        return Response(status=204)
+
+    app = current_app._get_current_object()
+    role, user_id = current_identity()
+    heartbeat = float(app.config['NOTIFICATION_STREAM_HEARTBEAT'])
+    deadline = time.monotonic() + float(app.config['NOTIFICATION_STREAM_MAX_AGE'])
+
+    try:
+        last_id = int(request.headers.get('Last-Event-ID', request.args.get('last_event_id', '')))
+    except ValueError:
+        last_id = None
+
+    # Subscribe before reading the latest id so nothing falls in between.
+    subscription = subscribe(app)
+    delivered = set()
+    seen = None
+    try:
+        if last_id is None:
+            last_id = latest_notification_id()
+            seen = [notification.id for notification in _committed_since(role, user_id, last_id - STREAM_REPLAY_LOOKBACK)]
+            delivered.update(seen)
+    except Exception:
+        unsubscribe(subscription)
+        raise
+
+    def format_event(data):
+        nonlocal last_id
+        delivered.add(data['id'])
+        last_id = max(last_id, data['id'])
+        return f"id: {last_id}\nevent: notification\ndata: {json.dumps(data)}\n\n"
+
+    def replay():
+        floor = last_id - STREAM_REPLAY_LOOKBACK
+        with app.app_context():
+            for notification in _committed_since(role, user_id, floor):
+                if notification.id not in delivered:
+                    yield format_event(event_data(notification))
+        # Ids below the window are not replayed any more.
+        delivered.difference_update([id_ for id_ in delivered if id_ <= last_id - STREAM_REPLAY_LOOKBACK])
+
+    def generate():
+        try:
+            # The id line lets a reconnect resume from here even without events.
+            yield f"retry: 5000\nid: {last_id}\n\n"
+            if seen is not None:
+                yield f"event: seen\ndata: {json.dumps(seen)}\n\n"
+            else:
+                yield from replay()
+            while time.monotonic() < deadline:
+                try:
+                    data = subscription.events.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ": heartbeat\n\n"
+                    continue
+                if subscription.missed or data.get('resync'):
+                    subscription.missed = False
+                    yield from replay()
+                    continue
+                if data['id'] in delivered or data['role'] != role or data['user_id'] not in (None, user_id):
+                    continue
+                if 'message' not in data:
+                    # Sent as ids only because it was too long for NOTIFY.
+                    yield from replay()
+                    continue
+                yield format_event(data)
+        finally:
+            unsubscribe(subscription)
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _committed_since(role, user_id, after_id):
+    """Yield the committed notifications of a user above an id, in batches of STREAM_REPLAY_BATCH."""
+    while True:
+        batch = notifications_since(role, user_id, after_id, STREAM_REPLAY_BATCH)
+        yield from batch
+        if len(batch) < STREAM_REPLAY_BATCH:
+            return
+        after_id = batch[-1].id
+
+
 @notifications_bp.route('/notifications/<int:note_id>/hide', methods=['POST'])
 @log_exceptions()
 def hide_notification(note_id):
     note = Notification.query.get_or_404(note_id)
     check_user_permissions(note)
-    note.is_visible = False
-    db.session.commit()
+    set_hidden(note, current_identity()[1], hidden=True)
+    return redirect(url_for('notifications.show_notifications'))
+
+
+@notifications_bp.route('/notifications/<int:note_id>/read', methods=['POST'])
+@log_exceptions()
+def read_notification(note_id):
+    note = Notification.query.get_or_404(note_id)
+    check_user_permissions(note)
+    mark_read(note, current_identity()[1])
+    return redirect(url_for('notifications.show_notifications'))
+
+
+@notifications_bp.route('/notifications/mark_as_read', methods=['POST'])
+@log_exceptions()
+def mark_all_notifications_read():
+    role, user_id = current_identity()
+    if user_id:
+        mark_all_read(role, user_id)
     return redirect(url_for('notifications.show_notifications'))
 
 
@@ -51,35 +193,37 @@ def hide_notification(note_id):
 def restore_notification(note_id):
     note = Notification.query.get_or_404(note_id)
     check_user_permissions(note)
-    note.is_visible = True
-    db.session.commit()
+    set_hidden(note, current_identity()[1], hidden=False)
     return redirect(url_for('notifications.notification_archive'))
 
 
 @notifications_bp.route('/notifications/archive')
 @log_exceptions()
 def notification_archive():
-    role = session.get('role', 'visitor')
-    user_id = session.get('user_id')
-    notifications = Notification.query.filter_by(role=role, is_visible=False)
-    if user_id:
-        notifications = notifications.filter(
-            (Notification.user_id == user_id) | (Notification.user_id.is_(None))
-        )
-    else:
-        notifications = notifications.filter_by(user_id=None)
-    notifications = notifications.order_by(Notification.created_at.desc()).all()
+    role, user_id = current_identity()
+    page = get_notification_page(role, user_id, visible=False)
     return render_template(
         'shared/notifications_archive.html',
-        notifications=notifications
+        notifications=page.items,
+        page=page
+    )
+
+
+def get_notification_page(role, user_id, visible):
+    return notification_page(
+        role,
+        user_id,
+        visible=visible,
+        after=request.args.get('after'),
+        before=request.args.get('before'),
+        page_size=current_app.config['NOTIFICATION_PAGE_SIZE']
     )
 
 
 def check_user_permissions(note):
-    role = session.get('role')
-    user_id = session.get('user_id')
+    role, user_id = current_identity()
     if note.role != role or (note.user_id and note.user_id != user_id):
         current_app.logger.warning(
-            "Unauthorized access attempt by user %s", session.get('username')
+            "Unauthorized access attempt by user %s", user_id
         )
         abort(403)
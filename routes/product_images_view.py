@@ -1,17 +1,28 @@
-from werkzeug.utils import secure_filename
-import uuid
+from datetime import datetime
 from flask import (
     Blueprint, render_template, redirect, url_for,
-    flash, request, session, abort, current_app
+    flash, request, session, abort, current_app, jsonify
+)
+from models.models_definitions import db, ProductImage, Product, ResumableUpload
+from routes.auth_utils import login_required, current_identity
+from routes.minio_client import get_minio_bucket, build_image_url
+from routes.minio_uploads import (
+    upload_images, presign_image_post, verify_uploaded_image, image_metadata,
+    release_images, remove_released_objects, start_resumable_upload, upload_chunk,
+    received_chunks, complete_resumable_upload, abort_resumable_upload, UploadRejected
 )
-from models.models_definitions import db, ProductImage, Product
-from routes.auth_utils import login_required
-from routes.minio_client import get_minio_client, get_minio_bucket, get_minio_base_url
 from logic.decorators import log_exceptions
+from logic.product_events import product_changed
+from routes.image_variants import schedule_variants
 
 product_images_bp = Blueprint('product_images', __name__)
 
 
+def product_image_folder(product):
+    """Object key prefix for the images of a product."""
+    return f"products/{product.merchant.role}/{product.merchant.id}/product_{product.id}"
+
+
 @product_images_bp.route('/products/<int:product_id>/images')
 @login_required
 @log_exceptions()
@@ -45,7 +56,9 @@ def set_main_image(image_id):
     for i in product.images:
         i.is_main = (i.id == image_id)
 
+    product.refresh_main_image()
     db.session.commit()
+    product_changed(product.id)
     flash("Image set as main successfully.", "success")
     return redirect(request.referrer or url_for('merchant.my_products'))
 
@@ -66,41 +79,250 @@ def upload_image(product_id):
         flash("No file uploaded.", "error")
         return redirect(request.referrer)
 
-    filename = secure_filename(image_file.filename)
-    folder = f"products/{product.merchant.role}/{product.merchant.id}/product_{product.id}"
-    object_key = f"{folder}/{uuid.uuid4().hex}_{filename}"
+    folder = product_image_folder(product)
 
-    image_data = image_file.read()
-    image_file.stream.seek(0)
-
-    minio_client = get_minio_client()
     bucket_name = get_minio_bucket()
+    try:
+        stored, = upload_images([image_file], folder, bucket=bucket_name)
+    except UploadRejected as e:
+        flash(str(e), "error")
+        return redirect(request.referrer or url_for('merchant.my_products'))
 
-    if not minio_client.bucket_exists(bucket_name):
-        minio_client.make_bucket(bucket_name)
-
-    minio_client.put_object(
-        bucket_name,
-        object_key,
-        image_file.stream,
-        length=len(image_data),
-        part_size=10 * 1024 * 1024,
-        content_type=image_file.content_type
-    )
-
-    image_url = f"{get_minio_base_url().rstrip('/')}/{bucket_name}/{object_key}"
+    image_url = build_image_url(bucket_name, stored.object_key)
     new_image = ProductImage(
         product_id=product.id,
         image_url=image_url,
-        is_main=False
+        is_main=False,
+        **image_metadata(stored)
     )
     db.session.add(new_image)
+    product.refresh_main_image()
     db.session.commit()
+    product_changed(product.id)
+    schedule_variants([new_image.id])
 
     flash("Image uploaded successfully.", "success")
     return redirect(request.referrer or url_for('merchant.my_products'))
 
 
+@product_images_bp.route('/products/<int:product_id>/images/presign', methods=['POST'])
+@login_required
+@log_exceptions()
+def presign_image_upload(product_id):
+    """
+    Issue a presigned POST so the browser uploads an image directly to MinIO.
+
+    Expects JSON {"filename": ..., "content_type": ...}. The image bytes never
+    pass through the worker; the browser calls complete_image_upload afterwards.
+    """
+    product = Product.query.get_or_404(product_id)
+
+    role = session.get('role')
+    user_id = session.get('user_id')
+    if role == 'merchant' and product.merchant_id != user_id:
+        abort(403)
+
+    data = request.get_json(silent=True) or {}
+    try:
+        upload = presign_image_post(
+            product_image_folder(product),
+            data.get('filename'),
+            data.get('content_type')
+        )
+    except UploadRejected as e:
+        return jsonify(error=str(e)), 400
+
+    return jsonify(upload)
+
+
+@product_images_bp.route('/products/<int:product_id>/images/complete', methods=['POST'])
+@login_required
+@log_exceptions()
+def complete_image_upload(product_id):
+    """
+    Register an image uploaded through a presigned POST.
+
+    Expects JSON {"object_key": ...}. The object is verified in MinIO (HEAD,
+    size, content type and magic bytes) before the ProductImage row is created.
+    """
+    product = Product.query.get_or_404(product_id)
+
+    role = session.get('role')
+    user_id = session.get('user_id')
+    if role == 'merchant' and product.merchant_id != user_id:
+        abort(403)
+
+    data = request.get_json(silent=True) or {}
+    bucket_name = get_minio_bucket()
+    try:
+        stored = verify_uploaded_image(product_image_folder(product), data.get('object_key'), bucket=bucket_name)
+    except UploadRejected as e:
+        return jsonify(error=str(e)), 400
+
+    image_url = build_image_url(bucket_name, stored.object_key)
+    image = ProductImage.query.filter_by(product_id=product.id, image_url=image_url).first()
+    if image is not None:
+        # The browser retried the callback; the image is already registered.
+        return jsonify(id=image.id, image_url=image.image_url, is_main=image.is_main)
+
+    image = add_stored_image(product, stored)
+    return jsonify(id=image.id, image_url=image.image_url, is_main=image.is_main), 201
+
+
+def add_stored_image(product, stored):
+    """
+    Create the ProductImage for a verified object, commit it and queue its variants.
+
+    Args:
+        product (Product): Product the image belongs to.
+        stored (StoredObject): Verified object in MinIO.
+
+    Returns:
+        ProductImage: The committed image.
+    """
+    image = ProductImage(
+        product_id=product.id,
+        image_url=build_image_url(stored.bucket, stored.object_key),
+        is_main=not product.images,
+        **image_metadata(stored)
+    )
+    db.session.add(image)
+    product.refresh_main_image()
+    db.session.commit()
+    product_changed(product.id)
+    schedule_variants([image.id])
+    return image
+
+
+@product_images_bp.route('/products/<int:product_id>/uploads', methods=['POST'])
+@login_required
+@log_exceptions()
+def start_resumable_image_upload(product_id):
+    """
+    Start a resumable upload of a large image, sent in chunks.
+
+    Expects JSON {"filename": ..., "content_type": ..., "size": ...}. The
+    client then PUTs each chunk to "<status_url>/chunks/<index>" (any order,
+    retries welcome), can GET status_url after a dropped connection to see
+    which chunks are missing, and finally POSTs to complete_url.
+    """
+    product = Product.query.get_or_404(product_id)
+
+    role, user_id = current_identity()
+    if role == 'merchant' and product.merchant_id != user_id:
+        abort(403)
+
+    data = request.get_json(silent=True) or {}
+    try:
+        upload = start_resumable_upload(
+            product.id, user_id, product_image_folder(product),
+            data.get('filename'), data.get('content_type'), data.get('size'),
+            bucket=get_minio_bucket(role)
+        )
+    except UploadRejected as e:
+        return jsonify(error=str(e)), 400
+    try:
+        db.session.commit()
+    except Exception:
+        # Nothing would ever find the multipart upload again to expire it.
+        db.session.rollback()
+        abort_resumable_upload(upload)
+        raise
+
+    return jsonify(resumable_upload_status(upload, {})), 201
+
+
+def resumable_upload_status(upload, parts):
+    """JSON description of a resumable upload, given its received chunks."""
+    return {
+        'token': upload.token,
+        'chunk_size': upload.chunk_size,
+        'chunk_count': upload.chunk_count,
+        'received': sorted(parts),
+        'missing': [index for index in range(upload.chunk_count) if index not in parts],
+        'image_id': upload.image_id,
+        'expires_at': upload.expires_at.isoformat() + 'Z',
+        'status_url': url_for('product_images.resumable_upload_status_view', token=upload.token),
+        'complete_url': url_for('product_images.complete_resumable_image_upload', token=upload.token),
+    }
+
+
+def get_resumable_upload(token):
+    """Load a resumable upload of the current user, or abort with 404/410."""
+    upload = ResumableUpload.query.filter_by(token=token, user_id=current_identity()[1]).first()
+    if upload is None:
+        abort(404)
+    if upload.expires_at < datetime.utcnow() or upload.product_id is None:
+        abort(410)
+    return upload
+
+
+@product_images_bp.route('/uploads/<token>', methods=['GET'])
+@login_required
+@log_exceptions()
+def resumable_upload_status_view(token):
+    upload = get_resumable_upload(token)
+    parts = {} if upload.image_id else received_chunks(upload)
+    return jsonify(resumable_upload_status(upload, parts))
+
+
+@product_images_bp.route('/uploads/<token>/chunks/<int:index>', methods=['PUT'])
+@login_required
+@log_exceptions()
+def put_upload_chunk(token, index):
+    """Store one chunk; the raw request body is the chunk."""
+    upload = get_resumable_upload(token)
+    if upload.image_id:
+        return jsonify(error="Upload is already complete."), 409
+
+    # Chunks are bigger than the form upload limit, but never bigger than a part.
+    request.max_content_length = upload.chunk_size
+    try:
+        etag = upload_chunk(upload, index, request.get_data(cache=False))
+    except UploadRejected as e:
+        return jsonify(error=str(e)), 400
+
+    return jsonify(index=index, etag=etag)
+
+
+@product_images_bp.route('/uploads/<token>/complete', methods=['POST'])
+@login_required
+@log_exceptions()
+def complete_resumable_image_upload(token):
+    """Assemble the chunks and create the ProductImage; safe to retry."""
+    upload = get_resumable_upload(token)
+    image_url = build_image_url(upload.bucket, upload.object_key)
+    image = ProductImage.query.filter_by(product_id=upload.product_id, image_url=image_url).first()
+    if image is not None:
+        # The client retried; the image is already registered.
+        upload.image_id = image.id
+        db.session.commit()
+        return jsonify(id=image.id, image_url=image.image_url, is_main=image.is_main)
+
+    product = Product.query.get_or_404(upload.product_id)
+    try:
+        stored = complete_resumable_upload(upload)
+    except UploadRejected as e:
+        return jsonify(error=str(e)), 400
+
+    image = add_stored_image(product, stored)
+    upload.image_id = image.id
+    db.session.commit()
+    return jsonify(id=image.id, image_url=image.image_url, is_main=image.is_main), 201
+
+
+@product_images_bp.route('/uploads/<token>', methods=['DELETE'])
+@login_required
+@log_exceptions()
+def cancel_resumable_image_upload(token):
+    upload = get_resumable_upload(token)
+    if upload.image_id is None:
+        abort_resumable_upload(upload)
+    db.session.delete(upload)
+    db.session.commit()
+    return '', 204
+
+
 @product_images_bp.route('/images/<int:image_id>/delete', methods=['POST'])
 @login_required
 @log_exceptions()
@@ -113,15 +335,12 @@ def delete_image(image_id):
     if role == 'merchant' and product.merchant_id != user_id:
         abort(403)
 
-    if img.image_url and 'files.liebemama.com' in img.image_url:
-        minio_client = get_minio_client()
-        bucket_name = get_minio_bucket()
-        prefix = f"{get_minio_base_url().rstrip('/')}/{bucket_name}/"
-        object_key = img.image_url.replace(prefix, "")
-        current_app.logger.info("Removing from MinIO: %s", object_key)
-        minio_client.remove_object(bucket_name, object_key)
-
+    # Shared blobs only lose a reference; the sweeper removes them.
+    released = release_images([img])
     db.session.delete(img)
+    product.refresh_main_image()
     db.session.commit()
+    remove_released_objects(released)
+    product_changed(product.id)
     flash("Image deleted successfully.", "success")
     return redirect(request.referrer or url_for('merchant.my_products'))
@@ -1,31 +1,230 @@
-import uuid
+from datetime import datetime
 from flask import (
-    Blueprint, request, session, current_app,
-    render_template, redirect, url_for, flash
+    Blueprint, request, session, current_app, g,
+    render_template, redirect, url_for, flash, jsonify
 )
-from models.models_definitions import db, Product
-from routes.minio_client import get_minio_client, get_minio_bucket
-from sqlalchemy.orm import joinedload
-from werkzeug.utils import secure_filename
+from models.models_definitions import db, Product, ProductImage
+from routes.minio_client import get_minio_bucket, build_image_url
+from routes.minio_uploads import upload_images, image_metadata, UploadRejected
+from routes.image_variants import schedule_variants
+from routes.media_view import image_src, image_srcset, url_epoch, url_window
 from logic.decorators import log_exceptions
+from logic.pagination import keyset_paginate
+from logic.catalog import card_query
+from logic.fragment_cache import fragment_cache
+from flask_babel import get_locale
+from logic.http_cache import (
+    cache_anonymous_page, conditional_get, page_version_query, product_tag, CATALOG_TAG, RELATED_TAG
+)
+from sqlalchemy import func
+from logic.recommendations import get_related_products
+from logic.attributes import (
+    parse_facet_args, facet_args, apply_facet_filters, build_facets, format_attributes,
+    parse_attributes, set_product_attributes
+)
 
 products_bp = Blueprint('products', __name__)
 
 
+@products_bp.app_template_global()
+def render_product_card(product):
+    """Render the catalog card of a product through the fragment cache."""
+    return fragment_cache.render(
+        'card', product, str(get_locale()),
+        lambda: render_template('shared/product_card.html', product=product),
+        epoch=url_epoch()
+    )
+
+
+@products_bp.app_template_global()
+def render_product_detail_body(product):
+    """Render the body of the product detail page through the fragment cache."""
+    return fragment_cache.render(
+        'detail', product, str(get_locale()),
+        lambda: render_template('shared/product_detail_body.html', product=product),
+        epoch=url_epoch()
+    )
+
+
+def catalog_validators():
+    """
+    Version the catalog by its newest update and the catalog page version.
+
+    max(updated_at) is one step of ix_products_approved_updated; the page
+    version, bumped by product_changed, covers what it misses (deletions,
+    unapprovals, image changes), so the cost stays flat as the catalog grows.
+    """
+    latest, version = db.session.query(
+        db.session.query(func.max(Product.updated_at)).filter(Product.is_approved.is_(True)).scalar_subquery(),
+        page_version_query(CATALOG_TAG)
+    ).one()
+    if latest is None:
+        return None
+    return with_url_epoch(f"{latest.isoformat()}-{version}", latest)
+
+
+def related_products_for(product_id):
+    """
+    Related products of a detail page, loaded once per request.
+
+    The validators, the surrogate keys and the view all need them; they
+    share the rows kept on g instead of querying three times.
+    """
+    loaded = g.setdefault('related_products', {})
+    if product_id not in loaded:
+        loaded[product_id] = get_related_products(product_id)
+    return loaded[product_id]
+
+
+def product_validators(product_id):
+    """Version a product page by its updated_at and images_version, and those of its related products."""
+    row = db.session.query(Product.updated_at, Product.images_version).filter_by(id=product_id).first()
+    if row is None:
+        return None
+    updated_at, images_version = row
+    related = related_products_for(product_id)
+    latest = max([updated_at] + [product.updated_at for product in related])
+    version = '-'.join(
+        [f"{updated_at.isoformat()}.{images_version}"]
+        + [f"{product.id}@{product.updated_at.isoformat()}.{product.images_version}" for product in related]
+    )
+    return with_url_epoch(version, latest)
+
+
+def product_page_tags(product_id):
+    """Surrogate keys of a detail page: the product, its related products and RELATED_TAG."""
+    return [product_tag(product_id), RELATED_TAG] + [
+        product_tag(related.id) for related in related_products_for(product_id)
+    ]
+
+
+def with_url_epoch(version, last_modified):
+    """Fold the signing window of presigned image URLs into page validators."""
+    epoch = url_epoch()
+    if not epoch:
+        return version, last_modified
+    window_start = datetime.utcfromtimestamp(epoch * url_window())
+    return f"{version}-{epoch}", max(last_modified, window_start)
+
+
+products_bp.add_app_template_global(format_attributes)
+
+
+def get_catalog_page(filters):
+    """
+    Load one keyset page of approved products based on the request cursors.
+
+    Args:
+        filters (dict[str, list[str]]): Selected facet values.
+
+    Returns:
+        KeysetPage: Products for the page plus next/previous cursors.
+    """
+    query = apply_facet_filters(card_query().filter(Product.is_approved.is_(True)), filters)
+
+    return keyset_paginate(
+        query,
+        Product.updated_at,
+        Product.id,
+        after=request.args.get('after'),
+        before=request.args.get('before'),
+        page_size=current_app.config['CATALOG_PAGE_SIZE']
+    )
+
+
 @products_bp.route('/')
 @log_exceptions()
+@conditional_get(catalog_validators)
+@cache_anonymous_page(lambda: [CATALOG_TAG])
 def index():
-    products = Product.query.options(
-        joinedload(Product.images)
-    ).filter(Product.is_approved.is_(True)).all()
-    return render_template('index.html', products=products)
+    filters = parse_facet_args(request.args.getlist('f'))
+    page = get_catalog_page(filters)
+    return render_template(
+        'index.html',
+        products=page.items,
+        page=page,
+        facets=build_facets(filters),
+        active_filters=facet_args(filters)
+    )
+
+
+@products_bp.route('/products/more')
+@log_exceptions()
+@conditional_get(catalog_validators)
+@cache_anonymous_page(lambda: [CATALOG_TAG])
+def load_more():
+    """
+    Render the next batch of product cards as an HTML fragment.
+
+    The cursor for the following batch is returned in the X-Next-Cursor header
+    (empty when the catalog is exhausted).
+    """
+    page = get_catalog_page(parse_facet_args(request.args.getlist('f')))
+    response = current_app.make_response(
+        render_template('shared/product_cards.html', products=page.items)
+    )
+    response.headers['X-Next-Cursor'] = page.next_cursor or ''
+    return response
+
+
+@products_bp.route('/api/products')
+@log_exceptions()
+def api_products():
+    """
+    JSON catalog with the same cursors and facet filters as the home page.
+
+    Query args:
+        f: repeated "name:value" facet filters.
+        after / before: keyset cursors.
+    """
+    filters = parse_facet_args(request.args.getlist('f'))
+    page = get_catalog_page(filters)
+    return jsonify(
+        products=[
+            {
+                'id': product.id,
+                'name': product.name,
+                'price': product.price,
+                'product_code': product.product_code,
+                'image_url': image_src(product.thumbnail_url),
+                'image': {
+                    'srcset': image_srcset(product.main_image_srcset),
+                    'width': product.main_image_width,
+                    'height': product.main_image_height,
+                    'color': product.main_image_color,
+                    'placeholder': product.main_image_placeholder,
+                },
+                'url': url_for('products.product_detail', product_id=product.id),
+            }
+            for product in page.items
+        ],
+        next_cursor=page.next_cursor,
+        prev_cursor=page.prev_cursor,
+        filters=filters,
+        facets=[
+            {
+                'name': facet['name'],
+                'values': [
+                    {'value': value['value'], 'count': value['count'], 'selected': value['selected']}
+                    for value in facet['values']
+                ],
+            }
+            for facet in build_facets(filters)
+        ]
+    )
 
 
 @products_bp.route('/product/<int:product_id>')
 @log_exceptions()
+@conditional_get(product_validators)
+@cache_anonymous_page(product_page_tags)
 def product_detail(product_id):
     product = Product.query.get_or_404(product_id)
-    return render_template('product_detail.html', product=product)
+    return render_template(
+        'product_detail.html',
+        product=product,
+        related_products=related_products_for(product.id)
+    )
 
 
 def get_next_sequence_for_merchant(merchant_id):
@@ -49,41 +248,40 @@ def add_product():
 
     sequence = get_next_sequence_for_merchant(merchant_id)
     image_url = None
+    stored = None
 
-    if image:
-        filename = secure_filename(image.filename)
+    if image and image.filename:
         folder = f"products/admin/{merchant_id}/product_temp"
-        unique_filename = f"{folder}/{uuid.uuid4().hex}_{filename}"
-
-        image_data = image.read()
-        image.stream.seek(0)
-
         role = session.get("role", "admin")
-        minio_client = get_minio_client()
-        bucket_name = get_minio_bucket(role)
-
-        minio_client.put_object(
-            bucket_name,
-            unique_filename,
-            image.stream,
-            length=len(image_data),
-            part_size=10 * 1024 * 1024,
-            content_type=image.content_type
-        )
+        try:
+            stored, = upload_images([image], folder, bucket=get_minio_bucket(role))
+        except UploadRejected as e:
+            flash(str(e), "error")
+            return redirect(url_for('products.index'))
 
-        image_url = f"https://files.liebemama.com/{bucket_name}/{unique_filename}"
+        image_url = build_image_url(stored.bucket, stored.object_key)
 
     product = Product(
         name=name,
         price=price,
         description=description,
         specs=specs,
-        image=image_url,
         merchant_id=merchant_id
     )
     product.generate_code(sequence)
+    set_product_attributes(product, parse_attributes(request.form.get('attributes')))
     db.session.add(product)
+    main_image = None
+    if image_url:
+        db.session.flush()
+        main_image = ProductImage(
+            product_id=product.id, image_url=image_url, is_main=True, **image_metadata(stored)
+        )
+        db.session.add(main_image)
+        product.refresh_main_image()
     db.session.commit()
+    if main_image:
+        schedule_variants([main_image.id])
 
     flash(f"Product added successfully with code: {product.product_code}", "success")
     return redirect(url_for('admin.admin_dashboard'))
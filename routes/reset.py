@@ -1,4 +1,4 @@
-from flask import Blueprint, current_app
+from flask import Blueprint, current_app, request, jsonify, abort
 from models.models_definitions import db
 from routes.auth_utils import admin_only
 from logic.decorators import log_exceptions
@@ -23,3 +23,24 @@ def dev_reset():
     db.create_all()
     current_app.logger.info("Database reset in development mode.")
     return "Database has been reset (development mode).", 200
+
+
+# Tags received by the local CDN stand-in, newest last (development only).
+received_purges = []
+
+
+@reset_bp.route('/dev/cdn-purge', methods=['POST'])
+def dev_cdn_purge():
+    """
+    Local stand-in for the CDN purge API, used by setting CDN_PURGE_URL to it.
+
+    Accepts the same {"tags": [...]} body as Cloudflare's purge_cache endpoint
+    and records the tags so purges can be inspected during development.
+    """
+    if not current_app.debug:
+        abort(403)
+
+    tags = (request.get_json(silent=True) or {}).get('tags', [])
+    received_purges.append(tags)
+    current_app.logger.info("CDN stand-in purged tags: %s", tags)
+    return jsonify(success=True, tags=tags)
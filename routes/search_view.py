@@ -0,0 +1,73 @@
+from flask import Blueprint, render_template, request, current_app, jsonify, url_for
+from flask_babel import get_locale
+from logic.decorators import log_exceptions
+from logic.search import search_products
+from logic.suggest_index import suggest_index
+from routes.media_view import image_src
+
+search_bp = Blueprint('search', __name__)
+
+
+def run_search():
+    """Run the search described by the request's q and page arguments."""
+    query = request.args.get('q', '').strip()
+    page = request.args.get('page', 1, type=int)
+    results = search_products(
+        query,
+        locale=str(get_locale()),
+        page=page,
+        per_page=current_app.config['CATALOG_PAGE_SIZE']
+    )
+    return query, results
+
+
+@search_bp.route('/search')
+@log_exceptions()
+def search():
+    query, results = run_search()
+    return render_template(
+        'search.html',
+        query=query,
+        results=results,
+        products=[product for product, _ in results.items]
+    )
+
+
+@search_bp.route('/api/search')
+@log_exceptions()
+def api_search():
+    query, results = run_search()
+    return jsonify(
+        query=query,
+        page=results.page,
+        has_next=results.has_next,
+        results=[
+            {
+                'id': product.id,
+                'name': product.name,
+                'price': product.price,
+                'product_code': product.product_code,
+                'image_url': image_src(product.thumbnail_url),
+                'url': url_for('products.product_detail', product_id=product.id),
+                'rank': rank,
+            }
+            for product, rank in results.items
+        ]
+    )
+
+
+@search_bp.route('/api/products/suggest')
+@log_exceptions()
+def api_suggest():
+    """Autocomplete product names and codes from the in-memory prefix index."""
+    query = request.args.get('q', '')
+    limit = min(request.args.get('limit', 10, type=int), 25)
+
+    suggest_index.ensure_built()
+    suggestions = suggest_index.suggest(query, limit=limit)
+    for suggestion in suggestions:
+        suggestion['url'] = url_for('products.product_detail', product_id=suggestion['id'])
+
+    response = jsonify(query=query, suggestions=suggestions)
+    response.headers['Cache-Control'] = 'public, max-age=60'
+    return response
@@ -0,0 +1,60 @@
+"""
+backfill_main_images.py
+
+One-shot command that adds the denormalized main image columns to the
+products table (if missing) and fills them from product_images.
+
+Usage:
+    python scripts/backfill_main_images.py
+"""
+
+import os
+import sys
+import logging
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from myapp import app
+from models.models_definitions import db, Product, ProductImage
+from models.schema_utils import upgrade_schema
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def backfill_main_images():
+    """Recompute main_image_url and thumbnail_url for every product.
+
+    Runs as a single set-based UPDATE. updated_at is assigned to itself so
+    the backfill does not reorder the catalog.
+
+    Returns:
+        int: Number of products updated.
+    """
+    main_image = db.select(ProductImage.image_url).where(
+        ProductImage.product_id == Product.id,
+        ProductImage.is_main.is_(True)
+    ).order_by(ProductImage.id).limit(1).scalar_subquery()
+
+    result = db.session.execute(
+        db.update(Product).values(
+            main_image_url=main_image,
+            thumbnail_url=main_image,
+            updated_at=Product.updated_at
+        )
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def main():
+    with app.app_context():
+        changes = upgrade_schema()
+        for table_name, columns in changes.items():
+            logging.info("Added columns to %s: %s", table_name, ", ".join(columns))
+
+        total = backfill_main_images()
+        logging.info("Done. %d products backfilled.", total)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+bench_concurrent_uploads.py
+
+Compare sequential and concurrent multi-image uploads against a local MinIO
+stand-in: a small S3-compatible HTTP server that accepts PUT/DELETE object
+requests and adds a fixed latency to every PUT, like a remote object store.
+
+The real Minio client and pooled connection settings are used, only the
+server is simulated, so no MinIO instance or network access is needed.
+Every image is distinct, so deduplication does not skip any upload; the
+blob rows are rolled back after each round.
+
+Usage:
+    python scripts/bench_concurrent_uploads.py --images 6 --latency 0.08 --size 300000
+"""
+
+import io
+import os
+import sys
+import time
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+
+from myapp import app
+from models.models_definitions import db
+from routes.minio_uploads import upload_images
+import routes.minio_uploads as minio_uploads
+
+BUCKET = 'bench-product'
+
+LOCATION_XML = (
+    b'<?xml version="1.0" encoding="UTF-8"?>'
+    b'<LocationConstraint xmlns="http://s3.amazonaws.com/doc/2006-03-01/">us-east-1</LocationConstraint>'
+)
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    latency = 0.0
+    objects = {}
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        # Only the bucket location lookup the client does on first use.
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/xml')
+        self.send_header('Content-Length', str(len(LOCATION_XML)))
+        self.end_headers()
+        self.wfile.write(LOCATION_XML)
+
+    def do_PUT(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        time.sleep(self.latency)
+        self.objects[self.path] = len(body)
+        self.send_response(200)
+        self.send_header('ETag', f'"{hashlib.md5(body).hexdigest()}"')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_DELETE(self):
+        self.objects.pop(self.path, None)
+        self.send_response(204)
+        self.end_headers()
+
+
+def make_files(count, size):
+    # Random pixels barely compress, so the PNG ends up close to size bytes.
+    side = max(1, int((size / 3) ** 0.5))
+    files = []
+    for index in range(count):
+        buffer = io.BytesIO()
+        Image.frombytes('RGB', (side, side), os.urandom(side * side * 3)).save(buffer, 'PNG', compress_level=0)
+        buffer.seek(0)
+        files.append(FileStorage(buffer, f'image_{index}.png'))
+    return files
+
+
+def timed_upload(count, size, workers):
+    app.config['MINIO_UPLOAD_WORKERS'] = workers
+    for executor in minio_uploads._executors.values():
+        executor.shutdown()
+    minio_uploads._executors.clear()
+
+    with app.test_request_context():
+        files = make_files(count, size)
+        start = time.perf_counter()
+        stored = upload_images(files, 'products/bench/1/product_1', bucket=BUCKET)
+        elapsed = time.perf_counter() - start
+        db.session.rollback()
+    assert len(stored) == count
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', type=int, default=6)
+    parser.add_argument('--size', type=int, default=300_000, help='bytes per image')
+    parser.add_argument('--latency', type=float, default=0.08, help='seconds added to every PUT')
+    parser.add_argument('--workers', default='1,2,4,6')
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    StandInHandler.latency = args.latency
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    app.config.update(
+        MINIO_ENDPOINT=f'127.0.0.1:{server.server_address[1]}',
+        MINIO_ACCESS_KEY='bench',
+        MINIO_SECRET_KEY='bench-secret',
+        MINIO_SECURE='false',
+        MAX_IMAGE_UPLOAD_BYTES=max(2 * args.size, app.config['MAX_IMAGE_UPLOAD_BYTES'])
+    )
+
+    # Warm up the pooled client (region lookup, connections).
+    timed_upload(1, args.size, 1)
+
+    print(f"{args.images} images x {args.size} bytes, {args.latency * 1000:.0f} ms per PUT")
+    print(f"{'workers':>8} {'median (ms)':>12} {'best (ms)':>10}")
+    for workers in (int(value) for value in args.workers.split(',')):
+        timings = sorted(timed_upload(args.images, args.size, workers) for _ in range(args.rounds))
+        print(f"{workers:>8} {timings[len(timings) // 2] * 1000:>12.1f} {timings[0] * 1000:>10.1f}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+bench_listing_queries.py
+
+Compare the full Product query with the lean card projection used by the
+listing pages. Seeds a throwaway in-memory SQLite database with products
+carrying realistic rich-text description/specs and reports, per page:
+
+- payload: bytes of column data returned by the database driver
+- hydrate: time to run the ORM query and build Product objects
+
+Usage:
+    python scripts/bench_listing_queries.py --products 5000 --page-size 24
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Always benchmark against a throwaway database, never the configured one.
+os.environ['DATABASE_URL'] = 'sqlite://'
+
+from myapp import app
+from models.models_definitions import db, Product
+from logic.catalog import card_query
+
+RICH_TEXT = "<p>Traditional halawa with roasted sesame, pistachio and natural vanilla.</p>" * 40
+
+
+def seed(count):
+    db.create_all()
+    db.session.bulk_save_objects([
+        Product(
+            name=f"Product {i}",
+            price=4.5 + i % 20,
+            description=RICH_TEXT,
+            specs=RICH_TEXT,
+            product_code=f"BENCH-{i:06d}",
+            is_approved=True,
+            main_image_url=f"https://files.example.com/products/{i}.jpg",
+            thumbnail_url=f"https://files.example.com/products/{i}.jpg",
+        )
+        for i in range(count)
+    ])
+    db.session.commit()
+
+
+def payload_bytes(query):
+    rows = db.session.connection().execute(query.statement).all()
+    return sum(len(str(value)) for row in rows for value in row if value is not None)
+
+
+def time_hydration(query, rounds):
+    samples = []
+    for _ in range(rounds):
+        db.session.expunge_all()
+        start = time.perf_counter()
+        query.all()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--page-size', type=int, default=24)
+    parser.add_argument('--rounds', type=int, default=50)
+    args = parser.parse_args()
+
+    with app.app_context():
+        seed(args.products)
+
+        variants = {
+            'full': Product.query,
+            'card': card_query(),
+        }
+        print(f"{args.products} products, page size {args.page_size}, median of {args.rounds} rounds")
+        print(f"{'query':<6} {'payload (bytes)':>16} {'hydrate (ms)':>13}")
+        for label, query in variants.items():
+            page = query.filter(Product.is_approved.is_(True)).order_by(
+                Product.updated_at.desc(), Product.id.desc()
+            ).limit(args.page_size)
+            print(f"{label:<6} {payload_bytes(page):>16} {time_hydration(page, args.rounds):>13.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+bench_recommendations.py
+
+Benchmark the recommendation job's TF-IDF build and batched top-k cosine
+search on synthetic catalogs (no database involved).
+
+Usage:
+    python scripts/bench_recommendations.py --sizes 10000,100000
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from logic.recommendations import build_tfidf, top_k_neighbours
+
+WORDS = [f"term{i}" for i in range(5000)]
+
+
+def synthetic_documents(count, words_per_document=60, seed=42):
+    generator = random.Random(seed)
+    # Skewed word choice so some terms are common and others rare, like real text.
+    weights = [1 / (rank + 1) for rank in range(len(WORDS))]
+    return [
+        ' '.join(generator.choices(WORDS, weights=weights, k=words_per_document))
+        for _ in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10000,100000')
+    parser.add_argument('--k', type=int, default=6)
+    parser.add_argument('--max-features', type=int, default=1024)
+    parser.add_argument('--batch-size', type=int, default=512)
+    args = parser.parse_args()
+
+    print(f"{'products':>9} {'tfidf (s)':>10} {'top-k (s)':>10} {'matrix (MB)':>12}")
+    for size in (int(value) for value in args.sizes.split(',')):
+        documents = synthetic_documents(size)
+
+        start = time.perf_counter()
+        matrix = build_tfidf(documents, max_features=args.max_features)
+        tfidf_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        top_k_neighbours(matrix, k=args.k, batch_size=args.batch_size)
+        top_k_seconds = time.perf_counter() - start
+
+        print(f"{size:>9} {tfidf_seconds:>10.2f} {top_k_seconds:>10.2f} {matrix.nbytes / 2**20:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
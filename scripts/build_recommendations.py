@@ -0,0 +1,42 @@
+"""
+build_recommendations.py
+
+Offline job that recomputes the "related products" shown on product detail
+pages (TF-IDF over name, description and specs + top-k cosine similarity).
+Schedule it with cron or a systemd timer, e.g. nightly:
+
+    0 3 * * * cd /home/tamer/liebemama && venv/bin/python scripts/build_recommendations.py
+
+Usage:
+    python scripts/build_recommendations.py [--k 6] [--max-features 1024]
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from myapp import app
+from logic.recommendations import rebuild_recommendations
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild related-product recommendations.")
+    parser.add_argument('--k', type=int, default=6, help="Recommendations per product")
+    parser.add_argument('--max-features', type=int, default=1024, help="TF-IDF vocabulary size")
+    parser.add_argument('--batch-size', type=int, default=512, help="Rows per similarity batch")
+    args = parser.parse_args()
+
+    with app.app_context():
+        start = time.perf_counter()
+        total = rebuild_recommendations(k=args.k, max_features=args.max_features, batch_size=args.batch_size)
+        logging.info("Stored %d recommendations in %.1fs.", total, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+generate_image_variants.py
+
+Backfill the resized WebP/AVIF variants and metadata (dimensions, byte size,
+content hash, dominant colour, blur placeholder) of product images. By
+default only images missing variants or metadata are processed; --all
+regenerates every image (safe to repeat, variants are overwritten in place).
+
+Usage:
+    python scripts/generate_image_variants.py [--all] [--jobs 4]
+"""
+
+import os
+import sys
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from myapp import app
+from models.models_definitions import db, ProductImage, ProductImageVariant
+from models.schema_utils import upgrade_schema
+from routes.image_variants import generate_variants
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def pending_image_ids(regenerate_all=False):
+    """Return the IDs of the images to process, oldest first."""
+    query = db.session.query(ProductImage.id)
+    if not regenerate_all:
+        query = query.filter(db.or_(
+            ~db.session.query(ProductImageVariant.id)
+            .filter(ProductImageVariant.image_id == ProductImage.id)
+            .exists(),
+            ProductImage.blur_placeholder.is_(None)
+        ))
+    return [image_id for (image_id,) in query.order_by(ProductImage.id)]
+
+
+def process_image(image_id):
+    with app.app_context():
+        try:
+            variants = generate_variants(image_id)
+            return image_id, len(variants), None
+        except Exception as e:
+            db.session.rollback()
+            return image_id, 0, e
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--all', action='store_true', help='regenerate images that already have variants')
+    parser.add_argument('--jobs', type=int, default=app.config.get('IMAGE_VARIANT_PROCESSES', 2))
+    args = parser.parse_args()
+
+    with app.app_context():
+        upgrade_schema()
+        image_ids = pending_image_ids(args.all)
+
+    logging.info("Generating variants for %s images with %s jobs", len(image_ids), args.jobs)
+    failures = 0
+    with ThreadPoolExecutor(max_workers=int(args.jobs)) as executor:
+        for done, (image_id, count, error) in enumerate(executor.map(process_image, image_ids), start=1):
+            if error is not None:
+                failures += 1
+                logging.error("Image %s failed: %s", image_id, error)
+            else:
+                logging.info("[%s/%s] Image %s: %s variants", done, len(image_ids), image_id, count)
+
+    logging.info("Done, %s failed.", failures)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
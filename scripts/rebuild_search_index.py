@@ -0,0 +1,31 @@
+"""
+rebuild_search_index.py
+
+Create the product full-text search table (if missing) and index every
+approved product from scratch. Product writes keep the index up to date
+afterwards; run this once after deploying search or after bulk imports.
+
+Usage:
+    python scripts/rebuild_search_index.py
+"""
+
+import os
+import sys
+import logging
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from myapp import app
+from logic.search import rebuild_search_index
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def main():
+    with app.app_context():
+        total = rebuild_search_index()
+        logging.info("Search index rebuilt for %d approved products.", total)
+
+
+if __name__ == "__main__":
+    main()
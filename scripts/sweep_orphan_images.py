@@ -0,0 +1,235 @@
+"""
+sweep_orphan_images.py
+
+Garbage-collect image objects in MinIO that nothing in the database refers
+to any more: originals of deleted products or images whose cleanup failed,
+uploads abandoned before their rows were committed and stale variants.
+Resumable uploads past their expiry are aborted first, which drops the
+chunks MinIO holds for them.
+
+Blobs (content-addressed objects shared by identical uploads) that have had
+no references for longer than the grace period are removed first, together
+with their variants. Each one is locked and its reference count re-checked
+before its objects go, so a concurrent upload of the same content either
+revives it or waits and stores the object again.
+
+Every product bucket is then listed under "products/" and compared against
+product_images.image_url, image_blobs and product_image_variants. Objects
+younger than the grace period are kept, since an upload in flight has its
+object stored before its row is committed. Orphans are removed with the
+multi-object delete API and a summary is written to the admin log.
+
+Meant to run on a schedule, e.g. hourly from cron:
+    0 * * * * cd /app && python scripts/sweep_orphan_images.py
+
+Usage:
+    python scripts/sweep_orphan_images.py [--grace-hours 24] [--dry-run]
+"""
+
+import os
+import sys
+import logging
+import argparse
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from myapp import app
+from models.models_definitions import db, ProductImage, ProductImageVariant, ImageBlob
+from routes.minio_client import get_minio_client, product_buckets, parse_object_url
+from routes.minio_uploads import remove_objects, expire_resumable_uploads
+from routes.minio_admin_tools import log_admin_action
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+OBJECT_PREFIX = 'products/'
+
+
+def referenced_keys():
+    """Return the object keys the database refers to, per bucket."""
+    referenced = defaultdict(set)
+
+    for (image_url,) in db.session.query(ProductImage.image_url).yield_per(1000):
+        location = parse_object_url(image_url)
+        if location is not None:
+            referenced[location[0]].add(location[1])
+
+    for bucket, object_key in db.session.query(ImageBlob.bucket, ImageBlob.object_key).yield_per(1000):
+        referenced[bucket].add(object_key)
+
+    # Variants live in the bucket of their original.
+    variants = db.session.query(ProductImage.image_url, ProductImageVariant.object_key).join(
+        ProductImageVariant, ProductImageVariant.image_id == ProductImage.id
+    )
+    for image_url, object_key in variants.yield_per(1000):
+        location = parse_object_url(image_url)
+        if location is not None:
+            referenced[location[0]].add(object_key)
+
+    return referenced
+
+
+def released_blob_keys():
+    """Return the object keys of the blobs without references, per bucket; their variants go with them."""
+    blobs = defaultdict(set)
+    released = db.session.query(ImageBlob.bucket, ImageBlob.object_key).filter(ImageBlob.ref_count <= 0)
+    for bucket, object_key in released.yield_per(1000):
+        blobs[bucket].add(object_key)
+    return blobs
+
+
+def remove_released_blobs(client, cutoff, dry_run=False):
+    """
+    Remove the blobs that have had no references since before the cutoff.
+
+    Each blob is locked and re-checked before its object and variants are
+    removed, and its row is only deleted once they are gone. An upload of
+    the same content meanwhile either revived it first, and it is kept, or
+    waits for the lock, finds no blob and stores the object again.
+
+    Args:
+        client (Minio): MinIO client.
+        cutoff (datetime): Aware UTC datetime; blobs released later are kept.
+        dry_run (bool): Only report what would be removed.
+
+    Returns:
+        dict[str, int]: Number of blobs removed (or removable) per bucket.
+    """
+    released_before = cutoff.replace(tzinfo=None)
+    candidates = db.session.query(ImageBlob.id).filter(
+        ImageBlob.ref_count <= 0, ImageBlob.released_at < released_before
+    ).all()
+
+    removed = defaultdict(int)
+    for (blob_id,) in candidates:
+        blob = db.session.query(ImageBlob).filter(
+            ImageBlob.id == blob_id, ImageBlob.ref_count <= 0, ImageBlob.released_at < released_before
+        ).with_for_update().one_or_none()
+        if blob is None:
+            db.session.rollback()
+            continue
+
+        # Variant keys extend the blob's key (see image_variants.variant_key).
+        object_keys = [blob.object_key] + [
+            obj.object_name for obj in client.list_objects(blob.bucket, prefix=f"{blob.object_key}.w")
+        ]
+        logging.info("%s released blob %s/%s (%s objects)", 'Would remove' if dry_run else 'Removing',
+                     blob.bucket, blob.object_key, len(object_keys))
+        if dry_run:
+            db.session.rollback()
+            removed[blob.bucket] += 1
+            continue
+
+        errors = remove_objects(blob.bucket, object_keys, client)
+        if errors:
+            for error in errors:
+                logging.error("Failed to remove %s/%s: %s", blob.bucket, error.name, error.message)
+            db.session.rollback()
+            continue
+        db.session.delete(blob)
+        db.session.commit()
+        removed[blob.bucket] += 1
+    return removed
+
+
+def find_orphans(client, bucket, referenced, cutoff, blobs=()):
+    """
+    List the unreferenced objects of a bucket last modified before the cutoff.
+
+    Args:
+        client (Minio): MinIO client.
+        bucket (str): Bucket to list.
+        referenced (set[str]): Keys referenced by the database.
+        cutoff (datetime): Aware UTC datetime; newer objects are kept.
+        blobs (set[str]): Keys of released blobs; their variants are kept even
+            without rows, since remove_released_blobs removes them with the blob.
+
+    Returns:
+        tuple[int, list]: Number of objects scanned and the orphaned objects.
+    """
+    scanned = 0
+    orphans = []
+    for obj in client.list_objects(bucket, prefix=OBJECT_PREFIX, recursive=True):
+        scanned += 1
+        if obj.object_name in referenced or obj.object_name.rpartition('.w')[0] in blobs:
+            continue
+        if obj.last_modified is None or obj.last_modified > cutoff:
+            continue
+        orphans.append(obj)
+    return scanned, orphans
+
+
+def sweep(grace, dry_run=False):
+    """
+    Remove the orphaned objects of every product bucket.
+
+    Released blobs go first (see remove_released_blobs). The references are
+    then loaded before listing, so anything stored after the snapshot is
+    younger than the grace period and kept.
+
+    Args:
+        grace (timedelta): Minimum age of an object before it can be removed.
+        dry_run (bool): Only report what would be removed.
+
+    Returns:
+        list[str]: One summary line per bucket.
+    """
+    client = get_minio_client()
+    cutoff = datetime.now(timezone.utc) - grace
+    released = remove_released_blobs(client, cutoff, dry_run)
+    referenced = referenced_keys()
+    blobs = released_blob_keys()
+
+    summary = []
+    for bucket in product_buckets():
+        if not client.bucket_exists(bucket):
+            continue
+
+        scanned, orphans = find_orphans(client, bucket, referenced[bucket], cutoff, blobs[bucket])
+        orphan_bytes = sum(obj.size or 0 for obj in orphans)
+        for obj in orphans:
+            logging.info("%s %s/%s (%s bytes, %s)", 'Would remove' if dry_run else 'Removing',
+                         bucket, obj.object_name, obj.size, obj.last_modified)
+
+        failed = 0
+        if orphans and not dry_run:
+            errors = remove_objects(bucket, (obj.object_name for obj in orphans), client)
+            for error in errors:
+                logging.error("Failed to remove %s/%s: %s", bucket, error.name, error.message)
+            failed = len(errors)
+
+        summary.append(
+            f"Bucket '{bucket}': released blobs {released[bucket]}, scanned {scanned}, orphaned {len(orphans)} "
+            f"({orphan_bytes} bytes), removed {0 if dry_run else len(orphans) - failed}, failed {failed}"
+        )
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--grace-hours', type=float, default=24, help='keep unreferenced objects younger than this')
+    parser.add_argument('--dry-run', action='store_true', help='report orphans without removing them')
+    args = parser.parse_args()
+
+    with app.app_context():
+        try:
+            if not args.dry_run:
+                aborted = expire_resumable_uploads()
+                logging.info("Aborted %s expired resumable uploads", aborted)
+            summary = sweep(timedelta(hours=args.grace_hours), args.dry_run)
+        except Exception as e:
+            db.session.rollback()
+            logging.exception("Sweep failed")
+            log_admin_action("Sweep Orphan Images", "error", str(e))
+            return 1
+
+        for line in summary:
+            logging.info(line)
+        if not args.dry_run:
+            log_admin_action("Sweep Orphan Images", "success", "\n".join(summary) or "No buckets found.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+import os
+import tempfile
+
+import pytest
+
+# myapp builds the application at import time, so the database must be
+# configured first. Tests run against a throwaway SQLite file.
+_db_dir = tempfile.mkdtemp(prefix='liebemama-tests-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_db_dir, 'test.db')}"
+
+from myapp import app as flask_app  # noqa: E402
+from models.models_definitions import db, User  # noqa: E402
+from logic.http_cache import page_cache  # noqa: E402
+from logic.notification_service import invalidate_unread_count  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    """Application with empty tables and caches for each test."""
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+    page_cache.clear()
+    invalidate_unread_count()
+    yield flask_app
+    with flask_app.app_context():
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def app_context(app):
+    with app.app_context():
+        yield
+
+
+@pytest.fixture
+def make_user(app):
+    """Create a user with the password 'pw' and return its id."""
+    def factory(username, role='merchant'):
+        with app.app_context():
+            user = User(username=username, email=f'{username}@example.com', role=role)
+            user.set_password('pw')
+            db.session.add(user)
+            db.session.commit()
+            return user.id
+    return factory
+
+
+@pytest.fixture
+def login(client):
+    """Log a user in through the login form, like a browser would."""
+    def do_login(username):
+        response = client.post('/login', data={'email': username, 'password': 'pw'})
+        assert response.status_code == 302
+    return do_login
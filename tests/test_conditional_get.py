@@ -0,0 +1,77 @@
+from datetime import datetime
+
+from logic.product_events import product_changed
+from models.models_definitions import db, Product
+
+
+def _add_product(app):
+    with app.app_context():
+        product = Product(name='Halawa', price=5, product_code='H1', is_approved=True)
+        db.session.add(product)
+        db.session.commit()
+        return product.id
+
+
+def test_matching_etag_gets_not_modified(app, client):
+    product_id = _add_product(app)
+
+    response = client.get(f'/product/{product_id}')
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert etag.startswith('W/')
+
+    response = client.get(f'/product/{product_id}', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.headers['ETag'] == etag
+
+
+def test_last_modified_gets_not_modified(app, client):
+    product_id = _add_product(app)
+
+    response = client.get(f'/product/{product_id}')
+    last_modified = response.headers['Last-Modified']
+
+    response = client.get(f'/product/{product_id}', headers={'If-Modified-Since': last_modified})
+    assert response.status_code == 304
+
+
+def test_changed_product_gets_a_new_etag(app, client):
+    product_id = _add_product(app)
+    etag = client.get(f'/product/{product_id}').headers['ETag']
+
+    with app.app_context():
+        db.session.get(Product, product_id).price = 6
+        db.session.get(Product, product_id).updated_at = datetime(2031, 1, 1)
+        db.session.commit()
+        product_changed(product_id)
+
+    response = client.get(f'/product/{product_id}', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_catalog_etag_changes_when_a_product_is_unapproved(app, client):
+    product_id = _add_product(app)
+    etag = client.get('/').headers['ETag']
+    assert client.get('/', headers={'If-None-Match': etag}).status_code == 304
+
+    with app.app_context():
+        db.session.get(Product, product_id).is_approved = False
+        db.session.commit()
+        product_changed(product_id)
+
+    response = client.get('/', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert b'Halawa' not in response.data
+
+
+def test_logged_in_users_get_full_responses(app, client, make_user, login):
+    product_id = _add_product(app)
+    etag = client.get(f'/product/{product_id}').headers['ETag']
+
+    make_user('merchant')
+    login('merchant')
+    response = client.get(f'/product/{product_id}', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert 'ETag' not in response.headers
@@ -0,0 +1,62 @@
+import hashlib
+
+from models.models_definitions import db, ImageBlob
+from routes.minio_uploads import (
+    StoredObject, _add_blob_references, _register_blob, content_key, release_blob
+)
+
+CONTENT_HASH = hashlib.sha256(b'image').hexdigest()
+
+
+def _stored():
+    return StoredObject(
+        'images', content_key('blobs', CONTENT_HASH, 'image/png'), 5, 'image/png',
+        1, 1, CONTENT_HASH, None, False
+    )
+
+
+def test_identical_uploads_share_one_blob(app_context):
+    blob = _register_blob(_stored(), 1)
+    db.session.commit()
+
+    # A second upload of the same content, racing the first one.
+    again = _register_blob(_stored(), 2)
+    db.session.commit()
+
+    assert again.id == blob.id
+    assert ImageBlob.query.count() == 1
+    assert db.session.get(ImageBlob, blob.id).ref_count == 3
+
+
+def test_missing_blob_gets_no_references(app_context):
+    assert _add_blob_references('images', CONTENT_HASH, 1) is None
+
+
+def test_last_release_keeps_the_row_for_the_sweeper(app_context):
+    blob = _register_blob(_stored(), 2)
+    db.session.commit()
+
+    assert release_blob(blob) is False
+    db.session.commit()
+    assert db.session.get(ImageBlob, blob.id).released_at is None
+
+    assert release_blob(blob) is True
+    db.session.commit()
+    released = db.session.get(ImageBlob, blob.id)
+    db.session.refresh(released)
+    assert released.ref_count == 0
+    assert released.released_at is not None
+
+
+def test_new_reference_revives_a_released_blob(app_context):
+    blob = _register_blob(_stored(), 1)
+    db.session.commit()
+    release_blob(blob)
+    db.session.commit()
+
+    revived = _add_blob_references('images', CONTENT_HASH, 1)
+    db.session.commit()
+
+    assert revived.id == blob.id
+    assert revived.ref_count == 1
+    assert revived.released_at is None
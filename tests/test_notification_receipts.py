@@ -0,0 +1,75 @@
+from logic.notification_service import count_unread, create_notification, mark_read, set_hidden
+from models.models_definitions import db, Notification, NotificationReceipt
+
+
+def _unread(app, user_id, role='merchant'):
+    with app.test_request_context():
+        return count_unread(role, user_id)
+
+
+def test_reading_a_global_notification_only_affects_the_reader(app, make_user):
+    reader = make_user('reader')
+    other = make_user('other')
+    with app.app_context():
+        create_notification(None, 'merchant', 'For every merchant')
+        notification = Notification.query.one()
+
+        mark_read(notification, reader)
+
+        assert db.session.get(NotificationReceipt, (notification.id, reader)).read_at is not None
+        assert db.session.get(Notification, notification.id).is_read is False
+    assert _unread(app, reader) == 0
+    assert _unread(app, other) == 1
+
+
+def test_anonymous_visitors_cannot_mark_global_notifications(app_context):
+    create_notification(None, 'visitor', 'Welcome')
+    notification = Notification.query.one()
+
+    mark_read(notification, None)
+    set_hidden(notification, None)
+
+    assert NotificationReceipt.query.count() == 0
+
+
+def test_restoring_an_unread_notification_drops_its_receipt(app, make_user):
+    reader = make_user('reader')
+    with app.app_context():
+        create_notification(None, 'merchant', 'For every merchant')
+        notification = Notification.query.one()
+
+        set_hidden(notification, reader)
+        assert _unread(app, reader) == 0
+
+        set_hidden(notification, reader, hidden=False)
+        assert NotificationReceipt.query.count() == 0
+    assert _unread(app, reader) == 1
+
+
+def test_inbox_flow_for_a_logged_in_user(app, client, make_user, login):
+    user_id = make_user('merchant')
+    with app.app_context():
+        create_notification(None, 'merchant', 'For every merchant')
+        create_notification(user_id, 'merchant', 'Just for you')
+        create_notification(None, 'merchant', 'Another one')
+        broadcast, own, _ = Notification.query.order_by(Notification.id).all()
+        broadcast_id, own_id = broadcast.id, own.id
+    login('merchant')
+
+    response = client.get('/notifications')
+    assert response.status_code == 200
+    assert b'Just for you' in response.data
+    assert _unread(app, user_id) == 3
+
+    assert client.post(f'/notifications/{broadcast_id}/read').status_code == 302
+    with app.app_context():
+        assert db.session.get(NotificationReceipt, (broadcast_id, user_id)) is not None
+    assert _unread(app, user_id) == 2
+
+    assert client.post(f'/notifications/{own_id}/hide').status_code == 302
+    with app.app_context():
+        assert db.session.get(Notification, own_id).is_visible is False
+    assert _unread(app, user_id) == 1
+
+    assert client.post('/notifications/mark_as_read').status_code == 302
+    assert _unread(app, user_id) == 0
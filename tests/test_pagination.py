@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+
+from logic.pagination import decode_cursor, encode_cursor, keyset_paginate
+from models.models_definitions import db, Product
+
+
+def test_cursor_round_trip():
+    stamp = datetime(2026, 5, 1, 12, 30, 15, 123456)
+    cursor = encode_cursor(stamp, 42)
+    assert '=' not in cursor
+    assert decode_cursor(cursor) == (stamp, 42)
+
+
+def test_invalid_cursor_is_ignored():
+    assert decode_cursor(None) is None
+    assert decode_cursor('') is None
+    assert decode_cursor('not a cursor') is None
+    assert decode_cursor(encode_cursor(datetime(2026, 5, 1), 1)[:-3]) is None
+
+
+def _add_products(count):
+    start = datetime(2026, 1, 1)
+    for number in range(count):
+        db.session.add(Product(
+            name=f'Product {number}', price=1, product_code=f'P{number}', is_approved=True,
+            # Pairs share a timestamp, so the id has to break the tie.
+            updated_at=start + timedelta(minutes=number // 2)
+        ))
+    db.session.commit()
+
+
+def _page(after=None, before=None):
+    return keyset_paginate(
+        Product.query, Product.updated_at, Product.id,
+        after=after, before=before, page_size=4
+    )
+
+
+def test_pages_cover_every_row_once(app_context):
+    _add_products(10)
+    expected = [product.id for product in Product.query.order_by(
+        Product.updated_at.desc(), Product.id.desc()
+    )]
+
+    seen = []
+    page = _page()
+    assert page.prev_cursor is None
+    while True:
+        seen.extend(product.id for product in page.items)
+        if page.next_cursor is None:
+            break
+        page = _page(after=page.next_cursor)
+
+    assert seen == expected
+
+
+def test_before_cursor_returns_the_previous_page(app_context):
+    _add_products(10)
+    first = _page()
+    second = _page(after=first.next_cursor)
+    assert second.prev_cursor is not None
+
+    back = _page(before=second.prev_cursor)
+    assert [product.id for product in back.items] == [product.id for product in first.items]
+    assert back.prev_cursor is None
+    assert back.next_cursor == first.next_cursor
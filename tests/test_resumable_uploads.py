@@ -0,0 +1,143 @@
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from minio.datatypes import Part
+
+import routes.minio_uploads as minio_uploads
+import routes.product_images_view as product_images_view
+from models.models_definitions import db, Product, ProductImage, ResumableUpload
+
+PNG_HEADER = b'\x89PNG\r\n\x1a\n'
+
+
+class FakeMultipart:
+    """In-memory stand-in for the MinIO multipart calls of routes.minio_uploads."""
+
+    def __init__(self):
+        self.uploads = {}
+        self.completed = {}
+
+    def create(self, client, bucket, object_key, content_type):
+        upload_id = uuid.uuid4().hex
+        self.uploads[upload_id] = {}
+        return upload_id
+
+    def upload_part(self, client, bucket, object_key, upload_id, part_number, data):
+        etag = uuid.uuid4().hex
+        self.uploads[upload_id][part_number] = Part(part_number, etag, size=len(data))
+        return etag
+
+    def list_parts(self, client, bucket, object_key, upload_id, part_number_marker=None):
+        parts = sorted(self.uploads[upload_id].values(), key=lambda part: part.part_number)
+        return SimpleNamespace(parts=parts, is_truncated=False, next_part_number_marker=None)
+
+    def complete(self, client, bucket, object_key, upload_id, parts):
+        self.completed[object_key] = self.uploads.pop(upload_id)
+
+    def abort(self, client, bucket, object_key, upload_id):
+        self.uploads.pop(upload_id, None)
+
+    def verify(self, folder, object_key, bucket=None, client=None):
+        size = sum(part.size for part in self.completed[object_key].values())
+        return minio_uploads.StoredObject(
+            bucket, object_key, size, 'image/png', 1600, 1200, None, None, False
+        )
+
+
+@pytest.fixture
+def multipart(app, monkeypatch):
+    fake = FakeMultipart()
+    monkeypatch.setitem(app.config, 'MINIO_BASE_URL', 'https://files.example.com')
+    monkeypatch.setattr(minio_uploads, 'get_minio_client', lambda: None)
+    monkeypatch.setattr(minio_uploads, 'ensure_bucket', lambda bucket, client=None: None)
+    monkeypatch.setattr(minio_uploads, '_create_multipart_upload', fake.create)
+    monkeypatch.setattr(minio_uploads, '_upload_part', fake.upload_part)
+    monkeypatch.setattr(minio_uploads, '_list_parts', fake.list_parts)
+    monkeypatch.setattr(minio_uploads, '_complete_multipart_upload', fake.complete)
+    monkeypatch.setattr(minio_uploads, '_abort_multipart_upload', fake.abort)
+    monkeypatch.setattr(minio_uploads, 'verify_uploaded_image', fake.verify)
+    monkeypatch.setattr(product_images_view, 'schedule_variants', lambda image_ids: None)
+    return fake
+
+
+@pytest.fixture
+def product_id(app, make_user):
+    merchant_id = make_user('merchant')
+    with app.app_context():
+        product = Product(name='Halawa', price=5, product_code='H1', merchant_id=merchant_id, is_approved=True)
+        db.session.add(product)
+        db.session.commit()
+        return product.id
+
+
+def test_start_chunks_complete(app, client, login, multipart, product_id):
+    data = PNG_HEADER + b'\0' * (minio_uploads.UPLOAD_PART_SIZE + 100 - len(PNG_HEADER))
+    login('merchant')
+
+    response = client.post(f'/products/{product_id}/uploads', json={
+        'filename': 'big.png', 'content_type': 'image/png', 'size': len(data)
+    })
+    assert response.status_code == 201
+    upload = response.get_json()
+    assert upload['chunk_count'] == 2
+    with app.app_context():
+        row = ResumableUpload.query.filter_by(token=upload['token']).one()
+        assert row.user_id is not None
+        assert row.bucket == 'merchant-product'
+
+    chunk_size = upload['chunk_size']
+    second = client.put(upload['status_url'] + '/chunks/1', data=data[chunk_size:])
+    assert second.status_code == 200
+
+    early = client.post(upload['complete_url'])
+    assert early.status_code == 400
+    assert client.get(upload['status_url']).get_json()['missing'] == [0]
+
+    first = client.put(upload['status_url'] + '/chunks/0', data=data[:chunk_size])
+    assert first.status_code == 200
+
+    response = client.post(upload['complete_url'])
+    assert response.status_code == 201
+    image_id = response.get_json()['id']
+
+    # A retried completion returns the same image.
+    retry = client.post(upload['complete_url'])
+    assert retry.status_code == 200
+    assert retry.get_json()['id'] == image_id
+    with app.app_context():
+        image = db.session.get(ProductImage, image_id)
+        assert image.byte_size == len(data)
+        assert image.is_main
+
+
+def test_uploads_belong_to_the_user_who_started_them(app, client, make_user, login, multipart, product_id):
+    login('merchant')
+    upload = client.post(f'/products/{product_id}/uploads', json={
+        'filename': 'big.png', 'content_type': 'image/png', 'size': 100
+    }).get_json()
+
+    make_user('someone')
+    client.get('/logout')
+    login('someone')
+    assert client.get(upload['status_url']).status_code == 404
+
+
+def test_failed_commit_aborts_the_multipart_upload(app, client, login, multipart, product_id, monkeypatch):
+    login('merchant')
+    commit = db.session.commit
+
+    def fail_once():
+        # Only the upload row fails; the error log still has to be written.
+        monkeypatch.setattr(db.session, 'commit', commit)
+        raise RuntimeError('database is gone')
+    monkeypatch.setattr(db.session, 'commit', fail_once)
+
+    response = client.post(f'/products/{product_id}/uploads', json={
+        'filename': 'big.png', 'content_type': 'image/png', 'size': 100
+    })
+
+    assert response.status_code == 500
+    assert multipart.uploads == {}
+    with app.app_context():
+        assert ResumableUpload.query.count() == 0